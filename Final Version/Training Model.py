@@ -1,11 +1,35 @@
 # SMARTUAL MODEL TRAINING - T.I.P. Dataset
 # Fine-tune SentenceTransformer on Q&A pairs for SmartUAL assistant
+#
+#   python "Training Model.py" --data TIP_QA_dataset_20000.csv
+#   python "Training Model.py" --data qa_pairs.parquet --workers 4 --pretokenize
+#   python "Training Model.py" --batch-size 1024 --cached --mini-batch-size 32 --bf16
+#   python "Training Model.py" --matryoshka-dims 384,256,128,64
+#   python "Training Model.py" --resume        # continue after a crash or preemption
+#
+# Pairs are streamed from disk in chunks (training_data.py), so memory stays flat
+# even for datasets with millions of rows. Datasets with negative_1..n columns
+# (from hard_negatives.py) are trained as (question, answer, negatives) rows.
 
+import argparse
+import contextlib
+import itertools
 import os
-import pandas as pd
-from sentence_transformers import SentenceTransformer, InputExample, models, losses
-from torch.utils.data import DataLoader
+import random
+import shutil
+import signal
+import time
+
+import numpy as np
 import torch
+from sentence_transformers import SentenceTransformer, models, losses
+from torch.utils.data import DataLoader
+from transformers import get_linear_schedule_with_warmup
+
+from retrieval_eval import MRR_AT, dimension_report, holdout_evaluator, manual_evaluator, run_evaluators
+from serving_config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, MANUAL_DATA_FILE, SECTION_EXAMPLES_FILE
+from training_data import CHUNK_ROWS, QACollator, QAPairStream, build_token_cache, count_pairs, dataset_columns, \
+    read_manifest
 
 # Configured and managed the files
 DATA_FILE = "/content/TIP_QA_dataset_20000.csv"
@@ -14,64 +38,432 @@ PRETRAINED_MODEL = "sentence-transformers/all-MiniLM-L12-v2"
 BATCH_SIZE = 32
 EPOCHS = 3
 MAX_LEN = 128
+LEARNING_RATE = 2e-5
+WARMUP_RATIO = 0.1
+NUM_WORKERS = 2             # DataLoader worker processes
+SHUFFLE_BUFFER = 10_000     # pairs held per worker for shuffling
+TOKEN_CACHE_DIR = "token_cache"
+MINI_BATCH_SIZE = 32        # with --cached: examples embedded at once; memory no longer depends on BATCH_SIZE
+MATRYOSHKA_DIMS = None      # e.g. (384, 256, 128, 64): also train truncated prefixes of the embedding
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
+# Evaluation, early stopping and best-checkpoint selection
+EVAL_HOLDOUT = 0.02         # fraction of QA questions held out of training for evaluation
+EVAL_MAX_QUERIES = 2000
+EVAL_STEPS = 200            # evaluate every N optimizer steps (and at the end)
+PATIENCE = 5                # stop after N evaluations without improvement (0 = never stop early)
+MIN_DELTA = 0.001           # smallest score gain that counts as an improvement
+BEST_CHECKPOINT = "checkpoints/best"
 
-# Load the data
-if not os.path.exists(DATA_FILE):
-    raise FileNotFoundError(f"{DATA_FILE} not found!")
+# Resumable runs: model, optimizer, scheduler and data position are saved to LAST_CHECKPOINT
+LAST_CHECKPOINT = "checkpoints/last"
+TRAINER_STATE = "trainer_state.pt"
+SAVE_STEPS = 500            # also saved at the end of every epoch and on SIGTERM/SIGINT
+STOP_REQUESTED = False
 
-df = pd.read_csv(DATA_FILE)
-print(f"Dataset loaded. Total rows: {len(df)}")
 
-# Check required columns
-if not all(col in df.columns for col in ['questionnaire', 'answer']):
-    raise ValueError("CSV must contain 'questionnaire' and 'answer' columns")
+# ============================================================================
+# CPU SETUP
+# ============================================================================
 
-# Prepareing the training
-train_examples = [
-    InputExample(texts=[str(row['questionnaire']).strip(), str(row['answer']).strip()])
-    for _, row in df.iterrows()
-    if str(row['questionnaire']).strip() and str(row['answer']).strip()
-]
+def cpu_supports_bf16():
+    """True if the CPU has native bf16 instructions; emulated bf16 is slower than fp32."""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
 
-print(f"Total training examples: {len(train_examples)}")
 
-# Model
-word_embedding_model = models.Transformer(PRETRAINED_MODEL, max_seq_length=MAX_LEN)
-pooling_model = models.Pooling(word_embedding_model.get_word_embedding_dimension())
-model = SentenceTransformer(modules=[word_embedding_model, pooling_model], device=device)
+def configure_cpu(intra_op_threads=None, inter_op_threads=None, bf16=False):
+    """Apply torch thread settings and decide on bf16 autocast; returns whether bf16 is used."""
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        torch.set_num_interop_threads(inter_op_threads)
+    print(f"Torch threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op")
 
-#Load Data
-train_dataloader = DataLoader(train_examples, shuffle=True, batch_size=BATCH_SIZE)
+    if bf16 and not torch.cuda.is_available() and not cpu_supports_bf16():
+        print("⚠️ This CPU has no native bf16 support, training in fp32")
+        return False
+    return bf16
 
-# Training loss function
-train_loss = losses.MultipleNegativesRankingLoss(model=model)
 
-# Training the model
-print("Starting training...")
+# ============================================================================
+# MODEL + DATA
+# ============================================================================
 
-model.fit(
-    train_objectives=[(train_dataloader, train_loss)],
-    epochs=EPOCHS,
-    warmup_steps=int(len(train_examples) * 0.1 / BATCH_SIZE),
-    show_progress_bar=True
-)
+def build_model(pretrained, max_len, device):
+    word_embedding_model = models.Transformer(pretrained, max_seq_length=max_len)
+    pooling_model = models.Pooling(word_embedding_model.get_word_embedding_dimension())
+    return SentenceTransformer(modules=[word_embedding_model, pooling_model], device=device)
 
-# Save the model for later use
-model.save(MODEL_SAVE_PATH)
-print(f"✅ SmartUAL model saved at '{MODEL_SAVE_PATH}'")
 
-print(df.columns.tolist())
-# simply checking the columns
+def make_dataloader(args, model):
+    """Streaming DataLoader over the dataset; returns (dataloader, number of pairs)."""
+    if not os.path.exists(args.data):
+        raise FileNotFoundError(f"{args.data} not found!")
 
-import shutil
+    if args.pretokenize:
+        manifest_path = build_token_cache(args.data, model.tokenizer, args.max_len, args.cache_dir, args.chunk_rows,
+                                          args.holdout)
+        n_pairs = read_manifest(manifest_path)["rows"]
+        dataset = QAPairStream(manifest_path=manifest_path, shuffle_buffer=args.shuffle_buffer,
+                               batch_size=args.batch_size)
+    else:
+        n_pairs = count_pairs(args.data, args.chunk_rows, args.holdout)
+        dataset = QAPairStream(data_file=args.data, chunk_rows=args.chunk_rows, shuffle_buffer=args.shuffle_buffer,
+                               holdout=args.holdout, batch_size=args.batch_size)
+
+    # The dataset batches itself so that no answer (or answer_group) repeats within a batch
+    dataloader = DataLoader(dataset, batch_size=None, num_workers=args.workers,
+                            collate_fn=QACollator(model.tokenizer, args.max_len),
+                            persistent_workers=False, prefetch_factor=4 if args.workers else None)
+    return dataloader, n_pairs
+
+
+# ============================================================================
+# TRAINING LOOP
+# ============================================================================
+
+def make_evaluators(args):
+    """Manual-chunk and held-out QA evaluators (whichever have data); empty if evaluation is off."""
+    if args.no_eval:
+        return []
+    evaluators, distractors = [], []
+    if os.path.exists(args.manual) and os.path.exists(args.examples):
+        manual, distractors = manual_evaluator(args.manual, args.examples, MODEL_SAVE_PATH,
+                                               CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+        evaluators.append(manual)
+    if args.holdout:
+        evaluators.append(holdout_evaluator(args.data, args.holdout, EVAL_MAX_QUERIES, distractors))
+    evaluators = [e for e in evaluators if len(e)]
+    for evaluator in evaluators:
+        print(f"🧪 Evaluator '{evaluator.name}': {len(evaluator)} queries, {len(evaluator.corpus)} documents")
+    return evaluators
+
+
+class BestCheckpoint:
+    """Tracks the best evaluation score, saves the model whenever it improves, and decides on early stopping."""
+
+    def __init__(self, path, patience=PATIENCE, min_delta=MIN_DELTA, baseline=float("-inf")):
+        self.path = path
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_score = baseline
+        self.best_step = None
+        self.bad_evals = 0
+
+    def update(self, model, metrics, step):
+        """Record one evaluation; returns True when training should stop."""
+        shown = ", ".join(f"{k} {v:.3f}" for k, v in metrics.items() if k != "score")
+        if metrics["score"] > self.best_score + self.min_delta:
+            self.best_score, self.best_step, self.bad_evals = metrics["score"], step, 0
+            model.save(self.path)
+            print(f"🏆 step {step}: score {metrics['score']:.4f} (new best, saved) - {shown}")
+        else:
+            self.bad_evals += 1
+            print(f"   step {step}: score {metrics['score']:.4f} (best {self.best_score:.4f}) - {shown}")
+        return bool(self.patience) and self.bad_evals >= self.patience
+
+
+def matryoshka_dimensions(spec, full_dim):
+    """Parse --matryoshka-dims; the full dimension is always trained, largest first."""
+    dims = {int(d) for d in spec.split(",") if d.strip()} if spec else set()
+    if not dims:
+        return []
+    if max(dims) > full_dim:
+        raise ValueError(f"Matryoshka dimensions must not exceed the model's {full_dim}")
+    return sorted(dims | {full_dim}, reverse=True)
+
+
+def make_optimizer(train_loss, lr, weight_decay=0.01):
+    """AdamW without weight decay on biases and LayerNorm, as SentenceTransformer.fit does."""
+    no_decay = ("bias", "LayerNorm.bias", "LayerNorm.weight")
+    params = list(train_loss.named_parameters())
+    groups = [
+        {"params": [p for n, p in params if not any(nd in n for nd in no_decay)], "weight_decay": weight_decay},
+        {"params": [p for n, p in params if any(nd in n for nd in no_decay)], "weight_decay": 0.0},
+    ]
+    return torch.optim.AdamW(groups, lr=lr)
+
+
+def to_device(features, device):
+    return [{key: value.to(device) for key, value in column.items()} for column in features]
+
+
+def save_training_state(path, model, optimizer, scheduler, state):
+    """Write model, optimizer, scheduler and loop position to `path` atomically (old checkpoint kept until then)."""
+    tmp_path, old_path = path + ".tmp", path + ".old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    model.save(os.path.join(tmp_path, "model"))
+    state = dict(state, optimizer=optimizer.state_dict(), scheduler=scheduler.state_dict(), rng={
+        "python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()})
+    torch.save(state, os.path.join(tmp_path, TRAINER_STATE))
+    if os.path.exists(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def load_training_state(path):
+    """The saved loop state, or None if there is no complete checkpoint at `path`."""
+    state_file = os.path.join(path, TRAINER_STATE)
+    if not os.path.exists(state_file):
+        return None
+    return torch.load(state_file, map_location="cpu", weights_only=False)
+
+
+def _request_stop(signum, frame):
+    global STOP_REQUESTED
+    STOP_REQUESTED = True
+    # The next signal is no longer caught, so a second Ctrl+C quits at once
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    print("⏸️ Stop requested, checkpointing after the current step (signal again to quit without saving)...")
+
+
+@contextlib.contextmanager
+def checkpoint_on_signal():
+    """Inside the block, the first SIGTERM/SIGINT asks train() to save and stop; outside, signals act as usual."""
+    previous = {sig: signal.signal(sig, _request_stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        yield
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+
+def train(model, dataloader, train_loss, epochs, steps_per_epoch, lr, warmup_steps, max_grad_norm=1.0,
+          log_every=50, bf16=False, evaluators=(), eval_steps=EVAL_STEPS, checkpoint=None,
+          last_path=None, save_steps=SAVE_STEPS, resume_state=None, run_config=None):
+    """Returns a throughput report: examples, seconds and examples per second over all epochs.
+
+    `steps_per_epoch` lists the batches of each epoch (QAPairStream.count_batches), so the linear
+    schedule reaches zero exactly at the last step.
+
+    With evaluators and a BestCheckpoint, the model is evaluated every `eval_steps` steps and at
+    the end; training stops early once the checkpoint's patience runs out. With `last_path`, the
+    full training state is saved every `save_steps` steps and on SIGTERM/SIGINT (the report then
+    has "interrupted": True); `resume_state` continues from such a checkpoint.
+    """
+    optimizer = make_optimizer(train_loss, lr)
+    scheduler = get_linear_schedule_with_warmup(optimizer, warmup_steps, max(1, sum(steps_per_epoch)))
+    train_loss.train()
+    total_seen, total_time = 0, 0.0
+    global_step, evaluated_step, stop = 0, 0, False
+    start_epoch, skip_batches = 0, 0
+
+    if resume_state is not None:
+        optimizer.load_state_dict(resume_state["optimizer"])
+        scheduler.load_state_dict(resume_state["scheduler"])
+        random.setstate(resume_state["rng"]["python"])
+        np.random.set_state(resume_state["rng"]["numpy"])
+        torch.set_rng_state(resume_state["rng"]["torch"])
+        start_epoch, skip_batches = resume_state["epoch"], resume_state["step_in_epoch"]
+        global_step, evaluated_step = resume_state["global_step"], resume_state["evaluated_step"]
+        total_seen, total_time = resume_state["examples"], resume_state["seconds"]
+        if checkpoint is not None and resume_state.get("best"):
+            checkpoint.best_score, checkpoint.best_step, checkpoint.bad_evals = resume_state["best"]
+        print(f"▶️ Resuming at epoch {start_epoch + 1}, batch {skip_batches} (step {global_step})")
+
+    def evaluate():
+        return checkpoint.update(model, run_evaluators(evaluators, model), global_step)
+
+    def save(epoch, step_in_epoch, seen_total, seconds_total):
+        best = (checkpoint.best_score, checkpoint.best_step, checkpoint.bad_evals) if checkpoint else None
+        save_training_state(last_path, model, optimizer, scheduler, {
+            "epoch": epoch, "step_in_epoch": step_in_epoch, "global_step": global_step,
+            "evaluated_step": evaluated_step, "examples": seen_total, "seconds": seconds_total,
+            "best": best, "config": run_config})
+        print(f"💾 Saved training state at step {global_step} to '{last_path}'")
+
+    for epoch in range(start_epoch, epochs):
+        # Deterministic data order: skipping the batches already trained on lands exactly where we stopped
+        # (they are only read and collated, never run through the model)
+        dataloader.dataset.set_epoch(epoch)
+        start, seen, running = time.perf_counter(), 0, 0.0
+        for step, features in enumerate(itertools.islice(dataloader, skip_batches, None), skip_batches + 1):
+            # The cached loss re-embeds mini-batches inside backward(), so autocast covers both passes
+            autocast = torch.autocast(model.device.type, dtype=torch.bfloat16) if bf16 else contextlib.nullcontext()
+            with autocast:
+                loss = train_loss(to_device(features, model.device), None)
+                loss.backward()
+            torch.nn.utils.clip_grad_norm_(train_loss.parameters(), max_grad_norm)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+
+            seen += features[0]["input_ids"].shape[0]
+            running += loss.item()
+            global_step += 1
+            if evaluators and global_step % eval_steps == 0:
+                evaluated_step = global_step
+                if evaluate():
+                    stop = True
+                    break
+            if step % log_every == 0:
+                rate = seen / (time.perf_counter() - start)
+                print(f"   epoch {epoch + 1} step {step}/{steps_per_epoch[epoch]}: loss {running / log_every:.4f}, "
+                      f"{rate:.1f} examples/s")
+                running = 0.0
+            if last_path and (STOP_REQUESTED or global_step % save_steps == 0):
+                save(epoch, step, total_seen + seen, total_time + time.perf_counter() - start)
+                if STOP_REQUESTED:
+                    seconds = total_time + time.perf_counter() - start
+                    return {"examples": total_seen + seen, "seconds": seconds,
+                            "examples_per_second": (total_seen + seen) / max(seconds, 1e-9), "interrupted": True}
+        skip_batches = 0
+        elapsed = time.perf_counter() - start
+        total_seen, total_time = total_seen + seen, total_time + elapsed
+        print(f"✅ Epoch {epoch + 1}/{epochs}: {seen} examples in {elapsed:.0f}s ({seen / max(elapsed, 1e-9):.1f} examples/s)")
+        if stop:
+            print(f"⏹️ Early stopping at step {global_step}: no improvement in {checkpoint.patience} evaluations")
+            break
+        if last_path:
+            save(epoch + 1, 0, total_seen, total_time)
+
+    if evaluators and evaluated_step != global_step:
+        evaluate()
+    return {"examples": total_seen, "seconds": total_time, "examples_per_second": total_seen / max(total_time, 1e-9),
+            "interrupted": False}
+
+
+def export_archive(model_path):
+    # Zip the folder for us to capture the overall model
+    shutil.make_archive(model_path, 'zip', model_path)
+    try:
+        from google.colab import files
+    except ImportError:
+        return
+    # Download the ZIP file
+    files.download(f"{model_path}.zip")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the Smartual embedding model on QA pairs")
+    parser.add_argument("--data", default=DATA_FILE, help="CSV or Parquet with 'questionnaire' and 'answer'")
+    parser.add_argument("--out", default=MODEL_SAVE_PATH)
+    parser.add_argument("--pretrained", default=PRETRAINED_MODEL)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--max-len", type=int, default=MAX_LEN)
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE)
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read from the dataset at a time")
+    parser.add_argument("--shuffle-buffer", type=int, default=SHUFFLE_BUFFER)
+    parser.add_argument("--pretokenize", action="store_true", help="tokenize once into shards under --cache-dir")
+    parser.add_argument("--cache-dir", default=TOKEN_CACHE_DIR)
+    parser.add_argument("--cached", action="store_true",
+                        help="gradient-cached MNRL: large --batch-size in the memory of --mini-batch-size")
+    parser.add_argument("--mini-batch-size", type=int, default=MINI_BATCH_SIZE)
+    parser.add_argument("--intra-op-threads", type=int, help="torch threads per operation (default: all cores)")
+    parser.add_argument("--inter-op-threads", type=int, help="torch threads running operations in parallel")
+    parser.add_argument("--bf16", action="store_true", help="bf16 autocast, if the CPU supports it natively")
+    parser.add_argument("--matryoshka-dims", default=",".join(map(str, MATRYOSHKA_DIMS or ())),
+                        help="comma-separated embedding sizes to train for truncation, e.g. 384,256,128,64")
+    parser.add_argument("--manual", default=MANUAL_DATA_FILE, help="manual chunks used for evaluation")
+    parser.add_argument("--examples", default=SECTION_EXAMPLES_FILE, help="section example questions for evaluation")
+    parser.add_argument("--holdout", type=float, default=EVAL_HOLDOUT, help="fraction of questions held out")
+    parser.add_argument("--eval-steps", type=int, default=EVAL_STEPS)
+    parser.add_argument("--patience", type=int, default=PATIENCE, help="0 disables early stopping")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA)
+    parser.add_argument("--no-eval", action="store_true", help="train blind and save the final model")
+    parser.add_argument("--resume", action="store_true", help=f"continue from {LAST_CHECKPOINT} if it exists")
+    parser.add_argument("--save-steps", type=int, default=SAVE_STEPS, help="save the training state every N steps")
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+    bf16 = configure_cpu(args.intra_op_threads, args.inter_op_threads, args.bf16)
+
+    # The options that decide data order, schedule, loss and model must match to resume
+    run_config = {"data": os.path.abspath(args.data), "batch_size": args.batch_size, "epochs": args.epochs,
+                  "holdout": args.holdout, "shuffle_buffer": args.shuffle_buffer, "chunk_rows": args.chunk_rows,
+                  "workers": args.workers, "pretokenize": args.pretokenize, "cached": args.cached,
+                  "mini_batch_size": args.mini_batch_size, "lr": args.lr, "matryoshka_dims": args.matryoshka_dims,
+                  "max_len": args.max_len, "pretrained": args.pretrained}
+    resume_state = load_training_state(LAST_CHECKPOINT) if args.resume else None
+    if args.resume and resume_state is None:
+        print(f"⚠️ No checkpoint in '{LAST_CHECKPOINT}', starting from scratch")
+    if resume_state is not None and resume_state["config"] != run_config:
+        raise SystemExit(f"❌ '{LAST_CHECKPOINT}' was saved with different options: {resume_state['config']}")
+
+    # Model
+    if resume_state is not None:
+        model = SentenceTransformer(os.path.join(LAST_CHECKPOINT, "model"), device=device)
+    else:
+        model = build_model(args.pretrained, args.max_len, device)
+
+    # Load Data
+    dataloader, n_pairs = make_dataloader(args, model)
+    print(f"Total training examples: {n_pairs}")
+    n_negatives = len(dataset_columns(args.data)) - 2
+    if n_negatives:
+        print(f"Training with {n_negatives} mined hard negative(s) per question")
+    # Answers held back or skipped by the duplicate-free batcher change the batch count, so count it
+    steps_per_epoch, skipped = zip(*(dataloader.dataset.count_batches(epoch, args.workers)
+                                     for epoch in range(args.epochs)))
+    if any(skipped):
+        print(f"⚠️ {max(skipped)} pairs per epoch skipped: their answer repeats too often for duplicate-free batches")
+
+    # Training loss function
+    if args.cached:
+        # GradCache: every example is still a negative for the whole batch, but only
+        # mini_batch_size examples are ever in the model's activations at once
+        train_loss = losses.CachedMultipleNegativesRankingLoss(model=model, mini_batch_size=args.mini_batch_size)
+    else:
+        train_loss = losses.MultipleNegativesRankingLoss(model=model)
+    matryoshka_dims = matryoshka_dimensions(args.matryoshka_dims, model.get_sentence_embedding_dimension())
+    if matryoshka_dims:
+        # The same ranking loss on every prefix of the embedding, so it can be truncated when serving
+        train_loss = losses.MatryoshkaLoss(model, train_loss, matryoshka_dims)
+        print(f"Matryoshka dimensions: {matryoshka_dims}")
+
+    # Evaluation: the model currently at --out is the baseline a new checkpoint has to beat
+    evaluators = make_evaluators(args)
+    checkpoint = None
+    if evaluators:
+        baseline = float("-inf")
+        if os.path.exists(os.path.join(args.out, "modules.json")):
+            baseline = run_evaluators(evaluators, SentenceTransformer(args.out, device=device))["score"]
+            print(f"📏 Current '{args.out}' scores {baseline:.4f} (mean MRR@{MRR_AT})")
+        checkpoint = BestCheckpoint(BEST_CHECKPOINT, args.patience, args.min_delta, baseline)
+
+    # Training the model
+    print(f"Starting training (batch {args.batch_size}"
+          f"{f', mini-batch {args.mini_batch_size}' if args.cached else ''}{', bf16' if bf16 else ''})...")
+    # Preemption (SIGTERM) or Ctrl+C while training: finish the current step, save, and exit
+    with checkpoint_on_signal():
+        report = train(model, dataloader, train_loss, args.epochs, steps_per_epoch, args.lr,
+                       warmup_steps=int(steps_per_epoch[0] * WARMUP_RATIO), bf16=bf16,
+                       evaluators=evaluators, eval_steps=args.eval_steps, checkpoint=checkpoint,
+                       last_path=LAST_CHECKPOINT, save_steps=args.save_steps, resume_state=resume_state,
+                       run_config=run_config)
+    print(f"📈 Throughput: {report['examples_per_second']:.1f} examples/s "
+          f"({report['examples']} examples in {report['seconds']:.0f}s)")
+    if report["interrupted"]:
+        print(f"⏸️ Stopped early; continue with: python \"Training Model.py\" --resume (same options)")
+        return
 
-# Zip the folder for us to capture the overall model
-shutil.make_archive("smartual_model", 'zip', "smartual_model")
+    # Save the model for later use (the best evaluated checkpoint, never a regression)
+    if checkpoint is None:
+        model.save(args.out)
+    elif checkpoint.best_step is None:
+        print(f"⚠️ No checkpoint beat the current '{args.out}' ({checkpoint.best_score:.4f}); keeping it")
+        return
+    else:
+        shutil.rmtree(args.out, ignore_errors=True)
+        shutil.copytree(checkpoint.path, args.out)
+        print(f"🏆 Best checkpoint: step {checkpoint.best_step}, score {checkpoint.best_score:.4f}")
+        if matryoshka_dims:
+            best = SentenceTransformer(args.out, device=device)
+            for dim, score in dimension_report(evaluators, best, matryoshka_dims).items():
+                print(f"   {dim:>4}d: mean MRR@{MRR_AT} {score:.4f}")
+    print(f"✅ SmartUAL model saved at '{args.out}'")
+    export_archive(args.out)
 
-from google.colab import files
 
-# Download the ZIP file
-files.download("smartual_model.zip")
+if __name__ == "__main__":
+    main()
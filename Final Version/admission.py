@@ -0,0 +1,93 @@
+# ============================================================================
+# ADMISSION CONTROL - T.I.P. Student Manual
+# A bounded gate in front of the CPU-bound pipeline (model.encode): at most
+# `max_concurrency` questions run at once, at most `max_queue` wait, and none
+# waits past its deadline. A free slot always admits; a question that would
+# have to queue longer than its deadline allows is shed at once - the caller
+# answers it degraded (cache, static encoder or keyword search) instead of
+# letting every user's latency grow together during enrollment peaks.
+# ============================================================================
+
+import threading
+import time
+from contextlib import contextmanager
+
+EWMA_ALPHA = 0.2                 # weight of the newest run in the service time estimate
+
+
+class ConcurrencyGate:
+    """Bounded concurrency with a bounded queue, per-request deadlines and load shedding."""
+
+    def __init__(self, max_concurrency, max_queue, max_estimate_s=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_estimate_s = max_estimate_s   # one slow run (e.g. a cold start) counts at most this long
+        self.service_seconds = None     # moving average of admitted run time
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self._slots = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    def expected_wait(self):
+        """Rough wait for a slot: the queue ahead drains max_concurrency questions per service time."""
+        if self.service_seconds is None or self.running < self.max_concurrency:
+            return 0.0
+        return (self.waiting // self.max_concurrency + 1) * self.service_seconds
+
+    @contextmanager
+    def admit(self, deadline):
+        """Yields None once a slot is held, or why the question was shed: "queue_full", "deadline" or "timeout".
+
+        `deadline` is a time.monotonic() value by which the question should be answered.
+        """
+        run_seconds = self.service_seconds or 0.0
+        with self._lock:
+            must_queue = self.running + self.waiting >= self.max_concurrency
+            if must_queue and self.waiting >= self.max_queue:
+                reason = "queue_full"
+            elif must_queue and time.monotonic() + self.expected_wait() + run_seconds > deadline:
+                reason = "deadline"
+            else:
+                reason = None
+                self.waiting += 1
+        if reason is not None:
+            self._count_shed()
+            yield reason
+            return
+
+        # Queue only as long as the run still fits before the deadline; with a slot free, just take it
+        budget = deadline - time.monotonic() - (run_seconds if must_queue else 0.0)
+        acquired = self._slots.acquire(timeout=max(0.0, budget))
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.running += 1
+                self.admitted += 1
+        if not acquired:
+            self._count_shed()
+            yield "timeout"
+            return
+
+        start = time.monotonic()
+        try:
+            yield None
+        finally:
+            elapsed = time.monotonic() - start
+            if self.max_estimate_s is not None:
+                elapsed = min(elapsed, self.max_estimate_s)
+            with self._lock:
+                self.running -= 1
+                self.service_seconds = elapsed if self.service_seconds is None else (
+                    EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.service_seconds)
+            self._slots.release()
+
+    def _count_shed(self):
+        with self._lock:
+            self.shed += 1
+
+    def stats(self):
+        with self._lock:
+            return {"running": self.running, "waiting": self.waiting, "admitted": self.admitted,
+                    "shed": self.shed, "service_seconds": self.service_seconds}
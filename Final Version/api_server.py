@@ -0,0 +1,343 @@
+# ============================================================================
+# HTTP JSON API - T.I.P. Student Manual
+# The QA pipeline without the Streamlit UI, for other campus systems (chatbots,
+# portals). Same model, knowledge bundles, section examples, tenants and answer
+# settings as app.py (serving_config.py); no script reruns, CSS or sidebar per
+# request. An unknown "tenant" is a 404; leaving it out asks the default one.
+#
+#   python api_server.py --port 8000 --workers 2 --max-concurrency 8
+#
+#   POST /ask        {"question": "How do I enroll?", "tenant": "tip-2025"}
+#   POST /ask_batch  {"questions": ["...", "..."], "tenant": "tip-2025"}
+#   POST /feedback   {"question", "answer", "section", "confidence", "helpful", "tenant"}
+#   GET  /health     GET /metrics
+#
+# The event loop only parses and serializes; the pipeline runs on a pool of
+# worker threads. At most --max-concurrency pipeline calls run at once and at
+# most --max-pending wait for a slot; beyond that requests get 503 at once.
+# ============================================================================
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from chunk_store import ChunkStore
+from chunker import ManualChunker
+from corpus_registry import CorpusRegistry, load_tenants
+from feedback_log import append_feedback
+from knowledge_bundle import build_knowledge_base, normalize_rows, open_bundle_if_fresh, source_meta
+from metrics import CONTENT_TYPE, AssistantMetrics
+from qa_pipeline import answer_question
+from request_log import RequestLogger, request_record
+from semantic_cache import SemanticAnswerCache
+from static_encoder import StaticFirstStage, open_static_encoder
+from serving_config import (ANSWER_CACHE_SIZE, BUNDLE_FILE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, DEFAULT_TENANT,
+                            EMBEDDING_DIM, FEEDBACK_PATH, INDEX_MEMORY_BUDGET_MB, INDEX_PROJECTION,
+                            INDEX_PROJECTION_DIM, MANUAL_DATA_FILE, MODEL_PATH, RERANKER_MODEL, SECTION_EXAMPLES_FILE,
+                            SEMANTIC_CACHE_THRESHOLD, STATIC_ENCODER_FILE, STATIC_FIRST_STAGE_CANDIDATES,
+                            TENANTS_FILE, answer_cache_version, answer_settings, create_reranker, default_tenants)
+
+REQUEST_LOG_FILE = "logs/api_requests.jsonl"
+WORKERS = max(1, min(4, os.cpu_count() or 1))   # pipeline threads
+MAX_CONCURRENCY = 16             # pipeline calls in flight
+MAX_PENDING = 256                # requests waiting for a slot before 503
+MAX_BATCH_QUESTIONS = 64
+MAX_QUESTION_CHARS = 1000
+ENCODE_BATCH_SIZE = 64
+
+
+# ============================================================================
+# SERVICE - blocking, called from the worker pool
+# ============================================================================
+
+class AssistantService:
+    """Model, per-tenant knowledge bases and answer caches shared by every request."""
+
+    def __init__(self, args):
+        from sentence_transformers import SentenceTransformer
+
+        self.args = args
+        self.model = SentenceTransformer(args.model, truncate_dim=args.dim)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.reranker = create_reranker(args.reranker)
+        tenants = load_tenants(args.tenants, default_tenants(args.manual, args.examples, args.bundle))
+        self.registry = CorpusRegistry(tenants, self._load_tenant,
+                                       INDEX_MEMORY_BUDGET_MB * 2**20, default_tenant=DEFAULT_TENANT)
+        self.metrics = AssistantMetrics()
+        self.request_log = RequestLogger(args.request_log) if args.request_log else None
+        self.static = None
+        if STATIC_FIRST_STAGE_CANDIDATES:
+            self.static = open_static_encoder(STATIC_ENCODER_FILE, args.model, args.dim)
+        self._caches = {}
+        self._first_stages = {}         # tenant_id -> (kb version, StaticFirstStage)
+        self._cache_lock = threading.Lock()
+
+    def _load_tenant(self, tenant):
+        kb = open_bundle_if_fresh(tenant.get("bundle"), self.args.model, tenant["manual"], tenant["examples"],
+                                  self.dim, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                                  INDEX_PROJECTION, INDEX_PROJECTION_DIM)
+        if kb is None:
+            with open(tenant["manual"], 'r', encoding='utf-8') as f:
+                manual_sections = json.load(f)
+            with open(tenant["examples"], 'r', encoding='utf-8') as f:
+                section_examples = json.load(f)
+            chunker = ManualChunker(self.args.model, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+            start = time.perf_counter()
+            kb = build_knowledge_base(self.model, ChunkStore.from_manual(manual_sections, chunker), section_examples,
+                                      meta=source_meta(self.args.model, tenant["manual"], tenant["examples"],
+                                                       CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS),
+                                      projection=INDEX_PROJECTION, projection_dim=INDEX_PROJECTION_DIM)
+            self.metrics.index_build_seconds.observe(time.perf_counter() - start)
+        return kb
+
+    def knowledge(self, tenant_id):
+        tenant_id = self.registry.resolve(tenant_id)
+        kb = self.registry.get(tenant_id)
+        self.metrics.index_chunks.set(len(kb.store), tenant=tenant_id)
+        self.metrics.index_bytes.set(kb.nbytes, tenant=tenant_id)
+        return tenant_id, kb
+
+    def _cache(self, tenant_id, kb):
+        if self.args.no_cache:
+            return None
+        with self._cache_lock:
+            cache = self._caches.get(tenant_id)
+            if cache is None:
+                cache = self._caches[tenant_id] = SemanticAnswerCache(
+                    kb.dim, capacity=ANSWER_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD)
+        cache.ensure_version(answer_cache_version(kb, self.args.reranker))
+        return cache
+
+    def _first_stage(self, tenant_id, kb):
+        """Static-encoder candidate retrieval over the tenant's chunks, as in app.py; None when off."""
+        if self.static is None:
+            return None
+        with self._cache_lock:
+            version, first_stage = self._first_stages.get(tenant_id, (None, None))
+        if version != kb.version:
+            with open(self.registry.tenants[tenant_id]["examples"], 'r', encoding='utf-8') as f:
+                section_examples = json.load(f)
+            static_kb = build_knowledge_base(self.static, kb.store, section_examples,
+                                             meta=dict(kb.meta, static_encoder=STATIC_ENCODER_FILE))
+            first_stage = StaticFirstStage(self.static, static_kb, STATIC_FIRST_STAGE_CANDIDATES)
+            with self._cache_lock:
+                self._first_stages[tenant_id] = (kb.version, first_stage)
+        return first_stage
+
+    def _answer(self, question, tenant_id, kb, cache, question_embed=None):
+        start = time.perf_counter()
+        try:
+            result = answer_question(question, self.model, kb, cache=cache, question_embed=question_embed,
+                                     **answer_settings(self.reranker, self._first_stage(tenant_id, kb)))
+        except Exception:
+            self.metrics.errors.inc(where="api_ask")
+            raise
+        self.metrics.observe_answer(result, tenant_id, time.perf_counter() - start)
+        if self.request_log:
+            self.request_log.log(request_record(question, result, tenant_id))
+        return response_body(result, tenant_id, kb)
+
+    def ask(self, question, tenant_id):
+        tenant_id, kb = self.knowledge(tenant_id)
+        return self._answer(question, tenant_id, kb, self._cache(tenant_id, kb))
+
+    def ask_batch(self, questions, tenant_id):
+        """Answer several questions with one batched encode for those not answered by the exact cache."""
+        tenant_id, kb = self.knowledge(tenant_id)
+        cache = self._cache(tenant_id, kb)
+        pending = [q for q in dict.fromkeys(questions) if cache is None or not cache.contains(q)]
+        embeds = {}
+        if pending:
+            vectors = normalize_rows(self.model.encode(pending, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False))
+            embeds = {q: v[None, :] for q, v in zip(pending, vectors)}
+            self.metrics.encode_batch_size.observe(len(pending), caller="api_batch")
+        return [self._answer(q, tenant_id, kb, cache, embeds.get(q)) for q in questions]
+
+    def feedback(self, row, tenant_id):
+        """Append one row to the feedback CSV app.py writes (same columns)."""
+        try:
+            append_feedback(self.args.feedback, dict(row, tenant=tenant_id), legacy_tenant=DEFAULT_TENANT)
+        except OSError:
+            self.metrics.errors.inc(where="api_feedback")
+            raise
+        self.metrics.feedback_writes.inc(helpful=row["helpful"])
+
+
+def response_body(result, tenant_id, kb):
+    """JSON-safe answer with its sources (answer_question keeps only chunk ids)."""
+    sources = [{"chunk_id": int(chunk_id), "section": kb.store[chunk_id].section, "score": round(float(score), 4),
+                "text": kb.store[chunk_id].chunk_text}
+               for chunk_id, score in zip(result["top_chunk_ids"], result["similarities"])]
+    return {
+        "tenant": tenant_id,
+        "answer": result["answer"],
+        "section": result["section"],
+        "section_confidence": round(float(result["section_confidence"]), 4),
+        "confidence": round(float(result["confidence"]), 4),
+        "sources": sources,
+        "cache": result.get("cache"),
+        "timings_ms": {stage: round(s * 1000, 3) for stage, s in (result.get("timings") or {}).items()},
+    }
+
+
+# ============================================================================
+# HTTP LAYER - async, never runs the pipeline on the event loop
+# ============================================================================
+
+class AdmissionGate:
+    """At most `max_concurrency` calls in the worker pool and `max_pending` waiting; 503 beyond that."""
+
+    def __init__(self, executor, max_concurrency, max_pending):
+        self.executor = executor
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.pending = 0
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(503, "Too many requests in flight, retry shortly", headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.pending -= 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        # The slot is freed when the thread finishes, even if the client disconnected before that
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.shield(future)
+
+
+async def read_json(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(400, "Request body must be a JSON object")
+    return body
+
+
+def checked_question(question):
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPException(400, "'question' must be a non-empty string")
+    if len(question) > MAX_QUESTION_CHARS:
+        raise HTTPException(413, f"Questions are limited to {MAX_QUESTION_CHARS} characters")
+    return question.strip()
+
+
+def checked_tenant(service, tenant_id):
+    """The requested tenant; without one the default. Unknown ids are a 404, never another tenant's manual."""
+    if tenant_id is None:
+        return service.registry.default_tenant
+    if not isinstance(tenant_id, str) or tenant_id not in service.registry.tenants:
+        raise HTTPException(404, f"Unknown tenant {tenant_id!r}")
+    return tenant_id
+
+
+async def ask(request):
+    body = await read_json(request)
+    question = checked_question(body.get("question"))
+    service, gate = request.app.state.service, request.app.state.gate
+    tenant_id = checked_tenant(service, body.get("tenant"))
+    return JSONResponse(await gate.run(service.ask, question, tenant_id))
+
+
+async def ask_batch(request):
+    body = await read_json(request)
+    questions = body.get("questions")
+    if not isinstance(questions, list) or not questions:
+        raise HTTPException(400, "'questions' must be a non-empty list")
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(413, f"At most {MAX_BATCH_QUESTIONS} questions per batch")
+    questions = [checked_question(q) for q in questions]
+    service, gate = request.app.state.service, request.app.state.gate
+    tenant_id = checked_tenant(service, body.get("tenant"))
+    return JSONResponse({"answers": await gate.run(service.ask_batch, questions, tenant_id)})
+
+
+async def feedback(request):
+    body = await read_json(request)
+    if not isinstance(body.get("helpful"), bool):
+        raise HTTPException(400, "'helpful' must be true or false")
+    try:
+        confidence = round(float(body.get("confidence") or 0.0), 3)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "'confidence' must be a number")
+    row = {"question": checked_question(body.get("question")), "answer": str(body.get("answer") or ""),
+           "section": str(body.get("section") or ""), "confidence": confidence, "helpful": body["helpful"]}
+    service = request.app.state.service
+    await request.app.state.gate.run(service.feedback, row, checked_tenant(service, body.get("tenant")))
+    return JSONResponse({"ok": True})
+
+
+async def health(request):
+    service, gate = request.app.state.service, request.app.state.gate
+    return JSONResponse({"status": "ok", "model": service.args.model, "dim": service.dim,
+                         "pending": gate.pending, "corpus": service.registry.stats()})
+
+
+async def http_error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+
+
+async def metrics(request):
+    return PlainTextResponse(request.app.state.service.metrics.registry.render(), media_type=CONTENT_TYPE)
+
+
+def create_app(service, workers=WORKERS, max_concurrency=MAX_CONCURRENCY, max_pending=MAX_PENDING):
+    app = Starlette(routes=[
+        Route("/ask", ask, methods=["POST"]),
+        Route("/ask_batch", ask_batch, methods=["POST"]),
+        Route("/feedback", feedback, methods=["POST"]),
+        Route("/health", health),
+        Route("/metrics", metrics),
+    ], exception_handlers={HTTPException: http_error})
+    app.state.service = service
+    app.state.gate = AdmissionGate(ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa-worker"),
+                                   max_concurrency, max_pending)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP JSON API for the Smartual QA pipeline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="serving embedding dimension")
+    parser.add_argument("--manual", default=MANUAL_DATA_FILE)
+    parser.add_argument("--examples", default=SECTION_EXAMPLES_FILE)
+    parser.add_argument("--bundle", default=BUNDLE_FILE)
+    parser.add_argument("--tenants", default=TENANTS_FILE)
+    parser.add_argument("--reranker", default=RERANKER_MODEL, help="cross-encoder model name (serving_config.py)")
+    parser.add_argument("--no-cache", action="store_true", help="disable the answer cache")
+    parser.add_argument("--feedback", default=FEEDBACK_PATH)
+    parser.add_argument("--request-log", default=REQUEST_LOG_FILE, help="JSONL request log ('' disables it)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="pipeline worker threads")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    args = parser.parse_args()
+
+    import torch
+    # Each worker runs its own encode; split the cores instead of every worker using all of them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.workers))
+
+    service = AssistantService(args)
+    service.knowledge(service.registry.default_tenant)   # load the default index before accepting requests
+    print(f"🚀 Smartual API on http://{args.host}:{args.port} ({args.workers} workers, "
+          f"{args.max_concurrency} concurrent, {args.max_pending} pending)")
+    uvicorn.run(create_app(service, args.workers, args.max_concurrency, args.max_pending),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
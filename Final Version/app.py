@@ -5,19 +5,39 @@
 # ============================================================================
 
 
-import zipfile
 import gdown
 import os
 import json
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
-import numpy as np
-import faiss
 import requests
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from chunker import ManualChunker
+from chunk_store import ChunkStore
+from knowledge_bundle import build_knowledge_base, open_bundle_if_fresh, source_meta
+from semantic_cache import SemanticAnswerCache
+from typeahead import build_typeahead
+from feedback_log import append_feedback
+from qa_pipeline import answer_question, lexical_answer, warm_cache
+from lexical_index import LexicalIndex
+from admission import ConcurrencyGate
+from corpus_registry import CorpusRegistry, load_tenants
+from static_encoder import StaticFirstStage, open_static_encoder
+from profiling import RequestProfiler
+from metrics import AssistantMetrics, start_metrics_server
+from request_log import RequestLogger, request_record
+from serving_config import (ANSWER_CACHE_SIZE, ANSWER_MAX_SENTENCES, ANSWER_SOURCE_CHUNKS, CHUNK_MAX_TOKENS,
+                            CHUNK_OVERLAP_TOKENS, DEFAULT_TENANT, EMBEDDING_DIM, FEEDBACK_PATH,
+                            INDEX_MEMORY_BUDGET_MB, INDEX_PROJECTION, INDEX_PROJECTION_DIM, MANUAL_DATA_FILE,
+                            MODEL_PATH, RERANKER_MODEL, SECTION_EXAMPLES_FILE, SEMANTIC_CACHE_THRESHOLD,
+                            STATIC_ENCODER_FILE, STATIC_FIRST_STAGE_CANDIDATES, TENANTS_FILE, TOP_K,
+                            answer_cache_version, create_reranker, default_tenants)
+import serving_config
+from concurrent.futures import ThreadPoolExecutor
+import html
+import hmac
 import time
-from datetime import datetime
 
 # ============================================================================
 # CONFIGURATION & COLOR PALETTE
@@ -38,8 +58,42 @@ if not os.path.exists("TIP LOGO.jpg"):
         print(f"❌ Error downloading logo: {e}")
 
 
-MANUAL_DATA_FILE = "manual_data.json"
-SECTION_EXAMPLES_FILE = "section_examples.json"
+# Model, manual, index and answer settings are shared with api_server.py: see serving_config.py
+
+SAMPLE_QUESTIONS = [
+    "What are the admission requirements for T.I.P.?",
+    "How is the final grade computed in courses?",
+    "What scholarships are available for students?",
+    "What is the policy on academic probation?",
+    "How many absences are allowed per semester?",
+    "What services does the T.I.P. library offer?",
+    "How can I request for official documents?",
+    "What are the guidelines for thesis writing?"
+]
+TYPEAHEAD_SUGGESTIONS = 5        # Suggestions shown under the question box
+
+# Opt-in profiling (profiling.py): folded-stack or cProfile files, oldest deleted beyond the caps
+PROFILE_ENV = "SMARTUAL_PROFILE"                  # "1" = profile every question
+PROFILE_STARTUP_ENV = "SMARTUAL_PROFILE_STARTUP"  # "1" = profile load_model and build_index
+PROFILE_TOKEN_ENV = "SMARTUAL_PROFILE_TOKEN"      # enables ?profile=<token> to profile one admin's questions
+PROFILE_DIR = "profiles"
+PROFILE_MODE = "sampling"        # or "deterministic" (cProfile)
+PROFILE_MAX_FILES = 200
+PROFILE_MAX_MB = 50
+METRICS_HOST = "127.0.0.1"       # Prometheus-style metrics: http://127.0.0.1:9464/metrics
+METRICS_PORT = 9464              # None disables the endpoint (metrics are still recorded)
+REQUEST_LOG_FILE = "logs/requests.jsonl"   # one JSON line per question (hashed); None disables the log
+REQUEST_LOG_SAMPLE_RATE = 1.0    # fraction of questions logged
+REQUEST_LOG_MAX_MB = 50          # rotate the log at this size...
+REQUEST_LOG_ROTATE_HOURS = 24    # ...or age; rotated segments are gzipped
+REQUEST_LOG_BACKUPS = 30         # rotated segments kept
+
+# Admission control around the encoder (admission.py); shed questions are answered without the transformer
+PIPELINE_CONCURRENCY = 2         # questions in the pipeline at once (each encode already uses every core)
+PIPELINE_QUEUE = 16              # questions waiting for a slot; more are shed at once
+REQUEST_DEADLINE_S = 5.0         # questions that could not be answered by then are shed instead of waiting
+
+PROFILER = RequestProfiler(PROFILE_DIR, PROFILE_MODE, max_files=PROFILE_MAX_FILES, max_bytes=PROFILE_MAX_MB * 2**20)
 
 manual_data = {
   "General Information": "\nT.I.P. General Information: The Technological Institute of the Philippines (T.I.P.) was established on February 8, 1962, \nby Engineer Demetrio A. Quirino, Jr. and Dr. Teresita U. Quirino as a private non-sectarian stock school in Manila.\n\nVision: We envision a better life for Filipinos by empowering our students with the best globally competitive technological \neducation in engineering, computing, and allied disciplines.\n\nMission: Through digitalization and innovation in academic design and delivery, T.I.P. students, faculty, staff and industry \npartners work together in both traditional and online/flexible learning to transform our students to achieve optimal students outcomes.\n\nCore Values: Commitment to Continuous Improvement and Innovation, Collaborative Mindset, Community Spirit, Service Orientedness, \nPositive Attitude for Learning and Working, Effective and Open Communication, Digitally Savvy.\n\nGraduate Attributes: Professional Competence, Communication Skills, Critical Thinking and Problem Solving Skills, \nSocial and Ethical Responsibility, Interpersonal Skills, Productivity, Lifelong Learning.\n\nProgram Offerings include Engineering and Architecture (BSArch, BSChE, BSCE, BSCpE, BSEE, BSECE, BSEnSE, BSIE, BSME), \nComputer Studies (BSCS, BSDSA, BSIT, BSIS, BSEMC), Business Education (BSA, BSAIS, BSBA), Teacher Education (BSEd, BSNEd, TCP), \nand Arts programs.\n\nAwards and Recognitions: T.I.P. Manila and T.I.P. Quezon City were awarded Autonomous Status by CHED in April 2016. \nThe institution has ABET accreditation, Seoul Accord recognition, and AUN-QA assessment for select programs.\n",
@@ -184,9 +238,7 @@ with open(SECTION_EXAMPLES_FILE, 'w', encoding='utf-8') as f:
     json.dump(section_examples, f, indent=2, ensure_ascii=False)
 
 
-FEEDBACK_PATH = "feedback_log.csv"
 SCHOOL_LOGO = "tip_logo.png"
-CHUNK_SIZE = 300
 
 
 # ============================================================================
@@ -256,7 +308,6 @@ if missing_essential:
 else:
     print("🎯 All essential model files downloaded successfully!")
 
-MODEL_PATH = "smartual_model"
 print(f"🎯 Using model path: {MODEL_PATH}")
 
 
@@ -273,161 +324,214 @@ WARNING = "#FF6D00"      # Attention Orange
 # CORE FUNCTIONS
 # ============================================================================
 
-@st.cache_data
-def load_manual_from_json():
-    """Load the pre-structured T.I.P. Student Manual data from JSON file."""
-    if not os.path.exists(MANUAL_DATA_FILE):
-        st.error(f"Manual data file '{MANUAL_DATA_FILE}' not found!")
-        return {}, []
+def load_manual_from_json(manual_file=MANUAL_DATA_FILE):
+    """Load a pre-structured T.I.P. Student Manual JSON file into a columnar chunk store."""
+    if not os.path.exists(manual_file):
+        st.error(f"Manual data file '{manual_file}' not found!")
+        return ChunkStore.from_manual({}, None), []
     
-    with open(MANUAL_DATA_FILE, 'r', encoding='utf-8') as f:
+    with open(manual_file, 'r', encoding='utf-8') as f:
         manual_sections = json.load(f)
     
-    # Create chunks from each section
-    chunks = []
-    for section_name, section_text in manual_sections.items():
-        sentences = [s.strip() for s in section_text.split('. ') if s.strip()]
-        
-        current_chunk = []
-        current_word_count = 0
-        
-        for sentence in sentences:
-            words = sentence.split()
-            if current_word_count + len(words) <= CHUNK_SIZE:
-                current_chunk.append(sentence)
-                current_word_count += len(words)
-            else:
-                if current_chunk:
-                    chunk_text = '. '.join(current_chunk) + '.'
-                    chunks.append({
-                        "section": section_name,
-                        "chunk_text": chunk_text,
-                        "section_text": section_text,
-                    })
-                current_chunk = [sentence]
-                current_word_count = len(words)
-        
-        if current_chunk:
-            chunk_text = '. '.join(current_chunk) + '.'
-            chunks.append({
-                "section": section_name,
-                "chunk_text": chunk_text,
-                "section_text": section_text,
-            })
+    # Create chunks that fit the model's sequence budget (no silent truncation at encode time)
+    chunker = ManualChunker(MODEL_PATH, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+    chunks = ChunkStore.from_manual(manual_sections, chunker)
     
     all_sections = list(manual_sections.keys())
     return chunks, all_sections
 
-@st.cache_data
-def load_section_examples():
+def load_section_examples(examples_file=SECTION_EXAMPLES_FILE):
     """Load example questions for in-context classification."""
-    if not os.path.exists(SECTION_EXAMPLES_FILE):
-        st.warning(f"Section examples file '{SECTION_EXAMPLES_FILE}' not found!")
+    if not os.path.exists(examples_file):
+        st.warning(f"Section examples file '{examples_file}' not found!")
         return {}
     
-    with open(SECTION_EXAMPLES_FILE, 'r', encoding='utf-8') as f:
+    with open(examples_file, 'r', encoding='utf-8') as f:
         examples = json.load(f)
     return examples
 
 @st.cache_resource
+def load_metrics():
+    """Process-wide metrics, served on METRICS_PORT once per process."""
+    metrics = AssistantMetrics()
+    if METRICS_PORT:
+        start_metrics_server(metrics.registry, METRICS_HOST, METRICS_PORT)
+    return metrics
+
+@st.cache_resource
+def load_request_logger():
+    """Process-wide JSONL request log, written by a background thread."""
+    if not REQUEST_LOG_FILE:
+        return None
+    return RequestLogger(REQUEST_LOG_FILE, REQUEST_LOG_SAMPLE_RATE, max_bytes=REQUEST_LOG_MAX_MB * 2**20,
+                         rotate_seconds=REQUEST_LOG_ROTATE_HOURS * 3600, backups=REQUEST_LOG_BACKUPS)
+
+@st.cache_resource
+def load_admission_gate():
+    """Process-wide gate: every session's questions share the same encoder and cores."""
+    return ConcurrencyGate(PIPELINE_CONCURRENCY, PIPELINE_QUEUE, max_estimate_s=REQUEST_DEADLINE_S)
+
+@st.cache_resource
+def load_lexical_index(tenant_id, kb_version, _kb):
+    """Keyword index of the tenant's chunks, for answers shed by admission control."""
+    return LexicalIndex(_kb.store)
+
+def profile_startup():
+    return os.environ.get(PROFILE_STARTUP_ENV) == "1"
+
+def profiling_requested():
+    """Profile this question: for everyone via the env var, or for an admin via ?profile=<token>."""
+    if os.environ.get(PROFILE_ENV) == "1":
+        return True
+    token = os.environ.get(PROFILE_TOKEN_ENV)
+    return bool(token) and hmac.compare_digest(st.query_params.get("profile", ""), token)
+
+@st.cache_resource
+@PROFILER.wrap("load_model", profile_startup)
 def load_model():
     """Load the sentence transformer model - FIXED VERSION"""
+    metrics = load_metrics()
+    start = time.perf_counter()
     try:
         # FIRST try to load your custom model
         print(f"🔄 Attempting to load custom model from: {MODEL_PATH}")
-        model = SentenceTransformer(MODEL_PATH)
+        model = SentenceTransformer(MODEL_PATH, truncate_dim=EMBEDDING_DIM)
         print("✅ Loaded custom model successfully!")
         
         # Test the model to ensure it works
         test_embedding = model.encode(["test sentence"], show_progress_bar=False)
         print(f"✅ Model test passed. Embedding dimension: {test_embedding.shape[1]}")
         
+        metrics.model_load_seconds.set(time.perf_counter() - start)
         return model
         
     except Exception as e:
         print(f"❌ Failed to load custom model: {e}")
+        metrics.errors.inc(where="load_model")
         st.warning("⚠️ Using fallback model instead of custom model")
         
         # Fallback: try to use the Hugging Face model
         try:
-            model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+            model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', truncate_dim=EMBEDDING_DIM)
             print("✅ Loaded fallback model: all-MiniLM-L6-v2")
+            metrics.model_load_seconds.set(time.perf_counter() - start)
             return model
         except Exception as e2:
+            metrics.errors.inc(where="load_model")
             st.error(f"❌ Failed to load fallback model: {e2}")
             st.stop()
             
 @st.cache_resource
-def build_index(_chunks, _model):
-    """Create FAISS index for all chunks and save embeddings."""
-    texts = [chunk["chunk_text"] for chunk in _chunks]
-    chunk_embeddings = np.array(_model.encode(texts, show_progress_bar=False)).astype("float32")
-    
-    index = faiss.IndexFlatL2(chunk_embeddings.shape[1])
-    index.add(chunk_embeddings)
-    
-    return index, chunk_embeddings
+def load_model_in_background():
+    """Start loading the transformer in a thread, so pages can be served meanwhile (see serving_model)."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader").submit(load_model)
 
-def classify_question(question, model, section_examples):
-    """Use in-context examples to classify question's section by similarity."""
-    question_embed = model.encode([question])[0]
-    best_section = None
-    best_score = -1
-    
-    for section, examples in section_examples.items():
-        example_embeds = model.encode(examples, show_progress_bar=False)
-        sim = cosine_similarity([question_embed], example_embeds).mean()
-        if sim > best_score:
-            best_section = section
-            best_score = sim
-    
-    return best_section, float(best_score)
+@st.cache_resource
+def load_static_encoder():
+    """Static fallback encoder distilled from MODEL_PATH; None if it was not built (or is stale)."""
+    encoder = open_static_encoder(STATIC_ENCODER_FILE, MODEL_PATH, EMBEDDING_DIM)
+    if encoder is not None:
+        print(f"✅ Loaded static fallback encoder: {STATIC_ENCODER_FILE}")
+    return encoder
 
-def retrieve_chunks(question, model, chunks, index, chunk_embeddings, top_k=3):
-    """Retrieve the top K most similar chunks using FAISS."""
-    question_embed = np.array(model.encode([question], show_progress_bar=False)).astype("float32")
-    _, I = index.search(question_embed, top_k)
-    
-    top_chunks = [chunks[i] for i in I[0]]
-    similarities = cosine_similarity(question_embed, chunk_embeddings[I[0]]).flatten()
-    
-    return top_chunks, similarities
+def serving_model():
+    """(model, degraded): the transformer once loaded, the static encoder while it is still loading.
 
-def generate_answer(question, top_chunk, model):
-    """Extract 2-3 most relevant sentences from top chunk."""
-    sentences = [s.strip() for s in top_chunk["chunk_text"].split('. ') if s.strip() and len(s.strip()) > 10]
-    
-    if not sentences:
-        return top_chunk["chunk_text"][:200] + "...", 0.5
-    
-    sent_embeds = model.encode(sentences, show_progress_bar=False)
-    q_embed = model.encode([question], show_progress_bar=False)
-    
-    sims = cosine_similarity(q_embed, sent_embeds).flatten()
-    top_idx = sims.argsort()[-3:][::-1]
-    key_sentences = [sentences[i] for i in top_idx]
-    
-    answer = '. '.join(key_sentences) + '.'
-    confidence = float(sims[top_idx[0]]) if len(top_idx) > 0 else 0.5
-    
-    return answer, confidence
+    Without a static encoder this waits for the transformer, as before.
+    """
+    static = load_static_encoder()
+    if static is None:
+        return load_model(), False
+    future = load_model_in_background()
+    if not future.done():
+        return static, True
+    if future.exception() is not None:
+        return load_model(), False   # retry in the script thread, where errors can be shown
+    return future.result(), False
+
+def serving_dimension():
+    """Served embedding size, known from the static encoder before the transformer has loaded."""
+    return (load_static_encoder() or load_model()).get_sentence_embedding_dimension()
+
+@st.cache_resource
+def load_reranker():
+    """Load the optional cross-encoder reranker; None when disabled or unavailable."""
+    if not RERANKER_MODEL:
+        return None
+    try:
+        reranker = create_reranker(RERANKER_MODEL)
+        print(f"✅ Loaded reranker: {RERANKER_MODEL}")
+        return reranker
+    except Exception as e:
+        print(f"❌ Failed to load reranker {RERANKER_MODEL}, answering without it: {e}")
+        return None
+
+@st.cache_resource
+def load_answer_cache(tenant_id, dim):
+    """Per-tenant answer cache shared by all sessions (chunk ids in answers are tenant specific)."""
+    return SemanticAnswerCache(dim, capacity=ANSWER_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD)
+
+def build_index(chunks, model, section_examples, meta=None):
+    """Encode chunks, sentences and section examples and create the FAISS index."""
+    metrics = load_metrics()
+    start = time.perf_counter()
+    with PROFILER.profile("build_index", profile_startup()):
+        kb = build_knowledge_base(model, chunks, section_examples, meta=meta, projection=INDEX_PROJECTION,
+                                  projection_dim=INDEX_PROJECTION_DIM)
+    metrics.index_build_seconds.observe(time.perf_counter() - start)
+    metrics.encode_batch_size.observe(len(kb.store), caller="build_index")
+    metrics.encode_batch_size.observe(len(kb.sentence_embeddings), caller="build_index")
+    return kb
+
+def load_tenant_knowledge(tenant):
+    """Knowledge base for one tenant: its bundle if fresh, otherwise built in-process."""
+    kb = open_bundle_if_fresh(tenant.get("bundle"), MODEL_PATH, tenant["manual"], tenant["examples"],
+                              serving_dimension(), CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                              INDEX_PROJECTION, INDEX_PROJECTION_DIM)
+    if kb is None:
+        # Building needs the transformer (during warm-up this waits for it)
+        chunks, _ = load_manual_from_json(tenant["manual"])
+        kb = build_index(chunks, load_model(), load_section_examples(tenant["examples"]),
+                         meta=source_meta(MODEL_PATH, tenant["manual"], tenant["examples"],
+                                          CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS))
+    return kb
+
+@st.cache_resource
+def load_corpus_registry():
+    """One registry per process; every tenant's index shares the single loaded model."""
+    tenants = load_tenants(TENANTS_FILE, default_tenants())
+    return CorpusRegistry(tenants, load_tenant_knowledge,
+                          INDEX_MEMORY_BUDGET_MB * 2**20, default_tenant=DEFAULT_TENANT)
 
-def save_feedback(question, answer, section, confidence, helpful):
+def highlight_chunk(chunk, spans):
+    """Render chunk text as HTML with the answer sentence spans marked."""
+    text = chunk.store.text
+    pieces = []
+    cursor = chunk.start
+    for start, end in sorted(s for s in spans if chunk.start <= s[0] and s[1] <= chunk.end):
+        pieces.append(html.escape(text[cursor:start]))
+        pieces.append(f"<mark>{html.escape(text[start:end])}</mark>")
+        cursor = end
+    pieces.append(html.escape(text[cursor:chunk.end]))
+    return ''.join(pieces).replace('\n', '<br>')
+
+def save_feedback(question, answer, section, confidence, helpful, tenant_id):
     """Append user feedback to a CSV file."""
     feedback = {
-        "timestamp": pd.Timestamp.now(),
         "question": question,
         "answer": answer,
         "section": section,
         "confidence": round(confidence, 3),
         "helpful": helpful,
+        "tenant": tenant_id,
     }
-    df = pd.DataFrame([feedback])
     
-    if not os.path.exists(FEEDBACK_PATH):
-        df.to_csv(FEEDBACK_PATH, index=False)
-    else:
-        df.to_csv(FEEDBACK_PATH, mode='a', header=False, index=False)
+    try:
+        append_feedback(FEEDBACK_PATH, feedback, legacy_tenant=DEFAULT_TENANT)
+    except OSError:
+        load_metrics().errors.inc(where="save_feedback")
+        raise
+    load_metrics().feedback_writes.inc(helpful=helpful)
 
 def count_sections_from_feedback():
     """Count section frequency for analytics."""
@@ -650,9 +754,19 @@ def main():
     
     # Show loading message
     with st.spinner("🔄 Loading AI model and resources..."):
-        model = load_model()
-        chunks, all_sections = load_manual_from_json()
-        section_examples = load_section_examples()
+        model, degraded = serving_model()
+        registry = load_corpus_registry()
+        tenant_id = registry.resolve(st.query_params.get("tenant", DEFAULT_TENANT))
+        kb = registry.get(tenant_id)
+        load_metrics().index_chunks.set(len(kb.store), tenant=tenant_id)
+        load_metrics().index_bytes.set(kb.nbytes, tenant=tenant_id)
+        if degraded:
+            kb = load_static_knowledge(tenant_id, kb.version, model, kb)
+            typeahead = None
+        else:
+            typeahead = load_typeahead(tenant_id, model, kb)
+        chunks = kb.store
+        all_sections = chunks.section_names
 
     
     # Display which model is being used
@@ -667,8 +781,6 @@ def main():
       #  return
     
     
-    index, chunk_embeds = build_index(chunks, model)
-    
     # ========================================================================
     # SIDEBAR - MODERN DESIGN
     # ========================================================================
@@ -708,6 +820,7 @@ def main():
             st.metric("📚 Total Chunks", len(chunks))
         with col2:
             st.metric("📑 Sections", len(all_sections))
+        st.caption(f"📘 {registry.tenants[tenant_id]['name']}")
     
     # ========================================================================
     # MAIN CONTENT - REACT-STYLE COMPONENTS
@@ -727,11 +840,11 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # HOME PAGE (React-style conditional rendering)
-    if st.session_state.current_answer is None:
-        render_home_page(model, chunks, index, chunk_embeds, section_examples, all_sections)
-    else:
-        render_results_page()
+    if degraded:
+        st.info("⚡ The AI model is still loading - answers come from a faster, less precise encoder for now.")
+    
+    # HOME / RESULTS PAGE - a fragment: its clicks rerun only the page, not the CSS, header and sidebar above
+    render_page(model, kb, tenant_id, typeahead, degraded)
     
     # FOOTER
     st.markdown("---")
@@ -742,7 +855,25 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
-def render_home_page(model, chunks, index, chunk_embeds, section_examples, all_sections):
+@st.fragment
+def render_page(model, kb, tenant_id, typeahead, degraded=False):
+    """Home or results page (React-style conditional rendering), rerun on its own."""
+    if degraded and load_model_in_background().done():
+        st.rerun()   # transformer ready: a full rerun swaps it in and drops the banner
+    if st.session_state.current_answer is None:
+        render_home_page(model, kb, tenant_id, typeahead, degraded)
+    else:
+        # Chunk ids refer to the store of the tenant that answered, even if ?tenant changed since
+        render_results_page(load_corpus_registry().get(st.session_state.current_answer['tenant']).store)
+
+def rerun_page():
+    """Rerun only the page fragment; a click handled in a full-app run (e.g. under AppTest) reruns the app."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def render_home_page(model, kb, tenant_id, typeahead, degraded=False):
     """Render the home page component (React-style)"""
     
     # Welcome Section with School Logo
@@ -788,37 +919,38 @@ def render_home_page(model, chunks, index, chunk_embeds, section_examples, all_s
     with col2:
         ask_pressed = st.button("🚀 **ASK**", type="primary", use_container_width=True)
     
+    # Typeahead suggestions for what was typed; their answers are precomputed in the answer cache
+    if question.strip() and not ask_pressed and typeahead is not None:
+        typeahead.add_from_feedback(FEEDBACK_PATH, tenant_id, DEFAULT_TENANT)
+        suggestions = typeahead.suggest(question, limit=TYPEAHEAD_SUGGESTIONS)
+        if suggestions:
+            st.markdown("#### 🔎 Suggested Questions")
+            for i, suggestion in enumerate(suggestions):
+                if st.button(f"➡️ {suggestion}", key=f"suggestion_{i}", use_container_width=True):
+                    st.session_state.current_question = suggestion
+                    process_question(suggestion, model, kb, tenant_id, degraded)
+                    rerun_page()
+    
     # Sample Questions
     st.markdown("### 💡 Sample Questions")
     sample_cols = st.columns(2)
     
-    samples = [
-        "What are the admission requirements for T.I.P.?",
-        "How is the final grade computed in courses?",
-        "What scholarships are available for students?",
-        "What is the policy on academic probation?",
-        "How many absences are allowed per semester?",
-        "What services does the T.I.P. library offer?",
-        "How can I request for official documents?",
-        "What are the guidelines for thesis writing?"
-    ]
-    
-    for i, sample in enumerate(samples):
+    for i, sample in enumerate(SAMPLE_QUESTIONS):
         with sample_cols[i % 2]:
             if st.button(f"📌 {sample}", key=f"sample_{i}", use_container_width=True):
                 st.session_state.current_question = sample
-                process_question(sample, model, chunks, index, chunk_embeds, section_examples)
-                st.rerun()
+                process_question(sample, model, kb, tenant_id, degraded)
+                rerun_page()
     
     # Manual ask processing
     if ask_pressed and question.strip():
         st.session_state.current_question = question
-        process_question(question, model, chunks, index, chunk_embeds, section_examples)
-        st.rerun()
+        process_question(question, model, kb, tenant_id, degraded)
+        rerun_page()
     elif ask_pressed:
         st.warning("⚠️ Please enter a question first!")
 
-def render_results_page():
+def render_results_page(chunks):
     """Render the results page component (React-style)"""
     
     # Back button
@@ -826,7 +958,7 @@ def render_results_page():
     with col1:
         if st.button("⬅️ Back", use_container_width=True):
             st.session_state.current_answer = None
-            st.rerun()
+            rerun_page()
     
     # Display Results
     answer_data = st.session_state.current_answer
@@ -842,6 +974,12 @@ def render_results_page():
     </div>
     """, unsafe_allow_html=True)
     
+    if answer_data.get('shed'):
+        st.caption("⚡ The assistant is busy right now - this answer came from the fast fallback encoder, "
+                   "a keyword search or an earlier identical question.")
+    elif answer_data.get('degraded'):
+        st.caption("⚡ Answered by the fast fallback encoder while the AI model was loading.")
+    
     # Metrics
     st.markdown("### 📊 Answer Details")
     col1, col2, col3 = st.columns(3)
@@ -876,17 +1014,23 @@ def render_results_page():
     
     # Source Details
     with st.expander("🔍 View Source Information", expanded=False):
-        for i, (chunk, score) in enumerate(zip(answer_data['top_chunks'], answer_data['similarities']), 1):
+        for i, (chunk_id, score) in enumerate(zip(answer_data['top_chunk_ids'], answer_data['similarities']), 1):
+            chunk = chunks[chunk_id]
             st.markdown(f"""
-            **Source {i}** (Relevance: `{score:.2%}`) - **Section:** *{chunk['section']}*
-            
-            {chunk['chunk_text']}
+            **Source {i}** (Relevance: `{score:.2%}`) - **Section:** *{chunk.section}*
             """)
-            if i < len(answer_data['top_chunks']):
+            # Mark the answer sentences in whichever source chunks they came from
+            st.markdown(highlight_chunk(chunk, answer_data['answer_spans']), unsafe_allow_html=True)
+            if i < len(answer_data['top_chunk_ids']):
                 st.divider()
     
     # Feedback Section
     st.markdown("---")
+    render_feedback(answer_data, st.session_state.current_question)
+
+@st.fragment
+def render_feedback(answer_data, question):
+    """Feedback buttons; a click reruns only this fragment."""
     st.markdown("### 📣 Is this helpful?")
     
     feedback_col1, feedback_col2 = st.columns(2)
@@ -894,11 +1038,12 @@ def render_results_page():
     with feedback_col1:
         if st.button("👍 Helpful Answer", use_container_width=True, type="primary"):
             save_feedback(
-                st.session_state.current_question,
+                question,
                 answer_data['answer'],
                 answer_data['section'],
                 answer_data['confidence'],
-                True
+                True,
+                answer_data['tenant']
             )
             st.success("🎉 Thank you for your feedback!")
             st.balloons()
@@ -906,35 +1051,110 @@ def render_results_page():
     with feedback_col2:
         if st.button("👎 Needs Improvement", use_container_width=True):
             save_feedback(
-                st.session_state.current_question,
+                question,
                 answer_data['answer'],
                 answer_data['section'],
                 answer_data['confidence'],
-                False
+                False,
+                answer_data['tenant']
             )
             st.info("📝 Thanks for helping us improve!")
 
-def process_question(question, model, chunks, index, chunk_embeds, section_examples):
+def answer_settings(tenant_id, kb):
+    """Keyword arguments for answer_question shared by live questions and cache warm-up."""
+    return serving_config.answer_settings(load_reranker(), load_first_stage(tenant_id, kb))
+
+def load_first_stage(tenant_id, kb):
+    """Static-encoder candidate retrieval when STATIC_FIRST_STAGE_CANDIDATES is set and the encoder was built."""
+    static = load_static_encoder()
+    if not STATIC_FIRST_STAGE_CANDIDATES or static is None:
+        return None
+    return StaticFirstStage(static, load_static_knowledge(tenant_id, kb.version, static, kb),
+                            STATIC_FIRST_STAGE_CANDIDATES)
+
+def get_answer_cache(tenant_id, kb):
+    cache = load_answer_cache(tenant_id, kb.dim)
+    cache.ensure_version(answer_cache_version(kb))
+    return cache
+
+@st.cache_resource
+def load_static_knowledge(tenant_id, kb_version, _static, _kb):
+    """The tenant's knowledge base re-encoded by the static encoder, for answers without the transformer."""
+    examples = load_section_examples(load_corpus_registry().tenants[tenant_id]["examples"])
+    return build_index(_kb.store, _static, examples, meta=dict(_kb.meta, static_encoder=STATIC_ENCODER_FILE))
+
+@st.cache_resource
+def load_typeahead(tenant_id, _model, _kb):
+    """Typeahead for one tenant, with the answers to every suggestion precomputed in its answer cache."""
+    registry = load_corpus_registry()
+    examples = load_section_examples(registry.tenants[tenant_id]["examples"])
+    typeahead = build_typeahead(examples, SAMPLE_QUESTIONS, FEEDBACK_PATH, tenant_id=tenant_id,
+                                default_tenant=DEFAULT_TENANT)
+    warmed = warm_cache(typeahead.questions(), _model, _kb, get_answer_cache(tenant_id, _kb),
+                        **answer_settings(tenant_id, _kb))
+    if warmed:
+        load_metrics().encode_batch_size.observe(warmed, caller="warm_cache")
+    print(f"✅ Typeahead ready for '{tenant_id}': {len(typeahead)} suggestions, {warmed} answers precomputed")
+    return typeahead
+
+def shed_answer(question, kb, cache, lexical, static=None, static_kb=None):
+    """Answer without the transformer: an exact repeat from the answer cache, else the static encoder
+    over its own index (when built), else keyword search."""
+    start = time.perf_counter()
+    if cache is not None:
+        cached = cache.lookup_exact(question)
+        if cached is not None:
+            cached.update({'cache': 'exact', 'timings': {'total': time.perf_counter() - start}})
+            return cached, "cache"
+    if static is not None:
+        return answer_question(question, static, static_kb, **serving_config.answer_settings()), "static"
+    result = lexical_answer(question, kb, lexical, top_k=TOP_K, answer_chunks=ANSWER_SOURCE_CHUNKS,
+                            max_sentences=ANSWER_MAX_SENTENCES)
+    return result, "lexical"
+
+def process_question(question, model, kb, tenant_id, degraded=False):
     """Process question and store results in session state"""
-    with st.spinner("🔍 Searching through the Student Manual..."):
-        # Classify question to section
-        pred_section, section_conf = classify_question(question, model, section_examples)
-        
-        # Retrieve top chunks
-        top_chunks, similarities = retrieve_chunks(question, model, chunks, index, chunk_embeds, top_k=3)
-        
-        # Generate answer from best chunk
-        best_chunk = top_chunks[0]
-        answer, confidence = generate_answer(question, best_chunk, model)
+    metrics = load_metrics()
+    gate = load_admission_gate()
+    # One-time loads (reranker, caches, static and keyword indexes) happen here, outside the gate's timed runs
+    settings = serving_config.answer_settings() if degraded else answer_settings(tenant_id, kb)
+    cache = None if degraded else get_answer_cache(tenant_id, kb)   # keyed by transformer embeddings
+    lexical = load_lexical_index(tenant_id, kb.version, kb)
+    static = load_static_encoder()
+    static_kb = None
+    if static is not None:
+        static_kb = kb if degraded else load_static_knowledge(tenant_id, kb.version, static, kb)
+    start = time.perf_counter()
+    with st.spinner("🔍 Searching through the Student Manual..."), \
+            PROFILER.profile("process_question", profiling_requested()):
+        with gate.admit(time.monotonic() + REQUEST_DEADLINE_S) as shed_reason:
+            metrics.admission_wait_seconds.observe(time.perf_counter() - start)
+            metrics.pipeline_running.set(gate.running)
+            metrics.pipeline_waiting.set(gate.waiting)
+            # Classify, retrieve and extract the answer (see qa_pipeline.py)
+            try:
+                if shed_reason:
+                    # Overloaded: answer now without the transformer rather than queue behind it
+                    result, fallback = shed_answer(question, kb, cache, lexical, static, static_kb)
+                    result['shed'] = shed_reason
+                    metrics.shed.inc(reason=shed_reason, fallback=fallback)
+                elif degraded:
+                    # Static encoder over its own copy of the index, without answer cache or reranker
+                    result = answer_question(question, model, kb, **settings)
+                else:
+                    result = answer_question(question, model, kb, cache=cache, **settings)
+            except Exception:
+                metrics.errors.inc(where="process_question")
+                raise
+        result['tenant'] = tenant_id
+        result['degraded'] = degraded or bool(shed_reason)
+        metrics.observe_answer(result, tenant_id, time.perf_counter() - start)
+        request_log = load_request_logger()
+        if request_log:
+            request_log.log(request_record(question, result, tenant_id))
         
-        # Store in session state
-        st.session_state.current_answer = {
-            'answer': answer,
-            'section': pred_section,
-            'confidence': confidence,
-            'top_chunks': top_chunks,
-            'similarities': similarities
-        }
+        # Store in session state - only chunk ids, the chunk store is shared by all sessions
+        st.session_state.current_answer = result
 
 # ============================================================================
 # RUN APP
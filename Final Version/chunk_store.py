@@ -0,0 +1,141 @@
+# ============================================================================
+# COLUMNAR CHUNK STORE - T.I.P. Student Manual
+# All section text lives in one shared buffer; chunks are rows of offset arrays
+# ============================================================================
+
+import numpy as np
+
+
+class ChunkRecord:
+    """Lightweight view of one chunk. Holds only the store and the chunk id."""
+
+    __slots__ = ("store", "chunk_id")
+
+    def __init__(self, store, chunk_id):
+        self.store = store
+        self.chunk_id = int(chunk_id)
+
+    @property
+    def section(self):
+        return self.store.section_names[self.store.chunk_section[self.chunk_id]]
+
+    @property
+    def start(self):
+        return int(self.store.chunk_start[self.chunk_id])
+
+    @property
+    def end(self):
+        return int(self.store.chunk_end[self.chunk_id])
+
+    @property
+    def chunk_text(self):
+        return self.store.text[self.start:self.end]
+
+    @property
+    def section_text(self):
+        return self.store.section_text(self.store.chunk_section[self.chunk_id])
+
+    @property
+    def n_tokens(self):
+        return int(self.store.chunk_tokens[self.chunk_id])
+
+    @property
+    def sentence_ids(self):
+        ptr = self.store.sentence_ptr
+        return range(int(ptr[self.chunk_id]), int(ptr[self.chunk_id + 1]))
+
+    @property
+    def sentences(self):
+        """(start, end) offsets of this chunk's sentences in the shared text buffer."""
+        ids = self.sentence_ids
+        starts = self.store.sentence_start[ids.start:ids.stop]
+        ends = self.store.sentence_end[ids.start:ids.stop]
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def __getitem__(self, key):
+        # Keeps the old chunk-dict access style (chunk['section']) working
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"ChunkRecord(id={self.chunk_id}, section={self.section!r})"
+
+
+class ChunkStore:
+    """Chunks of the manual as parallel arrays over a single text buffer.
+
+    Offsets (chunk_start/end, sentence_start/end) are character positions in `text`.
+    Sentences are stored CSR-style: chunk i owns sentences sentence_ptr[i]:sentence_ptr[i+1].
+    """
+
+    def __init__(self, text, section_names, section_offsets, chunk_section, chunk_start,
+                 chunk_end, chunk_tokens, sentence_ptr, sentence_start, sentence_end, sentence_tokens):
+        self.text = text
+        self.section_names = list(section_names)
+        self.section_offsets = np.asarray(section_offsets, dtype=np.int64)
+        self.chunk_section = np.asarray(chunk_section, dtype=np.int32)
+        self.chunk_start = np.asarray(chunk_start, dtype=np.int64)
+        self.chunk_end = np.asarray(chunk_end, dtype=np.int64)
+        self.chunk_tokens = np.asarray(chunk_tokens, dtype=np.int32)
+        self.sentence_ptr = np.asarray(sentence_ptr, dtype=np.int64)
+        self.sentence_start = np.asarray(sentence_start, dtype=np.int64)
+        self.sentence_end = np.asarray(sentence_end, dtype=np.int64)
+        self.sentence_tokens = np.asarray(sentence_tokens, dtype=np.int32)
+
+    @classmethod
+    def from_manual(cls, manual_sections, chunker):
+        """Chunk every section with `chunker` and pack the result into columns."""
+        section_names = list(manual_sections.keys())
+        section_offsets = [0]
+        chunk_section, chunk_start, chunk_end, chunk_tokens = [], [], [], []
+        sentence_ptr, sentence_start, sentence_end, sentence_tokens = [0], [], [], []
+        parts = []
+
+        for section_id, section_name in enumerate(section_names):
+            section_text = manual_sections[section_name]
+            base = section_offsets[-1]
+            for chunk in chunker.chunk_section(section_name, section_text):
+                chunk_section.append(section_id)
+                chunk_start.append(base + chunk["start"])
+                chunk_end.append(base + chunk["end"])
+                chunk_tokens.append(chunk["n_tokens"])
+                for (start, end), n_tokens in zip(chunk["sentences"], chunk["sentence_tokens"]):
+                    sentence_start.append(base + start)
+                    sentence_end.append(base + end)
+                    sentence_tokens.append(n_tokens)
+                sentence_ptr.append(len(sentence_start))
+            parts.append(section_text)
+            section_offsets.append(base + len(section_text))
+
+        return cls(''.join(parts), section_names, section_offsets, chunk_section, chunk_start,
+                   chunk_end, chunk_tokens, sentence_ptr, sentence_start, sentence_end, sentence_tokens)
+
+    def __len__(self):
+        return len(self.chunk_start)
+
+    def __getitem__(self, chunk_id):
+        if not -len(self) <= chunk_id < len(self):
+            raise IndexError(f"chunk id {chunk_id} out of range")
+        return ChunkRecord(self, chunk_id % len(self))
+
+    def __iter__(self):
+        return (ChunkRecord(self, i) for i in range(len(self)))
+
+    def section_text(self, section_id):
+        return self.text[self.section_offsets[section_id]:self.section_offsets[section_id + 1]]
+
+    def texts(self):
+        """Chunk texts in id order, for encoding."""
+        return [self.text[s:e] for s, e in zip(self.chunk_start.tolist(), self.chunk_end.tolist())]
+
+    def sentence_texts(self):
+        """All sentence texts in id order, for encoding."""
+        return [self.text[s:e] for s, e in zip(self.sentence_start.tolist(), self.sentence_end.tolist())]
+
+    def slice(self, start, end):
+        return self.text[start:end]
+
+    @property
+    def nbytes(self):
+        arrays = (self.section_offsets, self.chunk_section, self.chunk_start, self.chunk_end, self.chunk_tokens,
+                  self.sentence_ptr, self.sentence_start, self.sentence_end, self.sentence_tokens)
+        return len(self.text.encode('utf-8')) + sum(a.nbytes for a in arrays)
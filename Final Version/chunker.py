@@ -0,0 +1,158 @@
+# ============================================================================
+# TOKENIZER-AWARE CHUNKER - T.I.P. Student Manual
+# Splits manual sections into chunks that fit the encoder's sequence budget
+# ============================================================================
+
+import json
+import os
+import re
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # tokenizers ships with transformers, but stay usable without it
+    Tokenizer = None
+
+# Sentence ends at . ! or ? (plus closing quotes/brackets) followed by whitespace,
+# or at a blank line between paragraphs
+SENTENCE_BOUNDARY = re.compile(r'[.!?]+["\')\]]*(?=\s)|\n\s*\n')
+LAST_WORD = re.compile(r'(\S+)$')
+ABBREVIATIONS = {"dr", "engr", "mr", "mrs", "ms", "jr", "sr", "st", "vs", "atty", "prof", "e.g", "i.e"}
+# Words that also end sentences: abbreviations only before a number ("No. 5") or a lowercase word ("etc. and")
+CONDITIONAL_ABBREVIATIONS = {"no": str.isdigit, "etc": str.islower}
+INITIALS = re.compile(r'^(?:[A-Za-z]\.)+[A-Za-z]?$')
+SPECIAL_TOKENS = 2  # [CLS] and [SEP] are added to every encoded chunk
+
+
+def _is_abbreviation(text, punct_pos):
+    """Check whether the period at punct_pos closes an abbreviation like 'Dr.' or 'T.I.P.'."""
+    if text[punct_pos] != '.':
+        return False
+    match = LAST_WORD.search(text, max(0, punct_pos - 20), punct_pos + 1)
+    if not match:
+        return False
+    word = match.group(1)
+    if INITIALS.match(word):
+        return True
+    word = word.rstrip('.').lower()
+    if word in CONDITIONAL_ABBREVIATIONS:
+        next_char = text[punct_pos + 1:punct_pos + 4].lstrip()[:1]
+        return CONDITIONAL_ABBREVIATIONS[word](next_char)
+    return word in ABBREVIATIONS
+
+
+def split_sentences(text):
+    """Return (start, end) character spans of the sentences in text, whitespace trimmed."""
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if text[match.start()] != '\n':
+            if _is_abbreviation(text, match.start()):
+                continue
+            # Lowercase continuation means it was not really a sentence end
+            next_char = text[match.end():match.end() + 2].lstrip()[:1]
+            if next_char.islower():
+                continue
+        spans.append((start, match.end()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    trimmed = []
+    for s, e in spans:
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if e > s:
+            trimmed.append((s, e))
+    return trimmed
+
+
+class ManualChunker:
+    """Packs whole sentences into chunks of at most max_tokens model tokens, with overlap."""
+
+    def __init__(self, model_path, max_tokens=None, overlap_tokens=32):
+        self.tokenizer = None
+        tokenizer_file = os.path.join(model_path, "tokenizer.json")
+        if Tokenizer is not None and os.path.exists(tokenizer_file):
+            self.tokenizer = Tokenizer.from_file(tokenizer_file)
+            self.tokenizer.no_truncation()
+            self.tokenizer.no_padding()
+        else:
+            print(f"⚠️ Tokenizer unavailable ({tokenizer_file}), approximating token counts")
+
+        if max_tokens is None:
+            max_tokens = self._model_max_seq_length(model_path)
+        self.budget = max_tokens - SPECIAL_TOKENS
+        self.overlap = min(overlap_tokens, self.budget // 2)
+
+    @staticmethod
+    def _model_max_seq_length(model_path):
+        config_file = os.path.join(model_path, "sentence_bert_config.json")
+        try:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                return int(json.load(f)["max_seq_length"])
+        except (OSError, KeyError, ValueError):
+            return 128
+
+    def _token_spans(self, texts):
+        """Token (start, end) character offsets for each text, without special tokens."""
+        if self.tokenizer is None:
+            return [[m.span() for m in re.finditer(r'\w+|[^\w\s]', t)] for t in texts]
+        encodings = self.tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [enc.offsets for enc in encodings]
+
+    def _sentence_units(self, text):
+        """Sentences as (start, end, n_tokens); sentences over budget are split into windows."""
+        spans = split_sentences(text)
+        token_spans = self._token_spans([text[s:e] for s, e in spans])
+        units = []
+        for (s, e), offsets in zip(spans, token_spans):
+            if len(offsets) <= self.budget:
+                units.append((s, e, len(offsets)))
+                continue
+            step = self.budget - self.overlap
+            for w in range(0, len(offsets), step):
+                window = offsets[w:w + self.budget]
+                units.append((s + window[0][0], s + window[-1][1], len(window)))
+                if w + self.budget >= len(offsets):
+                    break
+        return units
+
+    def chunk_section(self, section_name, section_text):
+        """Chunk one section. Offsets in each chunk are character positions in section_text."""
+        units = self._sentence_units(section_text)
+        chunks = []
+        i = 0
+        while i < len(units):
+            j, n_tokens = i, 0
+            while j < len(units) and (j == i or n_tokens + units[j][2] <= self.budget):
+                n_tokens += units[j][2]
+                j += 1
+
+            start, end = units[i][0], units[j - 1][1]
+            chunks.append({
+                "section": section_name,
+                "chunk_text": section_text[start:end],
+                "start": start,
+                "end": end,
+                "n_tokens": n_tokens,
+                "sentences": [(u[0], u[1]) for u in units[i:j]],
+                "sentence_tokens": [u[2] for u in units[i:j]],
+            })
+            if j >= len(units):
+                break
+
+            # Step back over trailing sentences so consecutive chunks share context
+            k, back = j, 0
+            while k - 1 > i and back + units[k - 1][2] <= self.overlap:
+                k -= 1
+                back += units[k][2]
+            i = k
+        return chunks
+
+    def chunk_manual(self, manual_sections):
+        """Chunk every section of the manual, preserving section order."""
+        chunks = []
+        for section_name, section_text in manual_sections.items():
+            chunks.extend(self.chunk_section(section_name, section_text))
+        return chunks
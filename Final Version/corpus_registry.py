@@ -0,0 +1,104 @@
+# ============================================================================
+# CORPUS REGISTRY - Multi-manual / multi-tenant knowledge bases
+# One shared encoder; each tenant (institution, campus, manual edition) gets its
+# own chunk store and index, loaded lazily and evicted LRU under a memory budget
+# ============================================================================
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def load_tenants(tenants_file, default_tenants):
+    """Read tenant configs from JSON; relative paths resolve against the file's folder."""
+    if not os.path.exists(tenants_file):
+        return dict(default_tenants)
+
+    with open(tenants_file, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(tenants_file))
+    tenants = {}
+    for tenant_id, config in raw.items():
+        config = dict(config)
+        for key in ("manual", "examples", "bundle"):
+            if key in config and not os.path.isabs(config[key]):
+                config[key] = os.path.normpath(os.path.join(base_dir, config[key]))
+        config.setdefault("name", tenant_id)
+        tenants[tenant_id] = config
+    return tenants
+
+
+class CorpusRegistry:
+    """Lazily loads per-tenant knowledge bases and keeps the most recently used within budget."""
+
+    def __init__(self, tenants, loader, memory_budget_bytes, default_tenant=None):
+        if not tenants:
+            raise ValueError("CorpusRegistry needs at least one tenant")
+        self.tenants = tenants
+        self.loader = loader                    # loader(tenant_config) -> KnowledgeBase
+        self.memory_budget_bytes = memory_budget_bytes
+        self.default_tenant = default_tenant if default_tenant in tenants else next(iter(tenants))
+        self._loaded = OrderedDict()            # tenant_id -> KnowledgeBase, oldest first
+        self._lock = threading.Lock()
+        self._load_locks = {tenant_id: threading.Lock() for tenant_id in tenants}
+        self.loads = 0
+        self.evictions = 0
+
+    def resolve(self, tenant_id):
+        """Map a requested tenant id (e.g. from a query parameter) to a known one."""
+        return tenant_id if tenant_id in self.tenants else self.default_tenant
+
+    def get(self, tenant_id):
+        """Return the tenant's knowledge base, loading it on first use."""
+        tenant_id = self.resolve(tenant_id)
+        with self._lock:
+            kb = self._loaded.get(tenant_id)
+            if kb is not None:
+                self._loaded.move_to_end(tenant_id)
+                return kb
+
+        # Only one thread loads a given tenant; others wait for it instead of loading twice
+        with self._load_locks[tenant_id]:
+            with self._lock:
+                kb = self._loaded.get(tenant_id)
+                if kb is not None:
+                    self._loaded.move_to_end(tenant_id)
+                    return kb
+
+            print(f"🔄 Loading knowledge base for tenant '{tenant_id}'")
+            kb = self.loader(self.tenants[tenant_id])
+
+            with self._lock:
+                self._loaded[tenant_id] = kb
+                self.loads += 1
+                self._evict(keep=tenant_id)
+        return kb
+
+    def _evict(self, keep):
+        while self.memory_bytes > self.memory_budget_bytes and len(self._loaded) > 1:
+            oldest = next(iter(self._loaded))
+            if oldest == keep:
+                break
+            self._loaded.pop(oldest)
+            self.evictions += 1
+            print(f"♻️ Evicted tenant '{oldest}' (budget {self.memory_budget_bytes / 2**20:.0f} MiB)")
+
+    @property
+    def memory_bytes(self):
+        return sum(kb.nbytes for kb in self._loaded.values())
+
+    def loaded_tenants(self):
+        with self._lock:
+            return list(self._loaded.keys())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tenants": len(self.tenants),
+                "loaded": list(self._loaded.keys()),
+                "memory_bytes": self.memory_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,229 @@
+# ============================================================================
+# NEAR-DUPLICATE REMOVAL - T.I.P. QA Dataset
+# Exact copies of a (question, answer) row are matched by hash; MinHash
+# signatures + LSH banding over word shingles then find rows that are
+# near-copies of each other (similar question AND similar answer), and
+# answers that are near-copies across different questions.
+# Duplicate rows are dropped (or kept with --mode group), and every row gets an
+# answer_group id so training batches never hold the same answer twice (it
+# would be a false negative for MultipleNegativesRankingLoss); kept duplicates
+# always share their original's group.
+#
+#   python dedup_dataset.py --data TIP_QA_dataset_20000.csv --out qa_dedup.parquet
+#   python "Training Model.py" --data qa_dedup.parquet
+# ============================================================================
+
+import argparse
+import hashlib
+import re
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from training_data import CHUNK_ROWS, GROUP_COLUMN, FrameWriter, clean_qa_frame, dataset_columns, iter_qa_frames, \
+    report_blank_negatives
+
+NUM_PERM = 64        # MinHash permutations per signature
+BANDS = 8            # LSH bands of NUM_PERM // BANDS rows; candidates share a whole band
+THRESHOLD = 0.8      # estimated Jaccard similarity at which two texts count as near-duplicates
+SHINGLE_WORDS = 3
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def shingle_hashes(text, size=SHINGLE_WORDS):
+    """32-bit hashes of the text's word n-grams (the whole text if it is shorter than one n-gram)."""
+    words = _WORD.findall(text.lower())
+    grams = [' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """Vectorized MinHash: one (n_shingles x NUM_PERM) universal-hash matrix per block of texts."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # a < 2^31 and 32-bit shingle hashes keep a * h + b below 2^64
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, texts, block=2000):
+        out = np.empty((len(texts), len(self.a)), dtype=np.uint32)
+        for start in range(0, len(texts), block):
+            hashes = [shingle_hashes(t) for t in texts[start:start + block]]
+            offsets = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+            values = (np.concatenate(hashes)[:, None] * self.a + self.b) % _MERSENNE
+            out[start:start + len(hashes)] = np.minimum.reduceat(values, offsets, axis=0) & 0xFFFFFFFF
+        return out
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x, y):
+        """Join two clusters; the smaller row index stays the root, so the first occurrence is kept."""
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+    def find_many(self, rows):
+        """Roots of several rows at once (without path compression)."""
+        roots = np.asarray(rows)
+        while True:
+            parents = self.parent[roots]
+            if (parents == roots).all():
+                return roots
+            roots = parents
+
+    def roots(self):
+        return np.array([self.find(i) for i in range(len(self.parent))], dtype=np.int64)
+
+
+def merge_clusters(*labels):
+    """Cluster ids (smallest member row) of the union of several clusterings of the same rows."""
+    clusters = UnionFind(len(labels[0]))
+    for label in labels:
+        for row in np.flatnonzero(label != np.arange(len(label))):
+            clusters.union(int(row), int(label[row]))
+    return clusters.roots()
+
+
+def text_key(*texts):
+    """64-bit hash of the normalized (lower-cased, whitespace-collapsed) texts, for exact-duplicate checks."""
+    normalized = "\x1f".join(' '.join(t.lower().split()) for t in texts)
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def lsh_clusters(signatures, bands=BANDS, threshold=THRESHOLD, also=None):
+    """Cluster id (smallest member row) per row: rows sharing a band and agreeing on >= threshold of
+    their signature (and of the `also` signatures, if given) are joined.
+
+    Within a bucket each row is compared with every earlier member it is not already clustered with,
+    so near-duplicates are found whichever row happens to come first.
+    """
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    clusters = UnionFind(n)
+    weights = np.uint64(0x9E3779B97F4A7C15) ** np.arange(rows_per_band, dtype=np.uint64)
+    for band in range(bands):
+        block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        keys = (block * weights).sum(axis=1)   # wraps mod 2^64, collisions are caught by the check below
+        order = np.argsort(keys, kind="stable")
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        for members in np.split(order, bounds):
+            for k in range(1, len(members)):
+                row, earlier = int(members[k]), members[:k]
+                earlier = earlier[clusters.find_many(earlier) != clusters.find(row)]
+                if not len(earlier):
+                    continue
+                similar = (signatures[earlier] == signatures[row]).mean(axis=1) >= threshold
+                if also is not None:
+                    similar &= (also[earlier] == also[row]).mean(axis=1) >= threshold
+                for other in earlier[similar]:
+                    clusters.union(row, int(other))
+    return clusters.roots()
+
+
+def cluster_rows(keys, signatures, bands=BANDS, threshold=THRESHOLD, also=None):
+    """Cluster id per row: exact duplicates (equal `keys`) first, then lsh_clusters over one row of each."""
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    exact_of = first[inverse]
+    unique_rows = np.sort(first)
+    near = lsh_clusters(signatures[unique_rows], bands, threshold,
+                        also=None if also is None else also[unique_rows])
+    return unique_rows[near][np.searchsorted(unique_rows, exact_of)]
+
+
+def deduplicate(data_file, out_file, mode="drop", threshold=THRESHOLD, bands=BANDS, num_perm=NUM_PERM,
+                chunk_rows=CHUNK_ROWS):
+    """Write the deduplicated dataset with an answer_group column; returns a stats dict.
+
+    Rows are duplicates when their normalized question and answer are identical, near-duplicates when
+    both are similar (MinHash/LSH over the rows left after exact matching); answers alone
+    form the answer groups (different questions with the same answer are kept, but never share a batch).
+    With mode="group" near-duplicate rows are kept too, in their original's answer group.
+    Signatures (num_perm x 4 bytes per text) and 8-byte text hashes are the only per-row state kept in memory.
+    """
+    start = time.perf_counter()
+    hasher = MinHasher(num_perm)
+    columns = dataset_columns(data_file)
+    question_sigs, answer_sigs, pair_keys, answer_keys, skipped = [], [], [], [], {}
+    for frame in iter_qa_frames(data_file, chunk_rows, columns):
+        texts = clean_qa_frame(frame, stats=skipped)
+        question_sigs.append(hasher.signatures(texts[0]))
+        answer_sigs.append(hasher.signatures(texts[1]))
+        pair_keys.append(np.fromiter((text_key(q, a) for q, a in zip(texts[0], texts[1])), dtype=np.uint64,
+                                     count=len(texts[0])))
+        answer_keys.append(np.fromiter((text_key(a) for a in texts[1]), dtype=np.uint64, count=len(texts[1])))
+    question_sigs, answer_sigs = np.concatenate(question_sigs), np.concatenate(answer_sigs)
+    pair_keys, answer_keys = np.concatenate(pair_keys), np.concatenate(answer_keys)
+    print(f"🔏 Signed {len(question_sigs)} rows in {time.perf_counter() - start:.1f}s")
+    report_blank_negatives(skipped)
+
+    duplicate_of = cluster_rows(pair_keys, question_sigs, bands, threshold, also=answer_sigs)
+    # LSH can bucket a duplicate's answer apart from its original's; duplicates must share a group anyway
+    answer_group = merge_clusters(cluster_rows(answer_keys, answer_sigs, bands, threshold), duplicate_of)
+    keep = duplicate_of == np.arange(len(duplicate_of)) if mode == "drop" else np.ones(len(duplicate_of), bool)
+
+    writer = FrameWriter(out_file)
+    offset = 0
+    try:
+        for frame in iter_qa_frames(data_file, chunk_rows, columns):
+            texts = clean_qa_frame(frame)
+            rows = slice(offset, offset + len(texts[0]))
+            offset += len(texts[0])
+            out = pd.DataFrame(dict(zip(columns, texts)))
+            out[GROUP_COLUMN] = answer_group[rows]
+            writer.write(out[keep[rows]])
+    finally:
+        writer.close()
+
+    return {
+        "rows_in": len(duplicate_of),
+        "rows_out": writer.rows,
+        "duplicate_rows": int((duplicate_of != np.arange(len(duplicate_of))).sum()),
+        "exact_duplicate_rows": int(len(pair_keys) - len(np.unique(pair_keys))),
+        "answer_groups": int(len(np.unique(answer_group))),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop or group near-duplicate QA pairs with MinHash/LSH")
+    parser.add_argument("--data", required=True, help="CSV or Parquet with 'questionnaire' and 'answer'")
+    parser.add_argument("--out", required=True, help="output CSV or Parquet")
+    parser.add_argument("--mode", choices=("drop", "group"), default="drop",
+                        help=f"drop near-duplicate rows, or keep them all (duplicates share a {GROUP_COLUMN})")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--bands", type=int, default=BANDS)
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--examples-per-second", type=float,
+                        help="training throughput (from Training Model.py) to estimate the time saved")
+    args = parser.parse_args()
+
+    stats = deduplicate(args.data, args.out, args.mode, args.threshold, args.bands, args.num_perm, args.chunk_rows)
+    removed = stats["rows_in"] - stats["rows_out"]
+    print(f"✅ Wrote {stats['rows_out']} rows to '{args.out}' in {stats['seconds']:.1f}s")
+    print(f"   {stats['duplicate_rows']} duplicate rows ({stats['exact_duplicate_rows']} exact), {removed} removed "
+          f"({100.0 * removed / max(stats['rows_in'], 1):.1f}% fewer examples per epoch)")
+    print(f"   {stats['answer_groups']} distinct answer groups for duplicate-free batches")
+    if args.examples_per_second and removed:
+        print(f"   ≈ {removed / args.examples_per_second / 60:.1f} min less training per epoch "
+              f"at {args.examples_per_second:.0f} examples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# ============================================================================
+# KNOWLEDGE DISTILLATION - T.I.P. Student Manual
+# The fine-tuned 12-layer smartual_model (teacher) trains a smaller student to
+# reproduce its embeddings (MSE) on the QA corpus and the manual's sentences.
+# The student keeps the teacher's embedding space, so it is saved in the same
+# SentenceTransformer layout and can be served by pointing MODEL_PATH in
+# serving_config.py at it (bundles and caches rebuild automatically, the model fingerprint changes).
+#
+#   python distill_model.py --data TIP_QA_dataset_20000.csv --layers 4
+#   python distill_model.py --data qa_dedup.parquet --student nreimers/MiniLM-L3-H384-uncased
+#
+# Students are either the teacher with only --layers of its layers kept
+# (evenly spaced, initialized from the teacher), or any pretrained --student,
+# with a linear projection added if its width differs from the teacher's.
+# The run ends with a speed/quality report for teacher and student.
+# ============================================================================
+
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer, models
+from transformers import get_linear_schedule_with_warmup
+
+from chunk_store import ChunkStore
+from chunker import ManualChunker
+from retrieval_eval import MRR_AT, holdout_evaluator, manual_evaluator, run_evaluators
+from serving_config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, MANUAL_DATA_FILE, MODEL_PATH, \
+    SECTION_EXAMPLES_FILE
+from training_data import CHUNK_ROWS, clean_qa_frame, dataset_columns, iter_qa_frames
+
+TEACHER_PATH = MODEL_PATH
+STUDENT_SAVE_PATH = "smartual_model_small"
+STUDENT_LAYERS = 4
+BATCH_SIZE = 64
+EPOCHS = 1
+MAX_LEN = 128
+LEARNING_RATE = 1e-4        # students start far from the teacher's outputs, so higher than fine-tuning
+WARMUP_RATIO = 0.1
+SHUFFLE_BUFFER = 50_000     # texts held for shuffling
+EVAL_HOLDOUT = 0.02         # same split as Training Model.py, so held-out questions stay unseen
+EVAL_MAX_QUERIES = 2000
+SPEED_QUERIES = 200         # single-question encodes timed per model
+
+
+# ============================================================================
+# STUDENT
+# ============================================================================
+
+def layer_student(teacher, num_layers):
+    """Copy of the teacher keeping `num_layers` evenly spaced transformer layers (first and last included)."""
+    student = copy.deepcopy(teacher)
+    bert = student[0].auto_model
+    total = len(bert.encoder.layer)
+    if not 0 < num_layers <= total:
+        raise ValueError(f"--layers must be between 1 and {total}")
+    keep = sorted({int(round(i)) for i in np.linspace(0, total - 1, num_layers)})
+    bert.encoder.layer = torch.nn.ModuleList([bert.encoder.layer[i] for i in keep])
+    bert.config.num_hidden_layers = len(keep)
+    print(f"🧬 Student keeps teacher layers {keep} of {total}")
+    return student
+
+
+def pretrained_student(name, teacher_dim, max_len, device):
+    """Pretrained transformer + mean pooling, projected to the teacher's dimension if narrower/wider."""
+    transformer = models.Transformer(name, max_seq_length=max_len)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension())
+    modules = [transformer, pooling]
+    if pooling.get_sentence_embedding_dimension() != teacher_dim:
+        modules.append(models.Dense(pooling.get_sentence_embedding_dimension(), teacher_dim,
+                                    activation_function=torch.nn.Identity()))
+    return SentenceTransformer(modules=modules, device=device)
+
+
+def count_parameters(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+# ============================================================================
+# DISTILLATION DATA
+# ============================================================================
+
+def manual_sentences(manual_file, chunker_model_path):
+    """Chunks and sentences of the manual, as the app encodes them."""
+    if not os.path.exists(manual_file):
+        return []
+    with open(manual_file, 'r', encoding='utf-8') as f:
+        manual_sections = json.load(f)
+    store = ChunkStore.from_manual(manual_sections,
+                                   ManualChunker(chunker_model_path, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS))
+    return store.texts() + store.sentence_texts()
+
+
+def iter_texts(data_file, extra_texts=(), holdout=EVAL_HOLDOUT, chunk_rows=CHUNK_ROWS):
+    """Distinct training texts: `extra_texts` first, then every QA question and answer outside the holdout.
+
+    Templated datasets repeat answers thousands of times; only each text's hash is kept to skip repeats.
+    """
+    def blocks():
+        yield extra_texts
+        if data_file:
+            for frame in iter_qa_frames(data_file, chunk_rows, dataset_columns(data_file)):
+                yield from clean_qa_frame(frame, holdout)   # question, answer and negative columns
+
+    seen = set()
+    for block in blocks():
+        for text in block:
+            key = hash(text)
+            if key not in seen:
+                seen.add(key)
+                yield text
+
+
+def shuffled_batches(texts, batch_size, shuffle_buffer, seed):
+    """Batches from a bounded shuffle buffer, so memory does not grow with the corpus."""
+    rng = random.Random(seed)
+    buffer = []
+    for text in texts:
+        buffer.append(text)
+        if len(buffer) >= shuffle_buffer:
+            rng.shuffle(buffer)
+            while len(buffer) >= batch_size:
+                yield buffer[-batch_size:]
+                del buffer[-batch_size:]
+    rng.shuffle(buffer)
+    for start in range(0, len(buffer), batch_size):
+        yield buffer[start:start + batch_size]
+
+
+# ============================================================================
+# TRAINING + REPORT
+# ============================================================================
+
+def tokenize(model, texts):
+    """Padded features on the model's device (teacher and student may use different tokenizers)."""
+    features = model.tokenizer(texts, padding=True, truncation=True, max_length=model.max_seq_length,
+                               return_tensors="pt")
+    return {key: value.to(model.device) for key, value in features.items()}
+
+
+def distill(teacher, student, text_source, n_texts, epochs, batch_size, lr, warmup_ratio, shuffle_buffer=SHUFFLE_BUFFER,
+            evaluators=(), save_path=STUDENT_SAVE_PATH, log_every=50, seed=42):
+    """Train the student to regress the teacher's embeddings; `text_source()` yields the texts for one epoch.
+
+    With evaluators, the student is scored after each epoch and only improvements are saved to
+    `save_path`; without, the final student is saved. Returns the best score (None without evaluators).
+    """
+    steps_per_epoch = math.ceil(n_texts / batch_size)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr)
+    scheduler = get_linear_schedule_with_warmup(optimizer, int(steps_per_epoch * epochs * warmup_ratio),
+                                                steps_per_epoch * epochs)
+    mse = torch.nn.MSELoss()
+    teacher.eval()
+    best_score = None
+
+    for epoch in range(epochs):
+        student.train()
+        start, running = time.perf_counter(), 0.0
+        for step, batch in enumerate(shuffled_batches(text_source(), batch_size, shuffle_buffer, seed + epoch), 1):
+            with torch.no_grad():
+                target = teacher(tokenize(teacher, batch))["sentence_embedding"]
+            loss = mse(student(tokenize(student, batch))["sentence_embedding"], target.to(student.device))
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+
+            running += loss.item()
+            if step % log_every == 0:
+                print(f"   epoch {epoch + 1} step {step}/{steps_per_epoch}: mse {running / log_every:.6f}")
+                running = 0.0
+        print(f"✅ Epoch {epoch + 1}/{epochs} in {time.perf_counter() - start:.0f}s")
+
+        if evaluators:
+            metrics = run_evaluators(evaluators, student)
+            if best_score is None or metrics["score"] > best_score:
+                best_score = metrics["score"]
+                student.save(save_path)
+                print(f"🏆 Epoch {epoch + 1}: score {best_score:.4f} (new best, saved to '{save_path}')")
+            else:
+                print(f"   Epoch {epoch + 1}: score {metrics['score']:.4f} (best {best_score:.4f})")
+    if not evaluators:
+        student.save(save_path)
+    return best_score
+
+
+def encode_speed(model, queries, batch_size=64):
+    """Median single-question latency (ms) and batched throughput (texts/s)."""
+    model.eval()
+    model.encode(queries[:8], show_progress_bar=False)   # warm-up
+    latencies = []
+    for query in queries[:SPEED_QUERIES]:
+        start = time.perf_counter()
+        model.encode([query], show_progress_bar=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    model.encode(queries, batch_size=batch_size, show_progress_bar=False)
+    return statistics.median(latencies), len(queries) / (time.perf_counter() - start)
+
+
+def agreement(teacher, student, texts):
+    """Mean cosine between teacher and student embeddings of the same texts."""
+    a = teacher.encode(texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
+    b = student.encode(texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+
+def speed_quality_report(teacher, student, evaluators, queries):
+    """One row per model: size, latency, throughput and retrieval quality."""
+    rows = {}
+    for name, model in (("teacher", teacher), ("student", student)):
+        latency_ms, throughput = encode_speed(model, queries)
+        row = {"parameters": count_parameters(model), "latency_ms": latency_ms, "texts_per_s": throughput}
+        if evaluators:
+            row.update(run_evaluators(evaluators, model))
+        rows[name] = row
+    rows["student"]["teacher_cosine"] = agreement(teacher, student, queries)
+    return rows
+
+
+def print_report(rows):
+    teacher = rows["teacher"]
+    print("\n📊 Distillation report")
+    for name, row in rows.items():
+        quality = f", score {row['score']:.4f}" if "score" in row else ""
+        print(f"   {name:8s} {row['parameters'] / 1e6:6.1f}M params, {row['latency_ms']:6.2f} ms/question, "
+              f"{row['texts_per_s']:7.0f} texts/s{quality}")
+        for key, value in row.items():
+            if key.endswith(f"_mrr@{MRR_AT}") or "_recall@" in key:
+                print(f"            {key} {value:.3f}")
+    student = rows["student"]
+    print(f"   student is {teacher['latency_ms'] / student['latency_ms']:.1f}x faster per question, "
+          f"{student['texts_per_s'] / teacher['texts_per_s']:.1f}x in batches, "
+          f"{student['parameters'] / teacher['parameters']:.0%} of the parameters; "
+          f"cosine to teacher {student['teacher_cosine']:.3f}")
+    if "score" in student:
+        print(f"   quality: {student['score']:.4f} vs {teacher['score']:.4f} "
+              f"({student['score'] - teacher['score']:+.4f} mean MRR@{MRR_AT})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill smartual_model into a smaller serving model")
+    parser.add_argument("--data", help="QA CSV or Parquet ('questionnaire', 'answer'); manual sentences are always used")
+    parser.add_argument("--teacher", default=TEACHER_PATH)
+    parser.add_argument("--out", default=STUDENT_SAVE_PATH)
+    parser.add_argument("--layers", type=int, default=STUDENT_LAYERS, help="teacher layers kept in the student")
+    parser.add_argument("--student", help="pretrained student instead of a layer-pruned teacher copy")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--max-len", type=int, default=MAX_LEN)
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--shuffle-buffer", type=int, default=SHUFFLE_BUFFER)
+    parser.add_argument("--manual", default=MANUAL_DATA_FILE)
+    parser.add_argument("--examples", default=SECTION_EXAMPLES_FILE)
+    parser.add_argument("--holdout", type=float, default=EVAL_HOLDOUT,
+                        help="fraction of QA questions kept out of distillation for the report")
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    teacher = SentenceTransformer(args.teacher, device=device)
+    if args.student:
+        student = pretrained_student(args.student, teacher.get_sentence_embedding_dimension(), args.max_len, device)
+    else:
+        student = layer_student(teacher, args.layers)
+    student.max_seq_length = args.max_len
+
+    extra = manual_sentences(args.manual, args.teacher)
+    text_source = lambda: iter_texts(args.data, extra, args.holdout, args.chunk_rows)
+    n_texts = sum(1 for _ in text_source())
+    if not n_texts:
+        raise ValueError("No texts to distill on: pass --data or provide the manual")
+    print(f"📚 {n_texts} distinct texts ({len(extra)} from the manual)")
+
+    evaluators, distractors = [], []
+    if os.path.exists(args.manual) and os.path.exists(args.examples):
+        manual, distractors = manual_evaluator(args.manual, args.examples, args.teacher,
+                                               CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+        evaluators.append(manual)
+    if args.data and args.holdout:
+        evaluators.append(holdout_evaluator(args.data, args.holdout, EVAL_MAX_QUERIES, distractors))
+    evaluators = [e for e in evaluators if len(e)]
+
+    distill(teacher, student, text_source, n_texts, args.epochs, args.batch_size, args.lr, WARMUP_RATIO,
+            args.shuffle_buffer, evaluators, args.out)
+    student = SentenceTransformer(args.out, device=device)
+    print(f"💾 Student saved to '{args.out}' (set MODEL_PATH in serving_config.py to serve it)")
+
+    queries = [q for e in evaluators for q in e.queries] or extra
+    print_report(speed_quality_report(teacher, student, evaluators, queries[:EVAL_MAX_QUERIES]))
+
+
+if __name__ == "__main__":
+    main()
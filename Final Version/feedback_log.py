@@ -0,0 +1,42 @@
+# ============================================================================
+# FEEDBACK LOG - T.I.P. Student Manual
+# The 👍/👎 CSV written by app.py and api_server.py and read back by the
+# typeahead and load tests. Each row records the tenant whose manual answered,
+# so one tenant's questions are never suggested to another. Logs written
+# before rows carried a tenant are upgraded in place on the next write.
+# ============================================================================
+
+import csv
+import os
+import threading
+
+import pandas as pd
+
+FEEDBACK_COLUMNS = ["timestamp", "question", "answer", "section", "confidence", "helpful", "tenant"]
+
+_lock = threading.Lock()
+
+
+def _header(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def append_feedback(path, row, legacy_tenant):
+    """Append one feedback row (FEEDBACK_COLUMNS, timestamp filled in).
+
+    Rows of an older log without a tenant column were all answered by `legacy_tenant`.
+    """
+    df = pd.DataFrame([dict(row, timestamp=pd.Timestamp.now())], columns=FEEDBACK_COLUMNS)
+    with _lock:
+        if not os.path.exists(path):
+            df.to_csv(path, index=False)
+            return
+        if "tenant" not in _header(path):
+            old = pd.read_csv(path)
+            old["tenant"] = legacy_tenant
+            # Replaced, not rewritten in place: readers notice the new file and start over
+            tmp = path + ".tmp"
+            old.reindex(columns=FEEDBACK_COLUMNS).to_csv(tmp, index=False)
+            os.replace(tmp, path)
+        df.to_csv(path, mode='a', header=False, index=False)
@@ -0,0 +1,220 @@
+# ============================================================================
+# HARD-NEGATIVE MINING - T.I.P. QA Dataset
+# Encodes every distinct answer with the current model, indexes them in FAISS,
+# and attaches to each question the most similar answers that are NOT its gold
+# answer. MultipleNegativesRankingLoss then trains on (question, answer,
+# negative_1..n) rows instead of relying on random in-batch negatives only.
+#
+#   python hard_negatives.py --data TIP_QA_dataset_20000.csv --out qa_hard.parquet
+#   python "Training Model.py" --data qa_hard.parquet
+# ============================================================================
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+import pandas as pd
+import torch
+
+from training_data import ANSWER_COLUMN, CHUNK_ROWS, GROUP_COLUMN, NEGATIVE_PREFIX, QUESTION_COLUMN, FrameWriter, \
+    clean_qa_frame, has_groups, iter_qa_frames
+
+MODEL_PATH = "smartual_model"
+NUM_NEGATIVES = 1
+SEARCH_K = 30               # candidates retrieved per question
+MAX_RELATIVE_SCORE = 0.95   # candidates scoring above this fraction of the gold answer are likely false negatives
+
+
+def _text_key(text):
+    return ' '.join(text.lower().split())
+
+
+def _columns(data_file):
+    return [QUESTION_COLUMN, ANSWER_COLUMN] + ([GROUP_COLUMN] if has_groups(data_file) else [])
+
+
+def collect_answers(data_file, chunk_rows=CHUNK_ROWS):
+    """Distinct answers (by normalized text), a key -> answer id map and each answer's group id
+    (from dedup_dataset.py; -1 without groups), in one streaming pass."""
+    answers, answer_ids, groups = [], {}, []
+    for frame in iter_qa_frames(data_file, chunk_rows, _columns(data_file)):
+        texts = clean_qa_frame(frame)
+        row_groups = texts[2] if len(texts) > 2 else [-1] * len(texts[1])
+        for answer, group in zip(texts[1], row_groups):
+            key = _text_key(answer)
+            if key not in answer_ids:
+                answer_ids[key] = len(answers)
+                answers.append(answer)
+                groups.append(int(group))
+    return answers, answer_ids, np.asarray(groups, dtype=np.int64)
+
+
+def build_answer_index(answer_embeds, index_factory="Flat"):
+    """Inner-product index over normalized answer embeddings; IVF/PQ factories are trained on a sample."""
+    index = faiss.index_factory(answer_embeds.shape[1], index_factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        sample = np.random.default_rng(0).permutation(len(answer_embeds))[:256 * 1024]
+        index.train(answer_embeds[sample])
+    index.add(answer_embeds)
+    return index
+
+
+def select_negatives(scores, ids, gold_ids, gold_scores, num_negatives, skip_top=0,
+                     max_relative_score=MAX_RELATIVE_SCORE, answer_groups=None):
+    """Pick the first `num_negatives` acceptable candidates per row, vectorized over the whole batch.
+
+    A candidate is rejected if it is the gold answer, within the first `skip_top` ranks, in the gold
+    answer's near-duplicate group, or scores above `max_relative_score` x the gold score (probably
+    another correct answer). Returns (negative ids with -1 where none was found, number of candidates
+    rejected as false negatives).
+    """
+    valid = (ids >= 0) & (ids != gold_ids[:, None])
+    valid[:, :skip_top] = False
+    too_close = valid & (scores > gold_scores[:, None] * max_relative_score)
+    if answer_groups is not None:
+        gold_groups = answer_groups[gold_ids]
+        too_close |= valid & (gold_groups[:, None] >= 0) & (answer_groups[ids] == gold_groups[:, None])
+    valid &= ~too_close
+
+    order = np.argsort(~valid, axis=1, kind="stable")[:, :num_negatives]
+    negatives = np.take_along_axis(ids, order, axis=1)
+    negatives[~np.take_along_axis(valid, order, axis=1)] = -1
+    return negatives, int(too_close.sum())
+
+
+def random_negatives(rng, num_answers, gold_ids, answer_groups=None, max_rounds=16):
+    """One uniformly random answer per gold id that is neither the gold answer nor in its near-duplicate group."""
+    gold_groups = answer_groups[gold_ids] if answer_groups is not None else None
+    fills = rng.integers(0, num_answers, size=len(gold_ids))
+
+    def rejected(rows):
+        bad = fills[rows] == gold_ids[rows]
+        if gold_groups is not None:
+            bad |= (gold_groups[rows] >= 0) & (answer_groups[fills[rows]] == gold_groups[rows])
+        return rows[bad]
+
+    redraw = rejected(np.arange(len(gold_ids)))
+    for _ in range(max_rounds):
+        if not len(redraw):
+            return fills
+        fills[redraw] = rng.integers(0, num_answers, size=len(redraw))
+        redraw = rejected(redraw)
+    # Gold answers whose group covers most of the answers: draw from the allowed ones explicitly
+    for row in redraw:
+        allowed = np.arange(num_answers) != gold_ids[row]
+        if gold_groups is not None and gold_groups[row] >= 0:
+            allowed &= answer_groups != gold_groups[row]
+        allowed = np.flatnonzero(allowed)
+        if not len(allowed):
+            raise ValueError("Every answer is a near-duplicate of the gold answer; no negative is possible")
+        fills[row] = rng.choice(allowed)
+    return fills
+
+
+def mine_hard_negatives(model, data_file, out_file, num_negatives=NUM_NEGATIVES, search_k=SEARCH_K, skip_top=0,
+                        max_relative_score=MAX_RELATIVE_SCORE, batch_size=128, chunk_rows=CHUNK_ROWS,
+                        threads=None, index_factory="Flat", seed=42):
+    """Write `data_file` with negative_1..negative_n columns to `out_file`; returns a stats dict.
+
+    Questions are processed chunk by chunk: while FAISS searches one chunk (which releases the
+    GIL and uses its own OpenMP threads), the model already encodes the next one.
+    """
+    if threads:
+        torch.set_num_threads(threads)
+        faiss.omp_set_num_threads(threads)
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    answers, answer_ids, answer_groups = collect_answers(data_file, chunk_rows)
+    grouped = bool((answer_groups >= 0).any())
+    if len(answers) < 2:
+        raise ValueError("Need at least two distinct answers to mine negatives")
+    print(f"🔎 Encoding {len(answers)} distinct answers...")
+    answer_embeds = model.encode(answers, batch_size=batch_size, normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=True).astype(np.float32)
+    index = build_answer_index(answer_embeds, index_factory)
+
+    stats = {"rows": 0, "answers": len(answers), "hard_negatives": 0, "random_fills": 0, "false_negatives": 0}
+    writer = FrameWriter(out_file)
+
+    def finish(questions, gold_answers, row_groups, question_embeds, search):
+        scores, ids = search.result()
+        gold_ids = np.fromiter((answer_ids[_text_key(a)] for a in gold_answers), dtype=np.int64,
+                               count=len(gold_answers))
+        gold_scores = np.einsum("ij,ij->i", question_embeds, answer_embeds[gold_ids])
+        negatives, rejected = select_negatives(scores, ids, gold_ids, gold_scores, num_negatives, skip_top,
+                                               max_relative_score, answer_groups if grouped else None)
+
+        # Rows without enough hard candidates get random answers from outside the gold answer's
+        # group, so every row has n negatives
+        missing = negatives < 0
+        missing_gold = np.broadcast_to(gold_ids[:, None], missing.shape)[missing]
+        negatives[missing] = random_negatives(rng, len(answers), missing_gold, answer_groups if grouped else None)
+
+        frame = pd.DataFrame({QUESTION_COLUMN: questions, ANSWER_COLUMN: gold_answers})
+        for n in range(num_negatives):
+            frame[f"{NEGATIVE_PREFIX}{n + 1}"] = [answers[i] for i in negatives[:, n]]
+        if row_groups is not None:
+            frame[GROUP_COLUMN] = row_groups
+        writer.write(frame)
+
+        stats["rows"] += len(questions)
+        stats["hard_negatives"] += int((~missing).sum())
+        stats["random_fills"] += int(missing.sum())
+        stats["false_negatives"] += rejected
+        print(f"   mined {stats['rows']} questions")
+
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = None
+            for frame in iter_qa_frames(data_file, chunk_rows, _columns(data_file)):
+                texts = clean_qa_frame(frame)
+                questions, gold_answers = texts[0], texts[1]
+                row_groups = texts[2] if grouped else None
+                if not questions:
+                    continue
+                question_embeds = model.encode(questions, batch_size=batch_size, normalize_embeddings=True,
+                                               convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+                search = pool.submit(index.search, question_embeds, min(search_k + 1, len(answers)))
+                if pending:
+                    finish(*pending)
+                pending = (questions, gold_answers, row_groups, question_embeds, search)
+            if pending:
+                finish(*pending)
+    finally:
+        writer.close()
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attach FAISS-mined hard negatives to a QA dataset")
+    parser.add_argument("--data", required=True, help="CSV or Parquet with 'questionnaire' and 'answer'")
+    parser.add_argument("--out", required=True, help="output CSV or Parquet")
+    parser.add_argument("--model", default=MODEL_PATH, help="model used to encode (usually the current one)")
+    parser.add_argument("--negatives", type=int, default=NUM_NEGATIVES, help="negatives per question")
+    parser.add_argument("--search-k", type=int, default=SEARCH_K)
+    parser.add_argument("--skip-top", type=int, default=0, help="ignore the first N ranks (very hard negatives)")
+    parser.add_argument("--max-relative-score", type=float, default=MAX_RELATIVE_SCORE)
+    parser.add_argument("--index-factory", default="Flat", help="FAISS factory string, e.g. IVF1024,Flat")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--threads", type=int, help="torch and FAISS threads (default: library default)")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(args.model)
+    stats = mine_hard_negatives(model, args.data, args.out, args.negatives, args.search_k, args.skip_top,
+                                args.max_relative_score, args.batch_size, args.chunk_rows, args.threads,
+                                args.index_factory)
+    print(f"✅ Wrote {stats['rows']} rows to '{args.out}' in {stats['seconds']:.0f}s: "
+          f"{stats['hard_negatives']} hard negatives, {stats['random_fills']} random fills, "
+          f"{stats['false_negatives']} likely false negatives skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+# ============================================================================
+# KNOWLEDGE BUNDLE - T.I.P. Student Manual
+# Everything the app needs to answer questions, prebuilt into one mmap-able file
+#
+#   python knowledge_bundle.py build            # writes knowledge.smkb
+#   python knowledge_bundle.py build --tenant tip-v1   # paths from tenants.json
+#   python knowledge_bundle.py info knowledge.smkb
+#
+# File layout (all array segments 64-byte aligned):
+#   [FAISS index][arrays ...][text buffer][meta JSON][trailer]
+# The FAISS index sits at offset 0 so faiss.read_index() can mmap the bundle
+# file directly; the trailer at the end points at the meta JSON, which lists
+# the offset, dtype and shape of every other segment.
+# ============================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+
+import faiss
+import numpy as np
+
+from chunk_store import ChunkStore
+
+BUNDLE_MAGIC = b"SMRTKB01"
+BUNDLE_FORMAT_VERSION = 1
+TRAILER = struct.Struct("<QQ8s")  # meta offset, meta length, magic
+ALIGNMENT = 64
+FULL_HASH_LIMIT = 8 * 1024 * 1024   # model files above this are sampled, not fully hashed
+HASH_SAMPLE = 1024 * 1024
+
+STORE_ARRAYS = ("section_offsets", "chunk_section", "chunk_start", "chunk_end", "chunk_tokens",
+                "sentence_ptr", "sentence_start", "sentence_end", "sentence_tokens")
+
+
+# ============================================================================
+# FINGERPRINTS
+# ============================================================================
+
+def model_fingerprint(model_path):
+    """Cheap content fingerprint of a SentenceTransformer folder (large weight files are sampled)."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            if name == "README.md":
+                continue
+            path = os.path.join(root, name)
+            size = os.path.getsize(path)
+            h.update(f"{os.path.relpath(path, model_path)}:{size}\n".encode())
+            with open(path, 'rb') as f:
+                if size <= FULL_HASH_LIMIT:
+                    h.update(f.read())
+                else:
+                    h.update(f.read(HASH_SAMPLE))
+                    f.seek(size - HASH_SAMPLE)
+                    h.update(f.read(HASH_SAMPLE))
+    return h.hexdigest()[:16]
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def source_meta(model_path, manual_file, examples_file, max_tokens, overlap_tokens):
+    """Everything a knowledge base depends on; stored in its meta and compared before reuse."""
+    return {
+        "model_fingerprint": model_fingerprint(model_path),
+        "manual_sha256": file_sha256(manual_file) if os.path.exists(manual_file) else None,
+        "examples_sha256": file_sha256(examples_file) if os.path.exists(examples_file) else None,
+        "chunk_max_tokens": max_tokens,
+        "chunk_overlap_tokens": overlap_tokens,
+    }
+
+
+def normalize_rows(matrix):
+    """L2-normalize rows so inner product equals cosine similarity."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+# ============================================================================
+# KNOWLEDGE BASE
+# ============================================================================
+
+class KnowledgeBase:
+    """Chunk store plus every precomputed matrix used at query time."""
+
+    def __init__(self, store, embeddings, index, sentence_embeddings, example_sections,
+                 section_centroids, meta):
+        self.store = store
+        self.embeddings = embeddings                    # (n_chunks, d) normalized
+        self.index = index                              # FAISS inner-product index over embeddings (maybe projected)
+        self.sentence_embeddings = sentence_embeddings  # (n_sentences, d) normalized
+        self.example_sections = list(example_sections)  # sections that have example questions
+        self.section_centroids = section_centroids      # (n_example_sections, d)
+        self.meta = meta
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1]
+
+    @property
+    def nbytes(self):
+        matrices = (self.embeddings, self.sentence_embeddings, self.section_centroids)
+        # The index keeps its own copy of the (projected) vectors unless it was mmapped from a bundle
+        index_bytes = 0 if self.meta.get("mmapped") else index_code_bytes(self.index)
+        return self.store.nbytes + sum(m.nbytes for m in matrices) + index_bytes
+
+    @property
+    def version(self):
+        """Identifies the model and data this knowledge base was built from (for cache invalidation)."""
+        return ":".join([str(self.meta.get(key)) for key in
+                         ("model_fingerprint", "manual_sha256", "examples_sha256", "chunk_max_tokens", "chunk_overlap_tokens",
+                          "index_factory")]
+                        + [str(self.dim)])
+
+    def matches(self, model_fp, manual_sha, examples_sha, max_tokens, overlap_tokens):
+        """True if this knowledge base was built from the given model, data and chunking config."""
+        return (self.meta.get("model_fingerprint") == model_fp
+                and self.meta.get("manual_sha256") == manual_sha
+                and self.meta.get("examples_sha256") == examples_sha
+                and self.meta.get("chunk_max_tokens") == max_tokens
+                and self.meta.get("chunk_overlap_tokens") == overlap_tokens)
+
+
+# ============================================================================
+# CHUNK INDEX (optionally projected)
+# ============================================================================
+
+PQ_POINTS_PER_CENTROID = 39     # FAISS k-means wants at least this many training points per centroid
+PQ_MIN_BITS = 4                 # coarser PQ codes cannot rank chunks; fall back to PCA below this
+
+
+def index_factory_string(projection=None, projection_dim=None, n_train=None):
+    """FAISS factory for the chunk index: "Flat", or a PCA/OPQ projection to `projection_dim` first.
+
+    Projected vectors are re-normalized, so inner products stay cosines. OPQ is followed by product
+    quantization with one sub-quantizer per 4 dimensions; codebooks get as many bits (up to 8) as
+    `n_train` can train, and with too little data for PQ_MIN_BITS the projection falls back to PCA.
+    """
+    if not projection:
+        return "Flat"
+    if projection == "pca":
+        return f"PCA{projection_dim},L2norm,Flat"
+    if projection == "opq":
+        m = max(1, projection_dim // 4)
+        nbits = 8
+        if n_train:
+            nbits = min(8, int(np.log2(max(n_train / PQ_POINTS_PER_CENTROID, 1))))
+        if nbits < PQ_MIN_BITS:
+            print(f"⚠️ {n_train} training vectors cannot train {2 ** PQ_MIN_BITS}-centroid PQ codebooks "
+                  f"(need {PQ_POINTS_PER_CENTROID * 2 ** PQ_MIN_BITS}); using PCA instead of OPQ")
+            return f"PCA{projection_dim},L2norm,Flat"
+        return f"OPQ{m}_{projection_dim},L2norm,PQ{m}x{nbits}"
+    raise ValueError(f"Unknown index projection '{projection}' (expected 'pca' or 'opq')")
+
+
+def build_chunk_index(embeddings, training_vectors, factory="Flat"):
+    """Inner-product index over the chunk embeddings; projections are learned on `training_vectors`.
+
+    FAISS keeps the projection inside the index (IndexPreTransform), so it is saved with it and
+    applied to every query at search time.
+    """
+    index = faiss.index_factory(embeddings.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        # OPQ trains its rotation against its own 8-bit PQ; give it the index's (smaller) codebooks instead
+        opq_pq = None
+        pre = faiss.downcast_index(index)
+        if isinstance(pre, faiss.IndexPreTransform):
+            transform = faiss.downcast_VectorTransform(pre.chain.at(0))
+            codes = faiss.downcast_index(pre.index)
+            if isinstance(transform, faiss.OPQMatrix) and isinstance(codes, faiss.IndexPQ):
+                opq_pq = faiss.ProductQuantizer(transform.d_out, transform.M, codes.pq.nbits)
+                transform.pq = opq_pq
+        index.train(np.ascontiguousarray(training_vectors, dtype=np.float32))
+    index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    return index
+
+
+def index_code_bytes(index):
+    """Bytes held by the index's stored vectors or codes."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index.ntotal * index.code_size
+
+
+def build_knowledge_base(model, store, section_examples, meta=None, batch_size=64, projection=None,
+                         projection_dim=None):
+    """Encode chunks, sentences and section examples once and build the FAISS index.
+
+    With `projection` ("pca" or "opq"), the chunk index stores `projection_dim`-d vectors learned on
+    the chunk, sentence and example-question embeddings; scores of the returned chunks stay exact.
+    """
+    embeddings = normalize_rows(model.encode(store.texts(), batch_size=batch_size, show_progress_bar=False))
+    sentence_embeddings = normalize_rows(
+        model.encode(store.sentence_texts(), batch_size=batch_size, show_progress_bar=False))
+
+    # Mean cosine to a section's examples == dot product with the mean of the normalized examples
+    example_sections = [s for s, examples in section_examples.items() if examples]
+    example_embeddings = [normalize_rows(model.encode(section_examples[s], show_progress_bar=False))
+                          for s in example_sections]
+    centroids = [e.mean(axis=0) for e in example_embeddings]
+    section_centroids = np.array(centroids, dtype=np.float32).reshape(len(example_sections), embeddings.shape[1])
+
+    training_vectors = np.concatenate([embeddings, sentence_embeddings] + example_embeddings)
+    factory = index_factory_string(projection, projection_dim, len(training_vectors))
+    index = build_chunk_index(embeddings, training_vectors, factory)
+
+    meta = dict(meta or {})
+    meta["built_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    meta["index_factory"] = factory
+    meta["index_projection"] = [projection, projection_dim] if projection else None
+    return KnowledgeBase(store, embeddings, index, sentence_embeddings, example_sections, section_centroids, meta)
+
+
+# ============================================================================
+# BUNDLE I/O
+# ============================================================================
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % ALIGNMENT))
+
+
+def write_bundle(kb, path):
+    """Write the knowledge base to `path` atomically (readers never see a partial file)."""
+    arrays = {
+        "embeddings": np.ascontiguousarray(kb.embeddings, dtype=np.float32),
+        "sentence_embeddings": np.ascontiguousarray(kb.sentence_embeddings, dtype=np.float32),
+        "section_centroids": np.ascontiguousarray(kb.section_centroids, dtype=np.float32),
+    }
+    for name in STORE_ARRAYS:
+        arrays[name] = np.ascontiguousarray(getattr(kb.store, name))
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(faiss.serialize_index(kb.index).tobytes())
+        segments = {}
+        for name, array in arrays.items():
+            _pad(f)
+            segments[name] = {"offset": f.tell(), "dtype": array.dtype.str, "shape": list(array.shape)}
+            f.write(array.tobytes())
+        _pad(f)
+        text = kb.store.text.encode('utf-8')
+        segments["text"] = {"offset": f.tell(), "length": len(text)}
+        f.write(text)
+
+        meta = dict(kb.meta)
+        meta.pop("mmapped", None)
+        meta.update({
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "segments": segments,
+            "section_names": kb.store.section_names,
+            "example_sections": kb.example_sections,
+        })
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        meta_offset = f.tell()
+        f.write(meta_bytes)
+        f.write(TRAILER.pack(meta_offset, len(meta_bytes), BUNDLE_MAGIC))
+    os.replace(tmp_path, path)
+
+
+def read_bundle_meta(path):
+    with open(path, 'rb') as f:
+        f.seek(-TRAILER.size, os.SEEK_END)
+        meta_offset, meta_length, magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a knowledge bundle")
+        f.seek(meta_offset)
+        meta = json.loads(f.read(meta_length).decode('utf-8'))
+    if meta.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"{path} has bundle format {meta.get('format_version')}, expected {BUNDLE_FORMAT_VERSION}")
+    return meta
+
+
+def open_bundle(path):
+    """Open a bundle with every matrix memory-mapped read-only, so processes share the pages."""
+    meta = read_bundle_meta(path)
+    segments = meta["segments"]
+
+    def mapped(name):
+        seg = segments[name]
+        return np.memmap(path, dtype=np.dtype(seg["dtype"]), mode='r',
+                         offset=seg["offset"], shape=tuple(seg["shape"]))
+
+    with open(path, 'rb') as f:
+        f.seek(segments["text"]["offset"])
+        text = f.read(segments["text"]["length"]).decode('utf-8')
+
+    store = ChunkStore(text, meta["section_names"], *(mapped(name) for name in STORE_ARRAYS))
+
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    index = faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+
+    meta["mmapped"] = True
+    return KnowledgeBase(store, mapped("embeddings"), index, mapped("sentence_embeddings"),
+                         meta["example_sections"], mapped("section_centroids"), meta)
+
+
+def open_bundle_if_fresh(bundle_file, model_path, manual_file, examples_file, embedding_dim,
+                        max_tokens, overlap_tokens, projection=None, projection_dim=None):
+    """Open a bundle only if it was built from this model, these data files, chunk and index settings."""
+    if not bundle_file or not os.path.exists(bundle_file):
+        return None
+    if not (os.path.exists(manual_file) and os.path.exists(examples_file)):
+        return None
+    try:
+        kb = open_bundle(bundle_file)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not open knowledge bundle: {e}")
+        return None
+
+    wanted_projection = [projection, projection_dim] if projection else None
+    fresh = kb.dim == embedding_dim and kb.meta.get("index_projection") == wanted_projection and kb.matches(
+        model_fingerprint(model_path), file_sha256(manual_file), file_sha256(examples_file),
+        max_tokens, overlap_tokens)
+    if not fresh:
+        print(f"⚠️ {bundle_file} is stale, building in-process (rerun: python knowledge_bundle.py build)")
+        return None
+
+    print(f"✅ Opened knowledge bundle {bundle_file} ({len(kb.store)} chunks, built {kb.meta.get('built_at')})")
+    return kb
+
+
+# ============================================================================
+# BUILD COMMAND
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a Smartual knowledge bundle")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="encode the manual and write a bundle")
+    build.add_argument("--model", default="smartual_model")
+    build.add_argument("--manual", default="manual_data.json")
+    build.add_argument("--examples", default="section_examples.json")
+    build.add_argument("--max-tokens", type=int, default=128)
+    build.add_argument("--overlap", type=int, default=32)
+    build.add_argument("--dim", type=int, help="truncate embeddings to this size (app.py EMBEDDING_DIM)")
+    build.add_argument("--projection", choices=("pca", "opq"), help="project the chunk index (app.py INDEX_PROJECTION)")
+    build.add_argument("--projection-dim", type=int, default=128, help="app.py INDEX_PROJECTION_DIM")
+    build.add_argument("--out", default="knowledge.smkb")
+    build.add_argument("--tenant", help="take --manual/--examples/--out from this entry of --tenants-file")
+    build.add_argument("--tenants-file", default="tenants.json")
+
+    info = sub.add_parser("info", help="print the metadata of a bundle")
+    info.add_argument("bundle", nargs="?", default="knowledge.smkb")
+
+    args = parser.parse_args()
+
+    if args.command == "info":
+        meta = read_bundle_meta(args.bundle)
+        meta.pop("segments")
+        print(json.dumps(meta, indent=2, ensure_ascii=False))
+        return
+
+    from sentence_transformers import SentenceTransformer
+    from chunker import ManualChunker
+
+    if args.tenant:
+        from corpus_registry import load_tenants
+        tenant = load_tenants(args.tenants_file, {})[args.tenant]
+        args.manual, args.examples, args.out = tenant["manual"], tenant["examples"], tenant["bundle"]
+
+    start = time.time()
+    with open(args.manual, 'r', encoding='utf-8') as f:
+        manual_sections = json.load(f)
+    with open(args.examples, 'r', encoding='utf-8') as f:
+        section_examples = json.load(f)
+
+    model = SentenceTransformer(args.model, truncate_dim=args.dim)
+    chunker = ManualChunker(args.model, max_tokens=args.max_tokens, overlap_tokens=args.overlap)
+    store = ChunkStore.from_manual(manual_sections, chunker)
+    kb = build_knowledge_base(model, store, section_examples,
+                              meta=source_meta(args.model, args.manual, args.examples, args.max_tokens, args.overlap),
+                              projection=args.projection, projection_dim=args.projection_dim)
+    write_bundle(kb, args.out)
+    print(f"✅ Wrote {args.out}: {len(store)} chunks, {len(kb.sentence_embeddings)} sentences, "
+          f"dim {kb.dim}, index {kb.meta['index_factory']}, {os.path.getsize(args.out) / 1024:.1f} KiB "
+          f"in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# ============================================================================
+# LEXICAL INDEX - T.I.P. Student Manual
+# BM25 keyword search over the chunk store, with no encoder involved. Used for
+# degraded answers when the encoder is overloaded (see admission.py): the
+# chunks and sentences returned keep the same ids and spans as dense answers.
+# ============================================================================
+
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i if in is it my of on or so the there this to was what
+when where which who why will with you your me we our am
+""".split())
+
+
+def terms(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """Inverted index of chunk terms scored with BM25."""
+
+    def __init__(self, store, k1=1.2, b=0.75):
+        self.store = store
+        self.k1 = k1
+        self.b = b
+        counts = [Counter(terms(text)) for text in store.texts()]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        self.length_norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0)) if len(counts) else lengths
+        postings = {}
+        for chunk_id, chunk_counts in enumerate(counts):
+            for term, tf in chunk_counts.items():
+                postings.setdefault(term, []).append((chunk_id, tf))
+        n = len(counts)
+        self.postings = {term: (np.array([c for c, _ in p], dtype=np.int64), np.array([tf for _, tf in p], np.float32))
+                         for term, p in postings.items()}
+        self.idf = {term: float(np.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))) for term, p in postings.items()}
+
+    def search(self, question, top_k=3):
+        """(chunk ids, coverage): best BM25 chunks and the idf-weighted share of query terms each contains."""
+        query = set(terms(question))
+        scores = np.zeros(len(self.length_norm), dtype=np.float32)
+        matched = np.zeros_like(scores)
+        total_idf = sum(self.idf.get(t, 0.0) for t in query)
+        for term in query:
+            if term not in self.postings:
+                continue
+            chunk_ids, tf = self.postings[term]
+            idf = self.idf[term]
+            scores[chunk_ids] += idf * tf * (self.k1 + 1) / (tf + self.length_norm[chunk_ids])
+            matched[chunk_ids] += idf
+        hits = np.flatnonzero(scores > 0)
+        ranked = hits[np.argsort(-scores[hits], kind="stable")][:top_k]
+        coverage = matched[ranked] / total_idf if total_idf else np.zeros(len(ranked), dtype=np.float32)
+        return [int(i) for i in ranked], coverage
+
+    def sentence_coverage(self, question, sentence_ids):
+        """Idf-weighted share of the query terms found in each sentence."""
+        query = {t: self.idf.get(t, 0.0) for t in set(terms(question))}
+        total = sum(query.values())
+        store = self.store
+        coverage = np.zeros(len(sentence_ids), dtype=np.float32)
+        if not total:
+            return coverage
+        for i, s in enumerate(sentence_ids):
+            found = set(terms(store.slice(int(store.sentence_start[s]), int(store.sentence_end[s]))))
+            coverage[i] = sum(w for t, w in query.items() if t in found) / total
+        return coverage
@@ -0,0 +1,319 @@
+# ============================================================================
+# LOAD TEST - How many students can one app.py process serve at once?
+#
+#   python load_test.py --users 1,2,4,8,16 --duration 30
+#   python load_test.py --mode apptest --users 1,4 --duration 20 --json report.json
+#
+# Virtual users replay questions from section_examples.json and feedback_log.csv.
+# "pipeline" mode calls qa_pipeline.answer_question directly in threads (the way
+# Streamlit runs sessions), with app.py's answer settings from serving_config.py;
+# "apptest" mode drives the real app.py headlessly with
+# streamlit.testing AppTest, so script reruns, CSS and sidebar are included.
+# AppTest is not thread-safe, so apptest users keep separate sessions but take
+# turns: its numbers are the per-interaction cost of a full script rerun.
+# ============================================================================
+
+import argparse
+import csv
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:  # CPU/RSS fall back to os.times() and /proc
+    psutil = None
+
+from serving_config import (ANSWER_CACHE_SIZE, BUNDLE_FILE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, EMBEDDING_DIM,
+                            FEEDBACK_PATH, INDEX_PROJECTION, INDEX_PROJECTION_DIM, MANUAL_DATA_FILE, MODEL_PATH,
+                            RERANKER_MODEL, SECTION_EXAMPLES_FILE, SEMANTIC_CACHE_THRESHOLD, STATIC_ENCODER_FILE,
+                            STATIC_FIRST_STAGE_CANDIDATES, answer_cache_version, answer_settings, create_reranker)
+
+
+# ============================================================================
+# QUESTION MIX
+# ============================================================================
+
+def load_question_mix(examples_file, feedback_file, feedback_weight=1.0):
+    """Questions and sampling weights: every example once, feedback questions by how often they were asked."""
+    counts = {}
+    if os.path.exists(examples_file):
+        with open(examples_file, 'r', encoding='utf-8') as f:
+            for examples in json.load(f).values():
+                for question in examples:
+                    counts[question] = counts.get(question, 0.0) + 1.0
+
+    if os.path.exists(feedback_file):
+        with open(feedback_file, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                question = (row.get("question") or "").strip()
+                if question:
+                    counts[question] = counts.get(question, 0.0) + feedback_weight
+
+    if not counts:
+        raise SystemExit(f"❌ No questions found in {examples_file} or {feedback_file}")
+    questions = list(counts)
+    return questions, [counts[q] for q in questions]
+
+
+# ============================================================================
+# RESOURCE SAMPLING
+# ============================================================================
+
+def _rss_bytes():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class ResourceSampler(threading.Thread):
+    """Records (elapsed, cpu %, rss MiB) for this process every `interval` seconds."""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._start = time.perf_counter()
+
+    def run(self):
+        last_wall, last_cpu = time.perf_counter(), sum(os.times()[:2])
+        while not self._stop_event.wait(self.interval):
+            wall, cpu = time.perf_counter(), sum(os.times()[:2])
+            cpu_percent = 100.0 * (cpu - last_cpu) / max(wall - last_wall, 1e-9)
+            last_wall, last_cpu = wall, cpu
+            self.samples.append((wall - self._start, cpu_percent, _rss_bytes() / 2**20))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def window(self, start, end):
+        return [s for s in self.samples if start <= s[0] <= end]
+
+
+# ============================================================================
+# DRIVERS
+# ============================================================================
+
+class PipelineDriver:
+    """Calls the QA pipeline directly, answering like app.py; measures model + retrieval cost without UI overhead."""
+
+    serialized = False
+
+    def __init__(self, args):
+        from sentence_transformers import SentenceTransformer
+        from knowledge_bundle import open_bundle_if_fresh, build_knowledge_base
+        from chunk_store import ChunkStore
+        from chunker import ManualChunker
+        from qa_pipeline import answer_question
+
+        self.answer_question = answer_question
+        self.reranker = create_reranker(args.reranker)
+        self.model = SentenceTransformer(args.model, truncate_dim=args.dim)
+        self.kb = open_bundle_if_fresh(args.bundle, args.model, args.manual, args.examples,
+                                       self.model.get_sentence_embedding_dimension(),
+                                       CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, args.projection, args.projection_dim)
+        if self.kb is None:
+            with open(args.manual, 'r', encoding='utf-8') as f:
+                manual_sections = json.load(f)
+            with open(args.examples, 'r', encoding='utf-8') as f:
+                section_examples = json.load(f)
+            store = ChunkStore.from_manual(manual_sections, ManualChunker(args.model, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS))
+            self.kb = build_knowledge_base(self.model, store, section_examples, projection=args.projection,
+                                           projection_dim=args.projection_dim)
+
+        first_stage = None
+        static = None
+        if STATIC_FIRST_STAGE_CANDIDATES:
+            from static_encoder import StaticFirstStage, open_static_encoder
+            static = open_static_encoder(STATIC_ENCODER_FILE, args.model, args.dim)
+        if static is not None:
+            with open(args.examples, 'r', encoding='utf-8') as f:
+                static_kb = build_knowledge_base(static, self.kb.store, json.load(f))
+            first_stage = StaticFirstStage(static, static_kb, STATIC_FIRST_STAGE_CANDIDATES)
+        self.settings = answer_settings(self.reranker, first_stage)
+
+        self.cache = None
+        if args.cache:
+            from semantic_cache import SemanticAnswerCache
+            self.cache = SemanticAnswerCache(self.kb.dim, capacity=ANSWER_CACHE_SIZE, threshold=args.cache_threshold)
+            self.cache.ensure_version(answer_cache_version(self.kb, args.reranker))
+
+    def new_user(self):
+        return lambda question: self.answer_question(question, self.model, self.kb, cache=self.cache, **self.settings)
+
+
+class AppTestDriver:
+    """Each virtual user is a headless app.py session: type question, press ASK, go back.
+
+    AppTest is not thread-safe, so users take turns under one lock; see `serialized`.
+    """
+
+    serialized = True   # concurrent users do not overlap: throughput is one session's, latency includes waiting
+
+    def __init__(self, args):
+        from streamlit.testing.v1 import AppTest
+        self.AppTest = AppTest
+        self.script = os.path.abspath(args.app)
+        self.timeout = args.timeout
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _button(at, label):
+        for button in at.button:
+            if button.label == label:
+                return button
+        raise RuntimeError(f"button {label!r} not found")
+
+    def new_user(self):
+        with self.lock:
+            at = self.AppTest.from_file(self.script, default_timeout=self.timeout)
+            at.run()
+
+        def ask(question):
+            with self.lock:
+                at.text_input(key="main_question_input").input(question)
+                self._button(at, "🚀 **ASK**").click()
+                at.run()
+                if at.exception:
+                    raise RuntimeError(at.exception[0].message)
+                self._button(at, "⬅️ Back").click()
+                at.run()
+
+        return ask
+
+
+# ============================================================================
+# LOAD STEPS
+# ============================================================================
+
+def run_step(driver, n_users, duration, questions, weights, think_time, sampler, seed):
+    """Run n_users concurrent virtual users for `duration` seconds and summarize latency."""
+    users = [driver.new_user() for _ in range(n_users)]
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(n_users + 1)
+
+    def user_loop(user_id, ask):
+        rng = random.Random(seed + user_id)
+        barrier.wait()
+        while time.perf_counter() < deadline:
+            question = rng.choices(questions, weights)[0]
+            start = time.perf_counter()
+            try:
+                ask(question)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                time.sleep(0.1)  # don't spin on a persistent failure
+            if think_time:
+                time.sleep(rng.expovariate(1.0 / think_time))
+
+    threads = [threading.Thread(target=user_loop, args=(i, ask), daemon=True) for i, ask in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    deadline = time.perf_counter() + duration
+    step_start = time.perf_counter() - sampler._start
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - (deadline - duration)
+    resources = sampler.window(step_start, time.perf_counter() - sampler._start)
+
+    lat_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "users": n_users,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p95_ms": float(np.percentile(lat_ms, 95)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+        "max_ms": float(lat_ms.max()),
+        "cpu_percent_avg": float(np.mean([r[1] for r in resources])) if resources else 0.0,
+        "rss_mb_peak": float(max(r[2] for r in resources)) if resources else _rss_bytes() / 2**20,
+    }
+
+
+def print_report(results, serialized=False):
+    if serialized:
+        print("\n⚠️ Serialized: users took turns (AppTest is not thread-safe), so this is not concurrent load; "
+              "latency includes the wait for other users and req/s is a single session's")
+    print(f"\n{'users':>5} {'req':>6} {'err':>4} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'cpu %':>6} {'rss MB':>7}")
+    for r in results:
+        print(f"{r['users']:>5} {r['requests']:>6} {r['errors']:>4} {r['throughput_rps']:>7.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['cpu_percent_avg']:>6.0f} {r['rss_mb_peak']:>7.0f}")
+        if r["first_error"]:
+            print(f"      first error: {r['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for the Smartual assistant")
+    parser.add_argument("--mode", choices=("pipeline", "apptest"), default="pipeline")
+    parser.add_argument("--users", default="1,2,4,8", help="comma-separated concurrency levels to step through")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per concurrency level")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's questions (s)")
+    parser.add_argument("--feedback-weight", type=float, default=1.0, help="weight of each logged feedback question")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--manual", default=MANUAL_DATA_FILE)
+    parser.add_argument("--examples", default=SECTION_EXAMPLES_FILE)
+    parser.add_argument("--bundle", default=BUNDLE_FILE)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="serving embedding dimension in pipeline mode")
+    parser.add_argument("--projection", choices=("pca", "opq"), default=INDEX_PROJECTION,
+                        help="projected chunk index in pipeline mode")
+    parser.add_argument("--projection-dim", type=int, default=INDEX_PROJECTION_DIM)
+    parser.add_argument("--feedback", default=FEEDBACK_PATH)
+    parser.add_argument("--reranker", default=RERANKER_MODEL, help="cross-encoder reranker in pipeline mode")
+    parser.add_argument("--cache", action="store_true", help="answer through a SemanticAnswerCache in pipeline mode")
+    parser.add_argument("--cache-threshold", type=float, default=SEMANTIC_CACHE_THRESHOLD)
+    parser.add_argument("--app", default="app.py", help="script driven in apptest mode")
+    parser.add_argument("--timeout", type=float, default=60.0, help="AppTest per-run timeout (s)")
+    parser.add_argument("--json", help="write the per-level results to this file")
+    parser.add_argument("--timeline", help="write (time, cpu %%, rss MiB) samples to this CSV")
+    args = parser.parse_args()
+
+    questions, weights = load_question_mix(args.examples, args.feedback, args.feedback_weight)
+    print(f"📋 Question mix: {len(questions)} distinct questions")
+
+    driver = PipelineDriver(args) if args.mode == "pipeline" else AppTestDriver(args)
+    driver.new_user()(questions[0])  # warm-up: model load, caches, first-run allocations
+
+    sampler = ResourceSampler()
+    sampler.start()
+    results = []
+    for n_users in [int(u) for u in args.users.split(",")]:
+        print(f"🚦 {n_users} {'serialized' if driver.serialized else 'concurrent'} users for {args.duration:.0f}s...")
+        results.append(run_step(driver, n_users, args.duration, questions, weights,
+                                args.think_time, sampler, args.seed))
+    sampler.stop()
+    print_report(results, driver.serialized)
+    if getattr(driver, "cache", None) is not None:
+        print(f"\n⚡ Answer cache: {driver.cache.stats()}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"mode": args.mode, "serialized": driver.serialized, "results": results}, f, indent=2)
+    if args.timeline:
+        with open(args.timeline, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["elapsed_s", "cpu_percent", "rss_mb"])
+            writer.writerows(sampler.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# ============================================================================
+# METRICS - T.I.P. Student Manual
+# A small thread-safe metrics registry (counters, gauges, histograms) served on
+# a local port in the Prometheus text exposition format:
+#
+#   curl http://127.0.0.1:9464/metrics
+#
+# Streamlit exposes no operational metrics; AssistantMetrics defines the ones
+# the app records (questions, stage latencies, encoder batch sizes, cache
+# hits/misses, index size, model load time, feedback writes, errors, questions
+# shed by admission control and the pipeline's running/waiting counts).
+# ============================================================================
+
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            le = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(float(total))}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        return self._add(Histogram(name, help_text, buckets, labels))
+
+    def render(self):
+        """The whole registry in the text exposition format."""
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+class AssistantMetrics:
+    """Every metric the assistant records, in one registry."""
+
+    def __init__(self, prefix="smartual"):
+        self.registry = r = MetricsRegistry()
+        self.questions = r.counter(f"{prefix}_questions_total", "Questions answered",
+                                   labels=("tenant", "cache", "degraded"))
+        self.question_seconds = r.histogram(f"{prefix}_question_seconds", "End-to-end process_question latency")
+        self.stage_seconds = r.histogram(f"{prefix}_stage_seconds", "Latency of each QA pipeline stage",
+                                         labels=("stage",))
+        self.encode_batch_size = r.histogram(f"{prefix}_encode_batch_size", "Texts per model.encode call",
+                                             buckets=BATCH_BUCKETS, labels=("caller",))
+        self.cache_lookups = r.counter(f"{prefix}_cache_lookups_total", "Answer cache lookups", labels=("result",))
+        self.index_chunks = r.gauge(f"{prefix}_index_chunks", "Chunks in a tenant's index", labels=("tenant",))
+        self.index_bytes = r.gauge(f"{prefix}_index_bytes", "Memory of a tenant's knowledge base", labels=("tenant",))
+        self.index_build_seconds = r.histogram(f"{prefix}_index_build_seconds", "build_index duration",
+                                               buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+        self.model_load_seconds = r.gauge(f"{prefix}_model_load_seconds", "Duration of the last load_model")
+        self.feedback_writes = r.counter(f"{prefix}_feedback_writes_total", "Feedback rows written",
+                                         labels=("helpful",))
+        self.errors = r.counter(f"{prefix}_errors_total", "Errors by where they happened", labels=("where",))
+        self.shed = r.counter(f"{prefix}_shed_total", "Questions shed by admission control, by reason and fallback",
+                              labels=("reason", "fallback"))
+        self.admission_wait_seconds = r.histogram(f"{prefix}_admission_wait_seconds", "Wait for a pipeline slot")
+        self.pipeline_running = r.gauge(f"{prefix}_pipeline_running", "Questions in the pipeline")
+        self.pipeline_waiting = r.gauge(f"{prefix}_pipeline_waiting", "Questions waiting for a pipeline slot")
+
+    def observe_answer(self, result, tenant_id, seconds):
+        """Record one process_question result (see qa_pipeline.answer_question)."""
+        cache = result.get("cache") or "off"
+        self.questions.inc(tenant=tenant_id, cache=cache, degraded=bool(result.get("degraded")))
+        self.question_seconds.observe(seconds)
+        if cache != "off":
+            self.cache_lookups.inc(result=cache)   # exact, semantic or miss
+        timings = result.get("timings") or {}
+        for stage, stage_seconds in timings.items():
+            if stage != "total":
+                self.stage_seconds.observe(stage_seconds, stage=stage)
+        if "encode" in timings:   # exact cache hits skip the model
+            self.encode_batch_size.observe(1, caller="question")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # scrapes every few seconds would flood the app's log
+
+
+def start_metrics_server(registry, host="127.0.0.1", port=9464):
+    """Serve `registry` on http://host:port/metrics from a daemon thread; None if the port is taken."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"❌ Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
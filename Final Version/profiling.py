@@ -0,0 +1,150 @@
+# ============================================================================
+# ON-DEMAND PROFILING - T.I.P. Student Manual
+# Opt-in, per-request profiles for questions that are slow in production.
+#   sampling:      a background thread samples the request thread's stack every
+#                  few ms and writes folded stacks ("a;b;c 12"), readable by
+#                  flamegraph.pl, speedscope or inferno
+#   deterministic: cProfile, written as a .prof file (snakeviz, flameprof)
+# Profiles go to a directory capped in file count and total size; the oldest
+# are deleted first. When profiling is off, the wrapper only checks a flag.
+# ============================================================================
+
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL_MS = 2
+MAX_PROFILE_FILES = 200
+MAX_PROFILE_BYTES = 50 * 2**20
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread and counts identical stacks."""
+
+    def __init__(self, thread_id, interval_ms=SAMPLE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000.0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(self._frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        """Brendan Gregg's folded-stack format, one "root;...;leaf count" line per stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Writes one profile per profiled call to `out_dir`, keeping the directory within its caps."""
+
+    def __init__(self, out_dir=PROFILE_DIR, mode="sampling", interval_ms=SAMPLE_INTERVAL_MS,
+                 max_files=MAX_PROFILE_FILES, max_bytes=MAX_PROFILE_BYTES):
+        if mode not in ("sampling", "deterministic"):
+            raise ValueError(f"Unknown profiling mode '{mode}' (expected 'sampling' or 'deterministic')")
+        self.out_dir = out_dir
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+    @contextmanager
+    def profile(self, name, enabled=True):
+        """Profile the block if `enabled`; the profile's path is printed once written."""
+        if not enabled:
+            yield
+            return
+        start = time.perf_counter()
+        if self.mode == "sampling":
+            sampler = StackSampler(threading.get_ident(), self.interval_ms)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                self._write(name, start, ".folded", lambda path: _write_text(path, sampler.folded()))
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self._write(name, start, ".prof", profiler.dump_stats)
+
+    def wrap(self, name, enabled):
+        """Decorator form of profile(); `enabled()` is checked on every call."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.profile(name, enabled()):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _write(self, name, start, suffix, dump):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.out_dir, f"{stamp}-{name}-{elapsed_ms:.0f}ms{suffix}")
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            dump(path)
+            self._rotate()
+            print(f"🔬 Profiled {name} ({elapsed_ms:.0f} ms): {path}")
+        except OSError as e:
+            print(f"❌ Could not write profile {path}: {e}")
+
+    def _rotate(self):
+        """Delete the oldest profiles until the directory is within max_files and max_bytes.
+
+        Several sessions (or processes) may rotate at once, so files can vanish while we look.
+        """
+        entries = []
+        for entry in os.scandir(self.out_dir):
+            if entry.name.endswith((".folded", ".prof")):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_files or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
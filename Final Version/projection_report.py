@@ -0,0 +1,125 @@
+# ============================================================================
+# INDEX PROJECTION REPORT - T.I.P. Student Manual
+# Retrieval quality of the chunk index against its target dimension, for the
+# PCA and OPQ projections serving_config.py can enable (INDEX_PROJECTION/_DIM),
+# so the accuracy lost can be weighed against index memory and search time.
+#
+#   python projection_report.py                       # pca + opq at 256/128/64/32
+#   python projection_report.py --methods pca --dims 192,96 --json projection.json
+#
+# Section example questions are split in two: even ones train the projection
+# (with the chunk and sentence embeddings, as in the app), odd ones are the
+# queries, so the curve is not measured on training questions.
+# ============================================================================
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from chunk_store import ChunkStore
+from chunker import ManualChunker
+from knowledge_bundle import build_chunk_index, index_code_bytes, index_factory_string, normalize_rows
+from retrieval_eval import MRR_AT, RetrievalEvaluator
+from serving_config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, EMBEDDING_DIM, MANUAL_DATA_FILE, MODEL_PATH, \
+    SECTION_EXAMPLES_FILE
+
+DIMS = (256, 128, 64, 32)
+SEARCH_REPEATS = 20         # the queries are searched this many times for the timing
+
+
+def encode(model, texts):
+    return normalize_rows(model.encode(texts, batch_size=64, show_progress_bar=False)).astype(np.float32)
+
+
+def search_index(index, queries, depth):
+    """Rankings and search time per query (µs)."""
+    start = time.perf_counter()
+    for _ in range(SEARCH_REPEATS):
+        _, ranked = index.search(queries, depth)
+    return ranked, (time.perf_counter() - start) * 1e6 / (SEARCH_REPEATS * len(queries))
+
+
+def projection_curve(model, store, section_examples, methods, dims):
+    """One row per index configuration: factory, bytes per vector, µs per query and retrieval metrics."""
+    embeddings = encode(model, store.texts())
+    sentence_embeddings = encode(model, store.sentence_texts())
+
+    train_questions, queries, relevant = [], [], []
+    for section_id, section_name in enumerate(store.section_names):
+        examples = section_examples.get(section_name, [])
+        train_questions += examples[0::2]
+        chunk_ids = set(np.flatnonzero(store.chunk_section == section_id).tolist())
+        for question in examples[1::2]:
+            queries.append(question)
+            relevant.append(chunk_ids)
+    if not queries:
+        raise ValueError("No section example questions to evaluate with")
+
+    evaluator = RetrievalEvaluator("manual", queries, store.texts(), relevant)
+    query_embeddings = encode(model, queries)
+    training = np.concatenate([embeddings, sentence_embeddings] +
+                              ([encode(model, train_questions)] if train_questions else []))
+
+    configs = [("none", embeddings.shape[1])] + [(m, d) for m in methods for d in dims if d < embeddings.shape[1]]
+    rows, full_ranked = [], None
+    for method, dim in configs:
+        factory = index_factory_string(None if method == "none" else method, dim, len(training))
+        index = build_chunk_index(embeddings, training, factory)
+        ranked, search_us = search_index(index, query_embeddings, evaluator.depth)
+        if full_ranked is None:
+            full_ranked = ranked
+        overlap = np.mean([len(set(a[:MRR_AT]) & set(b[:MRR_AT])) / min(MRR_AT, evaluator.depth)
+                           for a, b in zip(ranked, full_ranked)])
+        rows.append(dict(evaluator.ranking_metrics(ranked), method=method, dim=dim, factory=factory,
+                         bytes_per_vector=index_code_bytes(index) / len(embeddings), search_us=search_us,
+                         overlap_with_full=float(overlap)))
+    return rows, len(queries)
+
+
+def print_curve(rows, n_queries):
+    full = rows[0]
+    print(f"\n📉 Retrieval quality vs index dimension ({n_queries} held-out example questions)")
+    print(f"   {'index':32s} {'bytes/vec':>9s} {'µs/query':>9s} {'R@1':>6s} {'R@3':>6s} {'R@10':>6s} "
+          f"{'MRR@10':>7s} {'ΔMRR':>7s} {'top10 overlap':>13s}")
+    for row in rows:
+        mrr = row[f"manual_mrr@{MRR_AT}"]
+        print(f"   {row['factory']:32s} {row['bytes_per_vector']:9.0f} {row['search_us']:9.1f} "
+              f"{row['manual_recall@1']:6.3f} {row['manual_recall@3']:6.3f} {row['manual_recall@10']:6.3f} "
+              f"{mrr:7.3f} {mrr - full[f'manual_mrr@{MRR_AT}']:+7.3f} {row['overlap_with_full']:13.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality of PCA/OPQ-projected chunk indexes by dimension")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--manual", default=MANUAL_DATA_FILE)
+    parser.add_argument("--examples", default=SECTION_EXAMPLES_FILE)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="serving embedding dimension")
+    parser.add_argument("--methods", default="pca,opq", help="comma-separated: pca, opq")
+    parser.add_argument("--dims", default=",".join(map(str, DIMS)), help="comma-separated target dimensions")
+    parser.add_argument("--json", help="write the rows to this file")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    with open(args.manual, 'r', encoding='utf-8') as f:
+        manual_sections = json.load(f)
+    with open(args.examples, 'r', encoding='utf-8') as f:
+        section_examples = json.load(f)
+
+    model = SentenceTransformer(args.model, truncate_dim=args.dim)
+    store = ChunkStore.from_manual(manual_sections, ManualChunker(args.model, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS))
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+    dims = sorted({int(d) for d in args.dims.split(",") if d.strip()}, reverse=True)
+
+    rows, n_queries = projection_curve(model, store, section_examples, methods, dims)
+    print_curve(rows, n_queries)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# ============================================================================
+# QA PIPELINE - T.I.P. Student Manual
+# Question -> section classification -> chunk retrieval -> answer extraction.
+# No Streamlit here, so the UI, load tests and services share one code path.
+# ============================================================================
+
+import time
+
+import numpy as np
+
+from knowledge_bundle import normalize_rows
+
+NO_ANSWER = "Sorry, I could not find this in the Student Manual."
+
+
+def encode_question(question, model):
+    """Encode the question once; every pipeline stage reuses this normalized vector."""
+    return normalize_rows(model.encode([question], show_progress_bar=False))
+
+
+def classify_question(question_embed, kb):
+    """Use in-context examples to classify question's section by similarity."""
+    if not kb.example_sections:
+        return None, 0.0
+
+    # Mean cosine to each section's examples, via the precomputed section centroids
+    scores = kb.section_centroids @ question_embed[0]
+    best = int(np.argmax(scores))
+    return kb.example_sections[best], float(scores[best])
+
+
+def retrieve_chunks(question_embed, kb, top_k=3):
+    """Retrieve the ids of the top K most similar chunks using FAISS."""
+    # A projected index (PCA/OPQ) applies its projection to the query inside search()
+    _, I = kb.index.search(question_embed, top_k)
+
+    top_ids = [int(i) for i in I[0] if i >= 0]
+    # Exact cosines from the full embeddings, whatever the index stores
+    similarities = kb.embeddings[top_ids] @ question_embed[0]
+
+    return top_ids, similarities
+
+
+def candidate_sentences(kb, chunk_ids, min_chars=10):
+    """Sentence ids of the given chunks, without duplicates from chunk overlap or very short fragments."""
+    store = kb.store
+    ptr = store.sentence_ptr
+    ids = np.concatenate([np.arange(ptr[c], ptr[c + 1]) for c in chunk_ids]) if chunk_ids else np.zeros(0, np.int64)
+    ids = ids[(store.sentence_end[ids] - store.sentence_start[ids]) > min_chars]
+    # Overlapping chunks store the same sentence twice; keep the first occurrence (best chunk first)
+    _, first = np.unique(store.sentence_start[ids], return_index=True)
+    return ids[np.sort(first)]
+
+
+def mmr_select(relevance, similarity, k, mmr_lambda=0.7, lengths=None, max_length=None):
+    """Maximal marginal relevance over one precomputed similarity block.
+
+    relevance: (n,) query similarity; similarity: (n, n) candidate-candidate similarity.
+    Each pick is a single vectorized argmax; lengths/max_length optionally cap the total tokens.
+    """
+    n = len(relevance)
+    selected = []
+    redundancy = np.zeros(n, dtype=np.float32)   # max similarity to anything already selected
+    available = np.ones(n, dtype=bool)
+    remaining = max_length
+
+    while len(selected) < k:
+        if remaining is not None:
+            available &= lengths <= remaining
+        if not available.any():
+            break
+        scores = np.where(available, mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(redundancy, similarity[pick], out=redundancy)
+        if remaining is not None:
+            remaining -= lengths[pick]
+    return selected
+
+
+def generate_answer(question_embed, kb, chunk_ids, chunk_scores, max_sentences=3, max_tokens=None, mmr_lambda=0.7):
+    """Extract the most relevant, non-redundant sentences from the given chunks, with their offsets."""
+    store = kb.store
+    sentence_ids = candidate_sentences(kb, chunk_ids)
+
+    if len(sentence_ids) == 0:
+        chunk = store[chunk_ids[0]]
+        return chunk.chunk_text[:200] + "...", float(chunk_scores[0]), []
+
+    # Sentence embeddings are precomputed in the knowledge base, only matrix products here
+    sent_embeds = kb.sentence_embeddings[sentence_ids]
+    relevance = sent_embeds @ question_embed[0]
+    similarity = sent_embeds @ sent_embeds.T
+    lengths = store.sentence_tokens[sentence_ids] if max_tokens else None
+
+    picks = mmr_select(relevance, similarity, max_sentences, mmr_lambda, lengths, max_tokens)
+    if not picks:
+        # Token budget smaller than any single sentence: still answer with the most relevant one
+        picks = [int(np.argmax(relevance))]
+    spans = [(int(store.sentence_start[sentence_ids[i]]), int(store.sentence_end[sentence_ids[i]])) for i in picks]
+
+    answer = ' '.join(store.slice(start, end) for start, end in spans)
+    confidence = float(relevance[picks[0]])
+
+    return answer, confidence, spans
+
+
+def warm_cache(questions, model, kb, cache, batch_size=64, **answer_kwargs):
+    """Precompute answers for known questions (e.g. typeahead suggestions) with one batched encode."""
+    pending = [q for q in dict.fromkeys(questions) if not cache.contains(q)]
+    if not pending:
+        return 0
+    embeds = normalize_rows(model.encode(pending, batch_size=batch_size, show_progress_bar=False))
+    for question, embed in zip(pending, embeds):
+        # Answer each one itself (not from a similar cached question) so picks are exact hits
+        result = answer_question(question, model, kb, question_embed=embed[None, :], **answer_kwargs)
+        cache.store(question, embed[None, :], result)
+    return len(pending)
+
+
+def answer_question(question, model, kb, top_k=3, reranker=None, answer_chunks=1, max_sentences=3,
+                    max_tokens=None, mmr_lambda=0.7, cache=None, question_embed=None, first_stage=None):
+    """Run the full pipeline. Returns plain data (chunk ids, floats) safe to keep in session state.
+
+    The answer is built from the sentences of the best `answer_chunks` chunks, at most `max_sentences`
+    sentences and (if set) `max_tokens` model tokens, selected by MMR with `mmr_lambda`.
+    With a SemanticAnswerCache, exact and paraphrased repeats are answered from earlier results.
+    `question_embed` may be passed in when the question was already encoded (e.g. in a batch).
+    With a `first_stage` retriever (e.g. static_encoder.StaticFirstStage), its candidate chunks are
+    re-scored with the full embeddings instead of searching kb.index.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    if cache is not None:
+        cached = cache.lookup_exact(question)
+        if cached is not None:
+            cached.update({'cache': 'exact', 'timings': {'total': time.perf_counter() - start}})
+            return cached
+
+    if question_embed is None:   # otherwise encoded by the caller, in a batch of its own
+        question_embed = encode_question(question, model)
+        timings["encode"] = time.perf_counter() - start
+
+    if cache is not None:
+        cached = cache.lookup_similar(question_embed)
+        if cached is not None:
+            timings["total"] = time.perf_counter() - start
+            cached.update({'cache': 'semantic', 'timings': timings})
+            return cached
+
+    # Classify question to section
+    t = time.perf_counter()
+    pred_section, section_conf = classify_question(question_embed, kb)
+    timings["classify"] = time.perf_counter() - t
+
+    # Retrieve top chunks (a wider candidate set when a reranker will re-order them)
+    t = time.perf_counter()
+    candidate_k = max(top_k, reranker.candidate_k) if reranker else top_k
+    if first_stage is not None:
+        first_ids = first_stage.candidates(question, candidate_k)
+        scores = kb.embeddings[first_ids] @ question_embed[0]
+        order = np.argsort(-scores, kind="stable")[:candidate_k]
+        top_chunk_ids, similarities = [first_ids[i] for i in order], scores[order]
+    else:
+        top_chunk_ids, similarities = retrieve_chunks(question_embed, kb, top_k=candidate_k)
+    timings["retrieve"] = time.perf_counter() - t
+
+    rerank_info = None
+    if reranker:
+        t = time.perf_counter()
+        top_chunk_ids, rerank_info = reranker.rerank(question, kb, top_chunk_ids, similarities)
+        similarities = kb.embeddings[top_chunk_ids] @ question_embed[0]
+        timings["rerank"] = time.perf_counter() - t
+    top_chunk_ids, similarities = top_chunk_ids[:top_k], similarities[:top_k]
+
+    # Generate answer from the best chunks
+    t = time.perf_counter()
+    if top_chunk_ids:
+        answer, confidence, answer_spans = generate_answer(
+            question_embed, kb, top_chunk_ids[:answer_chunks], similarities[:answer_chunks],
+            max_sentences=max_sentences, max_tokens=max_tokens, mmr_lambda=mmr_lambda)
+    else:
+        answer, confidence, answer_spans = NO_ANSWER, 0.0, []
+    timings["generate"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - start
+
+    result = {
+        'answer': answer,
+        'section': pred_section,
+        'section_confidence': section_conf,
+        'confidence': confidence,
+        'top_chunk_ids': top_chunk_ids,
+        'similarities': [float(x) for x in similarities],
+        'answer_spans': answer_spans,
+        'rerank': rerank_info,
+        'cache': 'miss' if cache is not None else None,
+        'timings': timings,
+    }
+    if cache is not None:
+        cache.store(question, question_embed, result)
+    return result
+
+
+def lexical_answer(question, kb, lexical, top_k=3, answer_chunks=1, max_sentences=3):
+    """Keyword-only answer from a LexicalIndex, for when the encoder cannot take the question in time.
+
+    Same result shape as answer_question; `similarities` and `confidence` are the share of the question's
+    keywords (idf-weighted) found in each chunk and in the answer, not cosines.
+    """
+    start = time.perf_counter()
+    top_chunk_ids, coverage = lexical.search(question, top_k)
+    answer, confidence, answer_spans = NO_ANSWER, 0.0, []
+    sentence_ids = candidate_sentences(kb, top_chunk_ids[:answer_chunks])
+    if len(sentence_ids):
+        sentence_coverage = lexical.sentence_coverage(question, sentence_ids)
+        picks = [i for i in np.argsort(-sentence_coverage, kind="stable")[:max_sentences] if sentence_coverage[i] > 0]
+        if picks:
+            store = kb.store
+            answer_spans = [(int(store.sentence_start[sentence_ids[i]]), int(store.sentence_end[sentence_ids[i]]))
+                            for i in sorted(picks)]
+            answer = ' '.join(store.slice(s, e) for s, e in answer_spans)
+            confidence = float(sentence_coverage[picks[0]])
+    section = kb.store[top_chunk_ids[0]].section if top_chunk_ids else None
+    return {
+        'answer': answer,
+        'section': section,
+        'section_confidence': float(coverage[0]) if top_chunk_ids else 0.0,
+        'confidence': confidence,
+        'top_chunk_ids': top_chunk_ids,
+        'similarities': [float(x) for x in coverage],
+        'answer_spans': answer_spans,
+        'rerank': None,
+        'cache': None,
+        'timings': {'lexical': time.perf_counter() - start, 'total': time.perf_counter() - start},
+    }
@@ -0,0 +1,145 @@
+# ============================================================================
+# REQUEST LOG - T.I.P. Student Manual
+# One JSON line per answered question: question hash, predicted section, top
+# chunk ids and scores, confidence, cache status and stage timings, for
+# offline analysis. Callers only enqueue (never block on disk); a background
+# thread writes, rotates the file by size or age, gzips old segments and
+# keeps the newest `backups` of them. `sample_rate` < 1 logs a random subset.
+#
+#   logs/requests.jsonl                                  current segment
+#   logs/requests.jsonl.20251118-093000-123456-0001.gz   rotated segments
+# ============================================================================
+
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+from datetime import datetime
+
+MAX_BYTES = 50 * 2**20
+ROTATE_SECONDS = 24 * 3600
+BACKUPS = 30
+QUEUE_SIZE = 10_000
+
+
+def question_hash(question):
+    """Stable id of a question (case and whitespace insensitive) without logging its text."""
+    normalized = " ".join(question.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def request_record(question, result, tenant_id):
+    """The log line for one answer_question result."""
+    return {
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "tenant": tenant_id,
+        "question_hash": question_hash(question),
+        "section": result.get("section"),
+        "section_confidence": round(float(result.get("section_confidence") or 0.0), 4),
+        "top_chunk_ids": [int(i) for i in result.get("top_chunk_ids", [])],
+        "scores": [round(float(s), 4) for s in result.get("similarities", [])],
+        "confidence": round(float(result.get("confidence") or 0.0), 4),
+        "cache": result.get("cache"),
+        "degraded": bool(result.get("degraded")),
+        "shed": result.get("shed"),
+        "timings_ms": {stage: round(seconds * 1000, 3) for stage, seconds in (result.get("timings") or {}).items()},
+    }
+
+
+class RequestLogger:
+    """Non-blocking JSONL writer with size/time rotation, gzip of old segments and sampling."""
+
+    def __init__(self, path, sample_rate=1.0, max_bytes=MAX_BYTES, rotate_seconds=ROTATE_SECONDS,
+                 backups=BACKUPS, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.dropped = 0                # records lost because the queue was full
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._opened_at = None
+        self._rotations = 0
+        self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record):
+        """Enqueue one record (subject to sampling); returns False if it was sampled out or dropped."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self):
+        """Write everything queued so far and close the file."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    # ------------------------------------------------------------------
+    # writer thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            lines = []
+            while record is not None:
+                lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+                try:
+                    record = self._queue.get_nowait()   # drain whatever else is waiting in one write
+                except queue.Empty:
+                    break
+            if lines:
+                self._write("".join(lines))
+            if record is None:
+                if self._file:
+                    self._file.close()
+                return
+
+    def _write(self, text):
+        try:
+            if self._file is None:
+                self._open()
+            elif self._file.tell() >= self.max_bytes or time.time() - self._opened_at >= self.rotate_seconds:
+                self._rotate()
+                self._open()
+            self._file.write(text)
+            self._file.flush()
+        except Exception as e:   # never let the writer thread die; the next write reopens the file
+            print(f"❌ Request log write failed: {e}")
+            if self._file is not None and self._file.closed:
+                self._file = None
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # An existing segment keeps its age across restarts
+        self._opened_at = os.path.getmtime(self.path) if os.path.exists(self.path) else time.time()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _rotate(self):
+        file, self._file = self._file, None
+        file.close()
+        # Microseconds plus a counter keep names unique (and in order) however fast segments fill up
+        self._rotations += 1
+        rotated = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{self._rotations:04d}"
+        os.replace(self.path, rotated)
+        with open(rotated, 'rb') as src, gzip.open(rotated + ".gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+        segments = sorted(glob.glob(glob.escape(self.path) + ".*.gz"))
+        for old in segments[:max(0, len(segments) - self.backups)]:
+            os.remove(old)
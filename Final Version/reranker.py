@@ -0,0 +1,93 @@
+# ============================================================================
+# CROSS-ENCODER RERANKER - T.I.P. Student Manual
+# Re-orders a wide dense candidate set with a small local cross-encoder, within
+# a per-query time budget, and only when the dense ranking looks uncertain
+# ============================================================================
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ChunkReranker:
+    """Cross-encoder reranking stage with a latency budget and an LRU score cache."""
+
+    def __init__(self, model_name, candidate_k=20, budget_ms=150, skip_margin=0.10,
+                 batch_size=8, cache_size=4096, max_length=256):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.candidate_k = candidate_k
+        self.budget = budget_ms / 1000.0
+        self.skip_margin = skip_margin
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # (question, chunk_text) -> cross-encoder score
+        self._lock = threading.Lock()
+        self.stats = {"queries": 0, "skipped": 0, "budget_exhausted": 0, "cache_hits": 0, "pairs_scored": 0}
+
+    def _cached(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+            return score
+
+    def _remember(self, keys, scores):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._cache[key] = float(score)
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self.stats["pairs_scored"] += len(keys)
+
+    def rerank(self, question, kb, candidate_ids, dense_scores):
+        """Return (chunk_ids, info) with the candidates re-ordered by cross-encoder score.
+
+        Candidates are scored in dense order, batch by batch, until the time budget runs out;
+        any left unscored keep their dense order after the scored ones.
+        """
+        with self._lock:
+            self.stats["queries"] += 1
+        info = {"reranked": False, "scored": 0, "skipped": False, "budget_exhausted": False}
+
+        if len(candidate_ids) < 2:
+            return list(candidate_ids), info
+        if dense_scores[0] - dense_scores[1] >= self.skip_margin:
+            # Dense retrieval is already confident about rank 1, the cross-encoder won't change it
+            with self._lock:
+                self.stats["skipped"] += 1
+            info["skipped"] = True
+            return list(candidate_ids), info
+
+        question_key = ' '.join(question.lower().split())
+        deadline = time.perf_counter() + self.budget
+        scores = {}
+        pending = []
+        for chunk_id in candidate_ids:
+            key = (question_key, kb.store[chunk_id].chunk_text)
+            score = self._cached(key)
+            if score is None:
+                pending.append((chunk_id, key))
+            else:
+                scores[chunk_id] = score
+
+        for i in range(0, len(pending), self.batch_size):
+            if time.perf_counter() >= deadline:
+                info["budget_exhausted"] = True
+                with self._lock:
+                    self.stats["budget_exhausted"] += 1
+                break
+            batch = pending[i:i + self.batch_size]
+            keys = [key for _, key in batch]
+            batch_scores = self.model.predict([(question, text) for _, text in keys], show_progress_bar=False)
+            self._remember(keys, batch_scores)
+            for (chunk_id, _), score in zip(batch, batch_scores):
+                scores[chunk_id] = float(score)
+
+        scored = sorted((c for c in candidate_ids if c in scores), key=lambda c: -scores[c])
+        unscored = [c for c in candidate_ids if c not in scores]
+        info.update({"reranked": True, "scored": len(scores)})
+        return scored + unscored, info
@@ -0,0 +1,124 @@
+# ============================================================================
+# RETRIEVAL EVALUATION - T.I.P. Student Manual
+# recall@k / MRR of an embedding model on two query sets:
+#   manual:  section example questions -> chunks of that section (as served by app.py)
+#   holdout: held-out QA questions     -> their gold answers, with manual chunks as distractors
+# Used by Training Model.py for periodic evaluation and best-checkpoint selection.
+# ============================================================================
+
+import json
+
+import numpy as np
+import torch
+
+from chunk_store import ChunkStore
+from chunker import ManualChunker
+from knowledge_bundle import normalize_rows
+from training_data import load_holdout
+
+MRR_AT = 10
+
+
+class RetrievalEvaluator:
+    """Scores a model on fixed queries against a fixed corpus; `relevant[i]` is the set of correct corpus ids."""
+
+    def __init__(self, name, queries, corpus, relevant, ks=(1, 3, 10), batch_size=64):
+        self.name = name
+        self.queries = queries
+        self.corpus = corpus
+        self.relevant = relevant
+        self.ks = ks
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __call__(self, model, dim=None, query_model=None):
+        """Metrics for the model; with `dim`, embeddings are truncated to their first `dim` values first.
+        With `query_model`, queries are encoded by it instead (e.g. a fallback encoder against the model's index)."""
+        query_model = query_model or model
+        was_training = getattr(model, "training", False)
+        with torch.no_grad():
+            corpus_embeds = model.encode(self.corpus, batch_size=self.batch_size, normalize_embeddings=True,
+                                         convert_to_numpy=True, show_progress_bar=False)
+            query_embeds = query_model.encode(self.queries, batch_size=self.batch_size, normalize_embeddings=True,
+                                              convert_to_numpy=True, show_progress_bar=False)
+        if hasattr(model, "train"):
+            model.train(was_training)
+        if dim:
+            corpus_embeds = normalize_rows(corpus_embeds[:, :dim])
+            query_embeds = normalize_rows(query_embeds[:, :dim])
+
+        depth = self.depth
+        ranked = []
+        for start in range(0, len(self.queries), 1024):
+            scores = query_embeds[start:start + 1024] @ corpus_embeds.T
+            top = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+            ranked.append(np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, 1), axis=1), 1))
+        return self.ranking_metrics(np.concatenate(ranked) if ranked else np.zeros((0, depth), np.int64))
+
+    @property
+    def depth(self):
+        """Results per query needed for every metric."""
+        return min(max(max(self.ks), MRR_AT), len(self.corpus))
+
+    def ranking_metrics(self, ranked):
+        """Metrics for precomputed rankings, e.g. from a FAISS index: (n_queries, depth) corpus ids, -1 = none."""
+        first_hit = np.full(len(self.queries), np.inf)   # 1-based rank of the first relevant result
+        for row, ids in enumerate(ranked):
+            relevant = self.relevant[row]
+            for rank, corpus_id in enumerate(ids, 1):
+                if corpus_id in relevant:
+                    first_hit[row] = rank
+                    break
+
+        metrics = {f"{self.name}_recall@{k}": float(np.mean(first_hit <= k)) for k in self.ks}
+        metrics[f"{self.name}_mrr@{MRR_AT}"] = float(np.mean(np.where(first_hit <= MRR_AT, 1.0 / first_hit, 0.0)))
+        return metrics
+
+
+def manual_evaluator(manual_file, examples_file, chunker_model_path, max_tokens, overlap_tokens):
+    """Section example questions against the manual's chunks; any chunk of the right section counts."""
+    with open(manual_file, 'r', encoding='utf-8') as f:
+        manual_sections = json.load(f)
+    with open(examples_file, 'r', encoding='utf-8') as f:
+        section_examples = json.load(f)
+
+    store = ChunkStore.from_manual(manual_sections, ManualChunker(chunker_model_path, max_tokens, overlap_tokens))
+    queries, relevant = [], []
+    for section_id, section_name in enumerate(store.section_names):
+        chunk_ids = set(np.flatnonzero(store.chunk_section == section_id).tolist())
+        for question in section_examples.get(section_name, []):
+            queries.append(question)
+            relevant.append(chunk_ids)
+    return RetrievalEvaluator("manual", queries, store.texts(), relevant), store.texts()
+
+
+def holdout_evaluator(data_file, holdout, max_queries=2000, distractors=()):
+    """Held-out questions against their distinct gold answers plus `distractors` (e.g. manual chunks)."""
+    questions, answers = load_holdout(data_file, holdout, max_queries)
+    corpus, answer_ids = [], {}
+    for answer in answers:
+        answer_ids.setdefault(answer, len(corpus))
+        if answer_ids[answer] == len(corpus):
+            corpus.append(answer)
+    relevant = [{answer_ids[a]} for a in answers]
+    return RetrievalEvaluator("holdout", questions, corpus + list(distractors), relevant)
+
+
+def run_evaluators(evaluators, model):
+    """All metrics plus 'score', the mean MRR over the evaluators, used for model selection."""
+    metrics = {}
+    for evaluator in evaluators:
+        metrics.update(evaluator(model))
+    metrics["score"] = float(np.mean([metrics[f"{e.name}_mrr@{MRR_AT}"] for e in evaluators]))
+    return metrics
+
+
+def dimension_report(evaluators, model, dims):
+    """Mean MRR when embeddings are truncated to each of `dims` (for Matryoshka-trained models)."""
+    report = {}
+    for dim in dims:
+        scores = [evaluator(model, dim)[f"{evaluator.name}_mrr@{MRR_AT}"] for evaluator in evaluators]
+        report[dim] = float(np.mean(scores))
+    return report
@@ -0,0 +1,110 @@
+# ============================================================================
+# SEMANTIC ANSWER CACHE - T.I.P. Student Manual
+# Level 1: exact (normalized) question text -> answer, no encoding needed
+# Level 2: FAISS index over embeddings of recently answered questions, so
+#          paraphrases ("How do I enroll?" / "enrollment steps?") reuse answers
+# ============================================================================
+
+import copy
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+def normalize_question(question):
+    return ' '.join(question.lower().split()).rstrip('?!. ')
+
+
+class SemanticAnswerCache:
+    """Bounded LRU answer cache keyed by question text and question embedding."""
+
+    def __init__(self, dim, capacity=2048, threshold=0.92):
+        self.dim = dim
+        self.capacity = capacity
+        self.threshold = threshold
+        self.version = None
+        self._lock = threading.Lock()
+        self._reset()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _reset(self):
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self._entries = OrderedDict()   # entry id -> (normalized question, result), oldest first
+        self._by_text = {}              # normalized question -> entry id
+        self._next_id = 0
+
+    def ensure_version(self, version):
+        """Drop everything if the model, manual data or answer settings changed."""
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                    print(f"♻️ Answer cache invalidated ({self.version} -> {version})")
+                self._reset()
+                self.version = version
+
+    def contains(self, question):
+        """Whether an exact repeat would hit, without counting a lookup or refreshing its LRU position."""
+        with self._lock:
+            return normalize_question(question) in self._by_text
+
+    def lookup_exact(self, question):
+        with self._lock:
+            entry_id = self._by_text.get(normalize_question(question))
+            if entry_id is None:
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits_exact += 1
+            return copy.deepcopy(self._entries[entry_id][1])
+
+    def lookup_similar(self, question_embed):
+        """Answer of the most similar cached question, if it passes the threshold; counts a miss otherwise."""
+        with self._lock:
+            if self._index.ntotal:
+                scores, ids = self._index.search(np.asarray(question_embed, dtype=np.float32), 1)
+                if ids[0][0] >= 0 and scores[0][0] >= self.threshold:
+                    entry_id = int(ids[0][0])
+                    self._entries.move_to_end(entry_id)
+                    self.hits_semantic += 1
+                    result = copy.deepcopy(self._entries[entry_id][1])
+                    result['cache_similarity'] = float(scores[0][0])
+                    return result
+            self.misses += 1
+            return None
+
+    def store(self, question, question_embed, result):
+        key = normalize_question(question)
+        result = {k: v for k, v in result.items() if k not in ("timings", "cache", "cache_similarity")}
+        with self._lock:
+            if key in self._by_text:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(np.asarray(question_embed, dtype=np.float32), np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (key, copy.deepcopy(result))
+            self._by_text[key] = entry_id
+
+            while len(self._entries) > self.capacity:
+                old_id, (old_key, _) = self._entries.popitem(last=False)
+                del self._by_text[old_key]
+                self._index.remove_ids(np.array([old_id], dtype=np.int64))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": (self.hits_exact + self.hits_semantic) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,72 @@
+# ============================================================================
+# SERVING CONFIGURATION - T.I.P. Student Manual
+# Settings shared by everything that answers questions - app.py (Streamlit),
+# api_server.py (HTTP) and load_test.py - so all of them serve the same model,
+# knowledge bundles, answers and answer cache. Change them here.
+# ============================================================================
+
+MODEL_PATH = "smartual_model"
+MANUAL_DATA_FILE = "manual_data.json"
+SECTION_EXAMPLES_FILE = "section_examples.json"
+EMBEDDING_DIM = None             # Serving dimension (e.g. 256/128/64 for a Matryoshka-trained model); None = full
+BUNDLE_FILE = "knowledge.smkb"   # Built with: python knowledge_bundle.py build
+INDEX_PROJECTION = None          # "pca" or "opq": shrink the chunk index (see projection_report.py)
+INDEX_PROJECTION_DIM = 128       # Dimension of the projected index vectors
+STATIC_ENCODER_FILE = "smartual_static.npz"  # Fallback while the model loads: python static_encoder.py build
+STATIC_FIRST_STAGE_CANDIDATES = None  # e.g. 50: chunks picked by the static encoder, re-scored by the model
+TENANTS_FILE = "tenants.json"    # Manuals served by this deployment, selected with ?tenant=<id>
+DEFAULT_TENANT = "tip-2025"
+INDEX_MEMORY_BUDGET_MB = 512     # Least recently used tenant indexes are evicted above this
+FEEDBACK_PATH = "feedback_log.csv"
+CHUNK_MAX_TOKENS = 128           # Encoder max_seq_length (see sentence_bert_config.json)
+CHUNK_OVERLAP_TOKENS = 32        # Tokens shared between consecutive chunks of a section
+
+# Optional cross-encoder reranking of a wider candidate set (None disables it)
+RERANKER_MODEL = None            # e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 20           # Dense candidates handed to the cross-encoder
+RERANK_BUDGET_MS = 150           # Per-query time budget for cross-encoder scoring
+RERANK_SKIP_MARGIN = 0.10        # Skip reranking when dense rank 1 beats rank 2 by this much
+
+# Answer extraction (maximal marginal relevance over sentences of the best chunks)
+TOP_K = 3                        # Chunks retrieved per question
+ANSWER_SOURCE_CHUNKS = 2         # Sentences may come from this many top chunks
+ANSWER_MAX_SENTENCES = 3
+ANSWER_MAX_TOKENS = None         # Optional cap on answer length in model tokens
+ANSWER_MMR_LAMBDA = 0.7          # 1.0 = pure relevance, lower = penalize near-duplicate sentences
+
+# Answer cache: exact repeats, then paraphrases of recently answered questions
+ANSWER_CACHE_SIZE = 2048         # Cached questions per tenant (LRU)
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Cosine similarity at which a past question counts as the same question
+
+
+def default_tenants(manual=MANUAL_DATA_FILE, examples=SECTION_EXAMPLES_FILE, bundle=BUNDLE_FILE):
+    """The tenant served when TENANTS_FILE does not exist."""
+    return {DEFAULT_TENANT: {
+        "name": "T.I.P. Student Manual",
+        "manual": manual,
+        "examples": examples,
+        "bundle": bundle,
+    }}
+
+
+def create_reranker(model_name=RERANKER_MODEL):
+    """The cross-encoder reranker with the settings above; None when disabled."""
+    if not model_name:
+        return None
+    from reranker import ChunkReranker
+    return ChunkReranker(model_name, candidate_k=RERANK_CANDIDATES, budget_ms=RERANK_BUDGET_MS,
+                         skip_margin=RERANK_SKIP_MARGIN)
+
+
+def answer_settings(reranker=None, first_stage=None):
+    """Keyword arguments for qa_pipeline.answer_question (and warm_cache)."""
+    return dict(top_k=TOP_K, reranker=reranker, answer_chunks=ANSWER_SOURCE_CHUNKS,
+                max_sentences=ANSWER_MAX_SENTENCES, max_tokens=ANSWER_MAX_TOKENS, mmr_lambda=ANSWER_MMR_LAMBDA,
+                first_stage=first_stage)
+
+
+def answer_cache_version(kb, reranker_model=RERANKER_MODEL):
+    """Cached answers are only valid for the same model, manual data and answer settings."""
+    settings = (reranker_model, ANSWER_SOURCE_CHUNKS, ANSWER_MAX_SENTENCES, ANSWER_MAX_TOKENS, ANSWER_MMR_LAMBDA,
+                STATIC_FIRST_STAGE_CANDIDATES)
+    return f"{kb.version}:{settings}"
@@ -0,0 +1,306 @@
+# ============================================================================
+# STATIC FALLBACK ENCODER - T.I.P. Student Manual
+# A vocab-sized lookup table (one vector per vocab.txt token) plus weighted mean
+# pooling, with no attention: encoding a question costs one tokenizer call and
+# a few table lookups (tens of microseconds instead of milliseconds).
+#
+#   python static_encoder.py build --data TIP_QA_dataset_20000.csv   # writes smartual_static.npz
+#   python static_encoder.py report --data TIP_QA_dataset_20000.csv
+#
+# The table is distilled from smartual_model: every token starts as the model's
+# embedding of "[CLS] token [SEP]", then the table is trained so that pooled
+# vectors match the model's sentence embeddings (cosine) on the manual and QA
+# texts. app.py answers with it over a copy of the knowledge base re-encoded
+# by the static encoder (a few ms for the whole manual) while the transformer
+# is still loading, and for questions shed under overload. With
+# STATIC_FIRST_STAGE_CANDIDATES set (serving_config.py) it also picks the
+# candidate chunks the transformer re-scores (StaticFirstStage). The report
+# also scores static queries against the full model's index.
+# ============================================================================
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+import torch
+from tokenizers import Tokenizer
+
+from distill_model import iter_texts, manual_sentences, shuffled_batches
+from knowledge_bundle import model_fingerprint, normalize_rows
+from retrieval_eval import holdout_evaluator, manual_evaluator
+from serving_config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, MANUAL_DATA_FILE, MODEL_PATH, \
+    SECTION_EXAMPLES_FILE, STATIC_ENCODER_FILE
+from training_data import CHUNK_ROWS
+
+TEACHER_PATH = MODEL_PATH
+SIF_A = 1e-3                # smooth inverse frequency: weight = a / (a + p(token))
+EPOCHS = 1
+BATCH_SIZE = 128
+LEARNING_RATE = 5e-3
+MAX_TEXTS = 200_000         # distinct texts used to fit the table (teacher encodes dominate build time)
+SHUFFLE_BUFFER = 50_000
+EVAL_HOLDOUT = 0.02         # same split as Training Model.py
+EVAL_MAX_QUERIES = 2000
+
+
+# ============================================================================
+# ENCODER
+# ============================================================================
+
+class StaticEncoder:
+    """Drop-in for SentenceTransformer.encode(): weighted mean of per-token vectors."""
+
+    def __init__(self, embeddings, token_weights, tokenizer, truncate_dim=None, meta=None):
+        self.embeddings = embeddings            # (vocab_size, d) float32
+        self.token_weights = token_weights      # (vocab_size,) float32
+        self.tokenizer = tokenizer
+        self.tokenizer.no_padding()
+        self.truncate_dim = truncate_dim
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path, truncate_dim=None):
+        with np.load(path) as data:
+            tokenizer = Tokenizer.from_str(bytes(data["tokenizer_json"]).decode("utf-8"))
+            meta = json.loads(bytes(data["meta_json"]).decode("utf-8"))
+            return cls(data["embeddings"].astype(np.float32), data["token_weights"].astype(np.float32), tokenizer,
+                       truncate_dim, meta)
+
+    def save(self, path):
+        np.savez(path, embeddings=self.embeddings.astype(np.float16), token_weights=self.token_weights,
+                 tokenizer_json=np.frombuffer(self.tokenizer.to_str().encode("utf-8"), dtype=np.uint8),
+                 meta_json=np.frombuffer(json.dumps(self.meta).encode("utf-8"), dtype=np.uint8))
+
+    def get_sentence_embedding_dimension(self):
+        return self.truncate_dim or self.embeddings.shape[1]
+
+    def token_ids(self, sentences):
+        return [np.asarray(e.ids, dtype=np.int64) for e in
+                self.tokenizer.encode_batch(list(sentences), add_special_tokens=False)]
+
+    def encode(self, sentences, batch_size=None, show_progress_bar=None, normalize_embeddings=False,
+               convert_to_numpy=True, **kwargs):
+        """(n, d) float32 embeddings; texts without known tokens get a zero vector."""
+        single = isinstance(sentences, str)
+        ids = self.token_ids([sentences] if single else sentences)
+        dim = self.get_sentence_embedding_dimension()
+        out = np.zeros((len(ids), dim), dtype=np.float32)
+        lengths = np.array([len(i) for i in ids])
+        if lengths.sum():
+            flat = np.concatenate(ids)
+            weights = self.token_weights[flat]
+            rows = np.repeat(np.arange(len(ids)), lengths)
+            np.add.at(out, rows, self.embeddings[flat, :dim] * weights[:, None])
+            out /= np.maximum(np.bincount(rows, weights, minlength=len(ids)), 1e-12)[:, None]
+        if normalize_embeddings:
+            out = normalize_rows(out)
+        return out[0] if single else out
+
+
+def open_static_encoder(path, teacher_path=None, truncate_dim=None):
+    """The static encoder at `path`, or None if it is missing or was distilled from a different model."""
+    if not path or not os.path.exists(path):
+        return None
+    encoder = StaticEncoder.load(path, truncate_dim)
+    if teacher_path and encoder.meta.get("teacher_fingerprint") != model_fingerprint(teacher_path):
+        print(f"⚠️ {path} was distilled from another model, not using it (rerun: python static_encoder.py build)")
+        return None
+    return encoder
+
+
+class StaticFirstStage:
+    """First-stage retriever for qa_pipeline.answer_question: candidate chunks from the static index.
+
+    `static_kb` is a knowledge base built from the same chunk store with `encoder`, so chunk ids match;
+    answer_question re-scores the candidates with the transformer's chunk embeddings.
+    """
+
+    def __init__(self, encoder, static_kb, candidate_k=50):
+        self.encoder = encoder
+        self.static_kb = static_kb
+        self.candidate_k = candidate_k
+
+    def candidates(self, question, top_k):
+        _, ids = self.static_kb.index.search(normalize_rows(self.encoder.encode([question])),
+                                             max(top_k, self.candidate_k))
+        return [int(i) for i in ids[0] if i >= 0]
+
+
+# ============================================================================
+# DISTILLATION
+# ============================================================================
+
+def token_frequencies(tokenizer, texts, vocab_size):
+    counts = np.zeros(vocab_size, dtype=np.float64)
+    for encoding in tokenizer.encode_batch(list(texts), add_special_tokens=False):
+        np.add.at(counts, encoding.ids, 1)
+    return counts
+
+
+def sif_weights(counts, a=SIF_A):
+    """Frequent tokens ("the", "?") count less; tokens never seen in the corpus get full weight."""
+    total = counts.sum()
+    return (a / (a + counts / total)).astype(np.float32) if total else np.ones(len(counts), np.float32)
+
+
+def token_embeddings(teacher, batch_size=1024):
+    """The teacher's sentence embedding of "[CLS] token [SEP]" for every vocab token."""
+    tokenizer = teacher.tokenizer
+    vocab_size = len(tokenizer)
+    out = np.zeros((vocab_size, teacher.get_sentence_embedding_dimension()), dtype=np.float32)
+    teacher.eval()
+    with torch.no_grad():
+        for start in range(0, vocab_size, batch_size):
+            ids = torch.arange(start, min(start + batch_size, vocab_size))
+            input_ids = torch.stack([torch.full_like(ids, tokenizer.cls_token_id), ids,
+                                     torch.full_like(ids, tokenizer.sep_token_id)], dim=1)
+            features = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+            if "token_type_ids" in tokenizer.model_input_names:
+                features["token_type_ids"] = torch.zeros_like(input_ids)
+            features = {key: value.to(teacher.device) for key, value in features.items()}
+            out[start:start + len(ids)] = teacher(features)["sentence_embedding"].float().cpu().numpy()
+    return out
+
+
+def fit_table(encoder, teacher, text_source, epochs=EPOCHS, batch_size=BATCH_SIZE, lr=LEARNING_RATE,
+              shuffle_buffer=SHUFFLE_BUFFER, log_every=100):
+    """Train the lookup table so pooled vectors point where the teacher's sentence embeddings do."""
+    table = torch.nn.EmbeddingBag.from_pretrained(torch.from_numpy(encoder.embeddings), freeze=False, mode="sum")
+    weights = torch.from_numpy(encoder.token_weights)
+    optimizer = torch.optim.Adam(table.parameters(), lr=lr)
+    teacher.eval()
+    for epoch in range(epochs):
+        start, running = time.perf_counter(), 0.0
+        for step, batch in enumerate(shuffled_batches(text_source(), batch_size, shuffle_buffer, epoch), 1):
+            ids = encoder.token_ids(batch)
+            keep = [i for i, row in enumerate(ids) if len(row)]
+            if not keep:
+                continue
+            flat = torch.from_numpy(np.concatenate([ids[i] for i in keep]))
+            offsets = torch.from_numpy(np.cumsum([0] + [len(ids[i]) for i in keep[:-1]]))
+            with torch.no_grad():
+                target = torch.from_numpy(teacher.encode([batch[i] for i in keep], batch_size=len(keep),
+                                                         convert_to_numpy=True, show_progress_bar=False))
+            pooled = table(flat, offsets, per_sample_weights=weights[flat])
+            loss = (1 - torch.nn.functional.cosine_similarity(pooled, target)).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            running += loss.item()
+            if step % log_every == 0:
+                print(f"   epoch {epoch + 1} step {step}: cosine loss {running / log_every:.4f}")
+                running = 0.0
+        print(f"✅ Epoch {epoch + 1}/{epochs} in {time.perf_counter() - start:.0f}s")
+    encoder.embeddings = table.weight.detach().numpy().copy()
+    return encoder
+
+
+def build_static_encoder(teacher, teacher_path, text_source, epochs=EPOCHS, **fit_kwargs):
+    start = time.perf_counter()
+    tokenizer = Tokenizer.from_file(os.path.join(teacher_path, "tokenizer.json"))
+    counts = token_frequencies(tokenizer, text_source(), tokenizer.get_vocab_size())
+    print(f"🔤 Encoding {tokenizer.get_vocab_size()} vocab tokens with the teacher...")
+    encoder = StaticEncoder(token_embeddings(teacher), sif_weights(counts), tokenizer, meta={
+        "teacher": teacher_path,
+        "teacher_fingerprint": model_fingerprint(teacher_path),
+        "dim": teacher.get_sentence_embedding_dimension(),
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    })
+    if epochs:
+        fit_table(encoder, teacher, text_source, epochs, **fit_kwargs)
+    print(f"🧱 Static encoder built in {time.perf_counter() - start:.0f}s")
+    return encoder
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def latency_us(model, queries):
+    model.encode(queries[:8], show_progress_bar=False)   # warm-up
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode([query], show_progress_bar=False)
+        times.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(times)
+
+
+def accuracy_report(teacher, encoder, evaluators):
+    """MRR/recall of the teacher, of the static encoder over its own index (degraded mode in app.py, or a
+    first-stage retriever), and of static queries against the teacher's index, plus query latency."""
+    queries = [q for e in evaluators for q in e.queries][:EVAL_MAX_QUERIES]
+    rows = {
+        "teacher": {"latency_us": latency_us(teacher, queries[:200])},
+        "static, own index": {"latency_us": latency_us(encoder, queries)},
+        "static queries, teacher index": {},
+    }
+    for evaluator in evaluators:
+        rows["teacher"].update(evaluator(teacher))
+        rows["static, own index"].update(evaluator(encoder))
+        rows["static queries, teacher index"].update(evaluator(teacher, query_model=encoder))
+
+    print("\n📊 Static encoder report")
+    for name, row in rows.items():
+        latency = f" - {row['latency_us']:.0f} µs/question" if "latency_us" in row else ""
+        print(f"   {name}{latency}")
+        for key, value in row.items():
+            if key != "latency_us":
+                print(f"      {key} {value:.3f}")
+    return rows
+
+
+def make_evaluators(args):
+    evaluators, distractors = [], []
+    if os.path.exists(args.manual) and os.path.exists(args.examples):
+        manual, distractors = manual_evaluator(args.manual, args.examples, args.teacher,
+                                               CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+        evaluators.append(manual)
+    if args.data and args.holdout:
+        evaluators.append(holdout_evaluator(args.data, args.holdout, EVAL_MAX_QUERIES, distractors))
+    return [e for e in evaluators if len(e)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the static fallback encoder")
+    parser.add_argument("command", choices=("build", "report"))
+    parser.add_argument("--data", help="QA CSV or Parquet used to fit the table (and for held-out questions)")
+    parser.add_argument("--teacher", default=TEACHER_PATH)
+    parser.add_argument("--out", default=STATIC_ENCODER_FILE)
+    parser.add_argument("--epochs", type=int, default=EPOCHS, help="0 = token embeddings + SIF weights only")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE)
+    parser.add_argument("--max-texts", type=int, default=MAX_TEXTS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--manual", default=MANUAL_DATA_FILE)
+    parser.add_argument("--examples", default=SECTION_EXAMPLES_FILE)
+    parser.add_argument("--holdout", type=float, default=EVAL_HOLDOUT)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    teacher = SentenceTransformer(args.teacher)
+    if args.command == "build":
+        extra = manual_sentences(args.manual, args.teacher)
+        text_source = lambda: islice(iter_texts(args.data, extra, args.holdout, args.chunk_rows), args.max_texts)
+        encoder = build_static_encoder(teacher, args.teacher, text_source, args.epochs,
+                                       batch_size=args.batch_size, lr=args.lr)
+        encoder.save(args.out)
+        print(f"💾 Saved '{args.out}' ({os.path.getsize(args.out) / 2**20:.1f} MB)")
+    else:
+        encoder = open_static_encoder(args.out, args.teacher)
+        if encoder is None:
+            raise SystemExit(f"❌ No static encoder for '{args.teacher}' at '{args.out}'")
+
+    evaluators = make_evaluators(args)
+    if evaluators:
+        accuracy_report(teacher, encoder, evaluators)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from admission import ConcurrencyGate
+
+
+def hold_slot(gate, release):
+    """Occupy one slot from another thread until `release` is set; returns once the slot is held."""
+    held = threading.Event()
+
+    def run():
+        with gate.admit(time.monotonic() + 60) as shed:
+            assert shed is None
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    held.wait()
+    return thread
+
+
+def test_free_slot_admits_even_with_a_past_deadline():
+    gate = ConcurrencyGate(max_concurrency=1, max_queue=0)
+    with gate.admit(time.monotonic() - 1) as shed:
+        assert shed is None
+        assert gate.stats()["running"] == 1
+    assert gate.stats()["admitted"] == 1 and gate.stats()["running"] == 0
+
+
+def test_full_queue_sheds_at_once():
+    gate, release = ConcurrencyGate(max_concurrency=1, max_queue=0), threading.Event()
+    thread = hold_slot(gate, release)
+    try:
+        start = time.monotonic()
+        with gate.admit(time.monotonic() + 60) as shed:
+            assert shed == "queue_full"
+        assert time.monotonic() - start < 0.5
+    finally:
+        release.set()
+        thread.join()
+    assert gate.stats()["shed"] == 1
+
+
+def test_deadline_shorter_than_the_expected_wait_sheds():
+    gate, release = ConcurrencyGate(max_concurrency=1, max_queue=4), threading.Event()
+    gate.service_seconds = 5.0
+    thread = hold_slot(gate, release)
+    try:
+        with gate.admit(time.monotonic() + 1) as shed:
+            assert shed == "deadline"
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_queued_question_times_out_when_no_slot_frees_up():
+    gate, release = ConcurrencyGate(max_concurrency=1, max_queue=4), threading.Event()
+    thread = hold_slot(gate, release)
+    try:
+        with gate.admit(time.monotonic() + 0.2) as shed:
+            assert shed == "timeout"
+        assert gate.stats()["waiting"] == 0
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_queued_question_gets_the_slot_once_it_is_released():
+    gate, release = ConcurrencyGate(max_concurrency=1, max_queue=4), threading.Event()
+    thread = hold_slot(gate, release)
+    threading.Timer(0.1, release.set).start()
+    with gate.admit(time.monotonic() + 10) as shed:
+        assert shed is None
+    thread.join()
+    assert gate.stats()["admitted"] == 2
+
+
+def test_service_estimate_is_capped():
+    gate = ConcurrencyGate(max_concurrency=1, max_queue=0, max_estimate_s=0.01)
+    with gate.admit(time.monotonic() + 10):
+        time.sleep(0.05)
+    assert gate.service_seconds == 0.01
@@ -0,0 +1,50 @@
+import pytest
+
+from chunker import ManualChunker, split_sentences
+
+
+def sentences(text):
+    return [text[s:e] for s, e in split_sentences(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("The answer is no. Students must wait.", ["The answer is no.", "Students must wait."]),
+    ("Submit Form No. 5 today. Then wait.", ["Submit Form No. 5 today.", "Then wait."]),
+    ("Bring IDs, forms, etc. The office opens at 8.", ["Bring IDs, forms, etc.", "The office opens at 8."]),
+    ("Bring IDs, forms, etc. and a pen. Done.", ["Bring IDs, forms, etc. and a pen.", "Done."]),
+    ("See Dr. Cruz at T.I.P. Manila. Thanks.", ["See Dr. Cruz at T.I.P. Manila.", "Thanks."]),
+    ("First paragraph\n\nSecond paragraph", ["First paragraph", "Second paragraph"]),
+])
+def test_split_sentences(text, expected):
+    assert sentences(text) == expected
+
+
+@pytest.fixture
+def chunker(tmp_path):
+    # No tokenizer.json in tmp_path: token counts are approximated with words and punctuation
+    return ManualChunker(str(tmp_path), max_tokens=20, overlap_tokens=8)
+
+
+def test_chunks_fit_the_budget_and_overlap(chunker):
+    text = " ".join(f"Sentence number {i} is about rule {i}." for i in range(12))
+    chunks = chunker.chunk_section("Rules", text)
+
+    assert len(chunks) > 1
+    assert all(c["n_tokens"] <= chunker.budget for c in chunks)
+    assert all(c["chunk_text"] == text[c["start"]:c["end"]] for c in chunks)
+    assert chunks[0]["end"] > chunks[1]["start"]      # consecutive chunks share a sentence
+    assert chunks[-1]["end"] == len(text)
+
+
+def test_long_sentence_is_split_into_windows(chunker):
+    text = " ".join(f"word{i}" for i in range(60)) + "."
+    chunks = chunker.chunk_section("Long", text)
+
+    assert len(chunks) > 2
+    assert all(c["n_tokens"] <= chunker.budget for c in chunks)
+    assert chunks[0]["start"] == 0 and chunks[-1]["end"] == len(text)
+
+
+def test_chunk_manual_keeps_section_order(chunker):
+    chunks = chunker.chunk_manual({"B": "Second section.", "A": "First section."})
+    assert [c["section"] for c in chunks] == ["B", "A"]
@@ -0,0 +1,68 @@
+import csv
+
+import numpy as np
+
+from dedup_dataset import MinHasher, cluster_rows, deduplicate, lsh_clusters, text_key
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["questionnaire", "answer"])
+        writer.writerows(rows)
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_identical_rows_after_a_different_first_answer_are_removed(tmp_path):
+    rows = [("What is the passing grade?", "A grade of 3.00 is passing."),
+            ("What is the passing grade?", "The passing grade is 75%, equal to 3.00."),
+            ("What is the passing grade?", "The passing grade is 75%, equal to 3.00.")]
+    write_csv(tmp_path / "qa.csv", rows)
+
+    stats = deduplicate(str(tmp_path / "qa.csv"), str(tmp_path / "out.csv"))
+
+    assert stats["duplicate_rows"] == 1
+    assert [(r["questionnaire"], r["answer"]) for r in read_csv(tmp_path / "out.csv")] == rows[:2]
+
+
+def test_lsh_compares_every_bucket_member_not_only_the_first():
+    hasher = MinHasher()
+    questions = ["What is the passing grade?"] * 3
+    answers = ["A grade of 3.00 is passing.", "The passing grade is 75%, equal to 3.00.",
+               "The passing grade is 75%, equal to 3.00."]
+    clusters = lsh_clusters(hasher.signatures(questions), also=hasher.signatures(answers))
+    assert clusters.tolist() == [0, 1, 1]
+
+
+def test_templated_dataset_keeps_one_row_per_pair(tmp_path):
+    pairs = [(f"What is rule {i} about section {i * 7}?", f"Rule {i} says form {i * 13} is due before the term.")
+             for i in range(25)]
+    rng = np.random.default_rng(0)
+    write_csv(tmp_path / "qa.csv", [pairs[i] for i in rng.integers(0, len(pairs), size=301)])
+
+    deduplicate(str(tmp_path / "qa.csv"), str(tmp_path / "out.csv"))
+
+    out = [(r["questionnaire"], r["answer"]) for r in read_csv(tmp_path / "out.csv")]
+    assert len(out) == len(set(out))
+
+
+def test_group_mode_keeps_duplicates_in_their_original_group(tmp_path):
+    rows = [("How do I enroll?", "Enroll online through the student portal during the enrollment period."),
+            ("How do I enroll?", "Enroll online through the student portal during the enrollment period."),
+            ("What is a 4.00 grade?", "A grade of 4.00 is a conditional failure that can be removed.")]
+    write_csv(tmp_path / "qa.csv", rows)
+
+    deduplicate(str(tmp_path / "qa.csv"), str(tmp_path / "out.csv"), mode="group")
+
+    groups = [r["answer_group"] for r in read_csv(tmp_path / "out.csv")]
+    assert len(groups) == 3 and groups[0] == groups[1] != groups[2]
+
+
+def test_cluster_rows_maps_exact_copies_to_the_first_occurrence():
+    texts = ["alpha beta gamma delta", "completely different words here", "Alpha  beta gamma DELTA"]
+    keys = np.array([text_key(t) for t in texts], dtype=np.uint64)
+    assert cluster_rows(keys, MinHasher().signatures(texts)).tolist() == [0, 1, 0]
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from chunk_store import ChunkStore
+from chunker import ManualChunker
+from knowledge_bundle import STORE_ARRAYS, build_knowledge_base, open_bundle, open_bundle_if_fresh, source_meta, \
+    write_bundle
+
+MANUAL = {
+    "Grading System": "A grade of 3.00 is passing. A grade of 5.00 means the student failed the course. "
+                      "Grades of 4.00 are conditional and can be removed by a completion exam.",
+    "Registration and Enrollment": "Students enroll online through the portal. Late enrollment has a fee. "
+                                   "Cross enrollment needs the dean's approval.",
+    "Student Conduct": "The school uniform is worn on campus. Identification cards are always displayed.",
+}
+EXAMPLES = {"Grading System": ["What is the passing grade?"], "Registration and Enrollment": ["How do I enroll?"],
+            "Student Conduct": []}
+
+
+@pytest.fixture
+def sources(tmp_path):
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    (model_dir / "config.json").write_text("{}", encoding="utf-8")
+    manual, examples = tmp_path / "manual_data.json", tmp_path / "section_examples.json"
+    manual.write_text(json.dumps(MANUAL), encoding="utf-8")
+    examples.write_text(json.dumps(EXAMPLES), encoding="utf-8")
+    return str(model_dir), str(manual), str(examples)
+
+
+def build(fake_encoder, sources, **kwargs):
+    model_dir, manual, examples = sources
+    store = ChunkStore.from_manual(MANUAL, ManualChunker(model_dir, 24, 8))
+    meta = source_meta(model_dir, manual, examples, 24, 8)
+    return build_knowledge_base(fake_encoder, store, EXAMPLES, meta=meta, **kwargs)
+
+
+@pytest.mark.parametrize("projection", [None, "pca"])
+def test_bundle_round_trip(tmp_path, fake_encoder, sources, projection):
+    kb = build(fake_encoder, sources, projection=projection, projection_dim=8 if projection else None)
+    path = str(tmp_path / "knowledge.smkb")
+    write_bundle(kb, path)
+    opened = open_bundle(path)
+
+    assert opened.meta["mmapped"] and opened.version == kb.version
+    assert opened.store.text == kb.store.text and opened.store.section_names == kb.store.section_names
+    for name in STORE_ARRAYS:
+        np.testing.assert_array_equal(getattr(opened.store, name), getattr(kb.store, name))
+    np.testing.assert_array_equal(opened.embeddings, kb.embeddings)
+    np.testing.assert_array_equal(opened.sentence_embeddings, kb.sentence_embeddings)
+    np.testing.assert_array_equal(opened.section_centroids, kb.section_centroids)
+    assert opened.example_sections == kb.example_sections == ["Grading System", "Registration and Enrollment"]
+
+    query = fake_encoder.encode(["How do I enroll online?"], normalize_embeddings=True)
+    expected, got = kb.index.search(query, 3), opened.index.search(query, 3)
+    np.testing.assert_array_equal(got[1], expected[1])
+    assert opened.store[int(got[1][0, 0])].section == "Registration and Enrollment"
+
+
+def test_open_bundle_if_fresh_rejects_changed_sources(tmp_path, fake_encoder, sources):
+    model_dir, manual, examples = sources
+    path = str(tmp_path / "knowledge.smkb")
+    write_bundle(build(fake_encoder, sources), path)
+
+    assert open_bundle_if_fresh(path, model_dir, manual, examples, 32, 24, 8) is not None
+    assert open_bundle_if_fresh(path, model_dir, manual, examples, 32, 24, 16) is None
+    assert open_bundle_if_fresh(path, model_dir, manual, examples, 32, 24, 8, projection="pca", projection_dim=8) is None
+    with open(manual, "a", encoding="utf-8") as f:
+        f.write(" ")
+    assert open_bundle_if_fresh(path, model_dir, manual, examples, 32, 24, 8) is None
+
+
+def test_truncated_file_is_not_a_bundle(tmp_path, fake_encoder, sources):
+    path = tmp_path / "knowledge.smkb"
+    write_bundle(build(fake_encoder, sources), str(path))
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError):
+        open_bundle(str(path))
@@ -0,0 +1,61 @@
+import glob
+import gzip
+import json
+import os
+import time
+
+from request_log import RequestLogger, question_hash, request_record
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the writer thread"
+        time.sleep(0.01)
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_rotation_gzips_old_segments_and_keeps_the_newest_backups(tmp_path):
+    path = str(tmp_path / "logs" / "requests.jsonl")
+    logger = RequestLogger(path, max_bytes=1, backups=2)
+    for i in range(5):
+        logger.log({"n": i})
+        # One record per write, so every write after the first starts a new segment
+        wait_for(lambda: os.path.exists(path) and read_lines(path)[-1:] == [{"n": i}])
+    logger.close()
+
+    segments = sorted(glob.glob(path + ".*.gz"))
+    assert len(segments) == 2
+    rotated = [json.loads(line) for segment in segments for line in gzip.open(segment, "rt", encoding="utf-8")]
+    assert rotated == [{"n": 2}, {"n": 3}]
+    assert read_lines(path) == [{"n": 4}]
+
+
+def test_close_writes_everything_queued(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    logger = RequestLogger(path)
+    for i in range(100):
+        assert logger.log({"n": i})
+    logger.close()
+    assert [r["n"] for r in read_lines(path)] == list(range(100))
+
+
+def test_sample_rate_zero_logs_nothing(tmp_path):
+    logger = RequestLogger(str(tmp_path / "requests.jsonl"), sample_rate=0.0)
+    assert not logger.log({"n": 1})
+    logger.close()
+    assert not (tmp_path / "requests.jsonl").exists()
+
+
+def test_request_record_hashes_the_question():
+    result = {"section": "Grading System", "section_confidence": 0.8, "top_chunk_ids": [3, 1],
+              "similarities": [0.91234567, 0.5], "confidence": 0.9, "timings": {"encode": 0.0123}}
+    record = request_record("  What is the PASSING grade? ", result, "tip-2025")
+
+    assert record["question_hash"] == question_hash("what is the passing grade?")
+    assert "passing" not in json.dumps(record).lower()
+    assert record["scores"] == [0.9123, 0.5] and record["timings_ms"] == {"encode": 12.3}
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from training_data import WAIT_BATCHES, QAPairStream
+
+
+def write_pairs(path, answers):
+    frame = pd.DataFrame({"questionnaire": [f"question {i}" for i in range(len(answers))], "answer": answers})
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def batches(stream):
+    return [list(batch) for batch in stream]
+
+
+def test_batches_never_repeat_an_answer_and_never_hold_one_pair(tmp_path):
+    answers = [f"answer {i % 7}" for i in range(103)]
+    stream = QAPairStream(data_file=write_pairs(tmp_path / "qa.csv", answers), shuffle_buffer=16, batch_size=4)
+
+    out = batches(stream)
+
+    assert all(2 <= len(batch) <= 4 for batch in out)
+    assert all(len({answer for _, answer in batch}) == len(batch) for batch in out)
+    assert sum(len(batch) for batch in out) + stream.skipped_pairs == len(answers)
+
+
+def test_waiting_queue_is_bounded_and_overflow_is_counted(tmp_path):
+    # One answer dominates: only WAIT_BATCHES batches' worth of its pairs can be held back
+    answers = ["the same answer"] * 200 + [f"answer {i}" for i in range(20)]
+    stream = QAPairStream(data_file=write_pairs(tmp_path / "qa.csv", answers), shuffle_buffer=8, batch_size=4)
+
+    out = batches(stream)
+
+    kept = sum(len(batch) for batch in out)
+    assert stream.skipped_pairs >= 200 - len(out) - WAIT_BATCHES * 4
+    assert kept + stream.skipped_pairs == len(answers)
+    assert all(len(batch) > 1 for batch in out)
+
+
+def test_unbatched_stream_yields_every_pair(tmp_path):
+    answers = [f"answer {i % 3}" for i in range(30)]
+    stream = QAPairStream(data_file=write_pairs(tmp_path / "qa.csv", answers), shuffle_buffer=8)
+    assert sorted(q for q, _ in stream) == sorted(f"question {i}" for i in range(30))
+
+
+def test_count_batches_matches_what_the_workers_yield(tmp_path):
+    from torch.utils.data import DataLoader
+
+    answers = [f"answer {i % 11}" for i in range(150)]
+    stream = QAPairStream(data_file=write_pairs(tmp_path / "qa.csv", answers), chunk_rows=40, shuffle_buffer=16,
+                          batch_size=8)
+    for epoch in range(2):
+        stream.set_epoch(epoch)
+        loader = DataLoader(stream, batch_size=None, num_workers=2)
+        assert stream.count_batches(epoch, num_workers=2)[0] == sum(1 for _ in loader)
+    assert stream.epoch == 1
+
+
+def test_clean_qa_frame_only_requires_question_and_answer_and_counts_blank_negatives():
+    from training_data import clean_qa_frame
+
+    frame = pd.DataFrame({"questionnaire": [" q1 ", "q2", "", "q4"], "answer": ["a1", "", "a3", "a4"],
+                          "negative_1": ["n1", "n2", "n3", " "]})
+    stats = {}
+    assert clean_qa_frame(frame, stats=stats) == (["q1"], ["a1"], ["n1"])
+    assert stats == {"blank_negative_rows": 1}
+
+    no_negatives = frame[["questionnaire", "answer"]]
+    assert clean_qa_frame(no_negatives) == (["q1", "q4"], ["a1", "a4"])
@@ -0,0 +1,66 @@
+from feedback_log import append_feedback
+from typeahead import TypeaheadIndex, build_typeahead
+
+
+def feedback(path, question, tenant="tip-2025", helpful=True, answer="See the manual."):
+    append_feedback(str(path), {"question": question, "answer": answer, "section": "Grading System",
+                                "confidence": 0.9, "helpful": helpful, "tenant": tenant}, "tip-2025")
+
+
+def test_suggestions_rank_by_popularity_and_match_mid_question():
+    index = TypeaheadIndex(k=4)
+    index.add("What is the passing grade?")
+    index.add("What is the dress code?", weight=3.0)
+    index.add("How do I drop a course?")
+
+    assert index.suggest("what is") == ["What is the dress code?", "What is the passing grade?"]
+    assert index.suggest("passing") == ["What is the passing grade?"]
+    assert index.suggest("what is the passing grade?") == []     # the full question is not suggested back
+
+
+def test_feedback_is_ingested_once_and_only_for_the_tenant(tmp_path):
+    path = tmp_path / "feedback_log.csv"
+    feedback(path, "How do I enroll?")
+    feedback(path, "Where is the Manila campus?", tenant="other")
+    index = TypeaheadIndex()
+
+    assert index.add_from_feedback(str(path), "tip-2025", "tip-2025") == 1
+    assert index.add_from_feedback(str(path), "tip-2025", "tip-2025") == 0
+    feedback(path, "How do I enroll late?", helpful=False)
+    assert index.add_from_feedback(str(path), "tip-2025", "tip-2025") == 1
+    assert sorted(index.questions()) == ["How do I enroll late?", "How do I enroll?"]
+
+
+def test_partial_row_waits_for_the_next_read(tmp_path):
+    path = tmp_path / "feedback_log.csv"
+    feedback(path, "How do I enroll?")
+    index = TypeaheadIndex()
+    index.add_from_feedback(str(path))
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('2025-01-01,"What is the grading system?","Grades run from 1.00\nto 5.00')   # answer still being written
+    assert index.add_from_feedback(str(path)) == 0
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('",Grading System,0.9,True,tip-2025\n')
+    assert index.add_from_feedback(str(path)) == 1
+    assert "What is the grading system?" in index.questions()
+
+
+def test_log_upgraded_to_tenants_is_read_from_the_start(tmp_path):
+    path = tmp_path / "feedback_log.csv"
+    path.write_text("timestamp,question,answer,section,confidence,helpful\n"
+                    "2025-01-01,How do I enroll?,Online.,Enrollment,0.9,True\n", encoding="utf-8")
+    index = TypeaheadIndex()
+    assert index.add_from_feedback(str(path)) == 1
+
+    feedback(path, "What is the dress code?")       # replaces the file with a tenant column added
+    assert index.add_from_feedback(str(path), "tip-2025", "tip-2025") == 2
+
+
+def test_legacy_log_without_tenant_belongs_to_the_default_tenant(tmp_path):
+    path = tmp_path / "feedback_log.csv"
+    path.write_text("timestamp,question,answer,section,confidence,helpful\n"
+                    "2025-01-01,How do I enroll?,Online.,Enrollment,0.9,True\n", encoding="utf-8")
+    index = build_typeahead({"Enrollment": ["How do I pay tuition?"]}, ["What is T.I.P.?"], str(path),
+                            tenant_id="tip-2025", default_tenant="tip-2025")
+    assert sorted(index.questions()) == ["How do I enroll?", "How do I pay tuition?", "What is T.I.P.?"]
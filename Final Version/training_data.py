@@ -0,0 +1,416 @@
+# ============================================================================
+# TRAINING DATA - T.I.P. QA Dataset
+# Streams (question, answer) pairs from CSV or Parquet in fixed-size chunks, so
+# memory stays flat no matter how many rows the dataset has. Pairs can also be
+# pre-tokenized once into on-disk shards that DataLoader workers read directly.
+# ============================================================================
+
+import hashlib
+import json
+import os
+import random
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+# Fast tokenizers deadlock in forked DataLoader workers if they already used threads
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+QUESTION_COLUMN = "questionnaire"
+ANSWER_COLUMN = "answer"
+NEGATIVE_PREFIX = "negative_"   # optional hard-negative columns: negative_1, negative_2, ...
+GROUP_COLUMN = "answer_group"   # optional near-duplicate answer cluster id (from dedup_dataset.py)
+CHUNK_ROWS = 50_000
+WAIT_BATCHES = 4                # batches' worth of pairs held back because their answer was already in the batch
+
+
+# ============================================================================
+# READING
+# ============================================================================
+
+def _is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def _header(data_file):
+    if _is_parquet(data_file):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(data_file).schema_arrow.names
+    return list(pd.read_csv(data_file, nrows=0).columns)
+
+
+def dataset_columns(data_file):
+    """Question and answer columns, followed by any hard-negative columns in order."""
+    header = _header(data_file)
+    if QUESTION_COLUMN not in header or ANSWER_COLUMN not in header:
+        raise ValueError(f"Dataset must contain '{QUESTION_COLUMN}' and '{ANSWER_COLUMN}' columns")
+    negatives = sorted((c for c in header if c.startswith(NEGATIVE_PREFIX) and c[len(NEGATIVE_PREFIX):].isdigit()),
+                       key=lambda c: int(c[len(NEGATIVE_PREFIX):]))
+    return [QUESTION_COLUMN, ANSWER_COLUMN] + negatives
+
+
+def has_groups(data_file):
+    return GROUP_COLUMN in _header(data_file)
+
+
+def stream_columns(data_file):
+    """Text columns plus the answer group column, if the dataset has one (always last)."""
+    return dataset_columns(data_file) + ([GROUP_COLUMN] if has_groups(data_file) else [])
+
+
+def iter_qa_frames(data_file, chunk_rows=CHUNK_ROWS, columns=None):
+    """Yield DataFrames of at most `chunk_rows` rows holding only the training columns."""
+    columns = columns or stream_columns(data_file)
+    if _is_parquet(data_file):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(data_file).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()[columns]
+    else:
+        # usecols keeps the file's column order; reorder so clean_qa_frame returns question first
+        for frame in pd.read_csv(data_file, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            yield frame[columns]
+
+
+def clean_qa_frame(frame, holdout=0.0, split="train", stats=None):
+    """Strip every column and drop rows with an empty question or answer, without a per-row Python loop.
+
+    With `holdout` > 0, a stable hash of the lower-cased question puts that fraction of rows in the
+    "eval" split (repeated questions always land on the same side) and `split` picks which side to keep.
+    Rows with a blank hard negative are dropped as well (every row needs all of its negatives) and,
+    with a `stats` dict, counted in stats["blank_negative_rows"].
+    Returns one list of texts per column: (questions, answers[, negatives...]).
+    """
+    columns = [frame[col].fillna("").astype(str).str.strip() for col in frame.columns]
+    negative = [name.startswith(NEGATIVE_PREFIX) for name in frame.columns]
+    keep = np.logical_and.reduce([col != "" for col, neg in zip(columns, negative) if not neg])
+    if holdout:
+        buckets = pd.util.hash_pandas_object(columns[0].str.lower(), index=False).to_numpy() % 10_000
+        in_eval = buckets < int(holdout * 10_000)
+        keep &= in_eval if split == "eval" else ~in_eval
+    if any(negative):
+        complete = np.logical_and.reduce([col != "" for col, neg in zip(columns, negative) if neg])
+        if stats is not None:
+            stats["blank_negative_rows"] = stats.get("blank_negative_rows", 0) + int((keep & ~complete).sum())
+        keep &= complete
+    return tuple(col[keep].tolist() for col in columns)
+
+
+def report_blank_negatives(stats):
+    if stats.get("blank_negative_rows"):
+        print(f"⚠️ Skipped {stats['blank_negative_rows']} rows with a blank {NEGATIVE_PREFIX}k column "
+              f"(re-run hard_negatives.py to fill them)")
+
+
+class FrameWriter:
+    """Appends DataFrames to a CSV or Parquet file chunk by chunk (for preprocessing tools)."""
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.rows = 0
+        self._parquet = None
+        if os.path.exists(out_file):
+            os.remove(out_file)
+
+    def write(self, frame):
+        if _is_parquet(self.out_file):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.out_file, table.schema)
+            self._parquet.write_table(table)
+        else:
+            frame.to_csv(self.out_file, mode="a", header=self.rows == 0, index=False)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def count_pairs(data_file, chunk_rows=CHUNK_ROWS, holdout=0.0):
+    """Number of usable training pairs, counted in one streaming pass."""
+    stats = {}
+    pairs = sum(len(clean_qa_frame(frame, holdout, stats=stats)[0]) for frame in iter_qa_frames(data_file, chunk_rows))
+    report_blank_negatives(stats)
+    return pairs
+
+
+def load_holdout(data_file, holdout, max_rows=2000, chunk_rows=CHUNK_ROWS):
+    """The held-out (question, answer) pairs, at most `max_rows` of them."""
+    questions, answers = [], []
+    for frame in iter_qa_frames(data_file, chunk_rows, [QUESTION_COLUMN, ANSWER_COLUMN]):
+        q, a = clean_qa_frame(frame, holdout, split="eval")
+        questions += q
+        answers += a
+        if len(questions) >= max_rows:
+            break
+    return questions[:max_rows], answers[:max_rows]
+
+
+# ============================================================================
+# PRE-TOKENIZED SHARDS
+# ============================================================================
+
+def _source_key(data_file, tokenizer, max_len, chunk_rows, holdout):
+    stat = os.stat(data_file)
+    # The vocabulary, not the tokenizer's path, so a resumed checkpoint reuses the same shards
+    vocab = hashlib.sha256(json.dumps(tokenizer.get_vocab(), sort_keys=True).encode("utf-8")).hexdigest()
+    parts = [os.path.abspath(data_file), str(stat.st_size), str(int(stat.st_mtime)),
+             type(tokenizer).__name__, vocab, str(max_len), str(chunk_rows), str(holdout)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _pack(sequences):
+    lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+    ptr = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=ptr[1:])
+    flat = np.fromiter((t for s in sequences for t in s), dtype=np.int32, count=int(ptr[-1]))
+    return flat, ptr
+
+
+def build_token_cache(data_file, tokenizer, max_len, cache_dir, chunk_rows=CHUNK_ROWS, holdout=0.0):
+    """Tokenize the training split once into shards under `cache_dir`; returns the manifest path.
+
+    The cache key covers the data file (path, size, mtime), the tokenizer, `max_len` and the
+    holdout fraction, so a changed dataset or model gets a fresh cache instead of stale token ids.
+    Shards are written atomically, so an interrupted build resumes after the last finished shard.
+    """
+    shard_dir = os.path.join(cache_dir, _source_key(data_file, tokenizer, max_len, chunk_rows, holdout))
+    manifest_path = os.path.join(shard_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        print(f"📦 Using pre-tokenized shards in '{shard_dir}'")
+        return manifest_path
+
+    os.makedirs(shard_dir, exist_ok=True)
+    shards, total, stats = [], 0, {}
+    grouped = has_groups(data_file)
+    for i, frame in enumerate(iter_qa_frames(data_file, chunk_rows)):
+        shard_file = f"shard-{i:05d}.npz"
+        shard_path = os.path.join(shard_dir, shard_file)
+        if os.path.exists(shard_path):
+            with np.load(shard_path) as shard:
+                rows = len(shard["c0_ptr"]) - 1
+            shards.append({"file": shard_file, "rows": rows})
+            total += rows
+            continue
+        texts = clean_qa_frame(frame, holdout, stats=stats)
+        if not texts[0]:
+            continue
+        columns = {}
+        if grouped:
+            columns["group"] = np.asarray(texts[-1], dtype=np.int64)
+            texts = texts[:-1]
+        for k, column in enumerate(texts):
+            ids = tokenizer(column, truncation=True, max_length=max_len)["input_ids"]
+            columns[f"c{k}_ids"], columns[f"c{k}_ptr"] = _pack(ids)
+        tmp_path = shard_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, shard_path)
+        shards.append({"file": shard_file, "rows": len(texts[0])})
+        total += len(texts[0])
+        print(f"   tokenized shard {i}: {total} pairs so far")
+
+    manifest = {"source": os.path.abspath(data_file), "max_len": max_len, "rows": total,
+                "columns": dataset_columns(data_file), "grouped": grouped, "shards": shards}
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    report_blank_negatives(stats)
+    print(f"✅ Pre-tokenized {total} pairs into {len(shards)} shards")
+    return manifest_path
+
+
+def read_manifest(manifest_path):
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ============================================================================
+# DATASET + COLLATION
+# ============================================================================
+
+class QAPairStream(IterableDataset):
+    """Shuffled stream of training pairs for a DataLoader with any number of workers.
+
+    Workers split the chunks (or token shards) round-robin, and each shuffles its pairs
+    through a bounded buffer, so memory is O(chunk_rows + shuffle_buffer) per worker.
+    Yields (question, answer[, negatives...]) strings, or int32 token-id arrays when built from a manifest.
+
+    With `batch_size`, it yields whole batches in which no answer (or answer group) appears twice,
+    since a duplicate answer in an MNRL batch is a false negative; use DataLoader(batch_size=None).
+    """
+
+    def __init__(self, data_file=None, manifest_path=None, chunk_rows=CHUNK_ROWS, shuffle_buffer=10_000, seed=42,
+                 holdout=0.0, batch_size=None):
+        if (data_file is None) == (manifest_path is None):
+            raise ValueError("Pass exactly one of data_file or manifest_path")
+        self.data_file = data_file
+        self.manifest_path = manifest_path
+        self.chunk_rows = chunk_rows
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.holdout = holdout      # raw files only; a manifest already excludes its holdout
+        self.batch_size = batch_size
+        self.epoch = 0
+        self.skipped_pairs = 0      # pairs the last batched pass left out (see _no_duplicate_batches)
+
+    def set_epoch(self, epoch):
+        """Reshuffle differently each epoch; call before iterating the DataLoader.
+
+        The order depends only on the seed, the epoch and the number of workers, so a resumed
+        run can skip the batches it already trained on and continue with the same data.
+        """
+        self.epoch = epoch
+
+    def _chunks(self, worker_id, num_workers, rng):
+        if self.manifest_path is not None:
+            shard_dir = os.path.dirname(self.manifest_path)
+            manifest = read_manifest(self.manifest_path)
+            shards = [s["file"] for s in manifest["shards"]]
+            rng.shuffle(shards)
+            for shard_file in shards[worker_id::num_workers]:
+                with np.load(os.path.join(shard_dir, shard_file)) as shard:
+                    columns = [(shard[f"c{k}_ids"], shard[f"c{k}_ptr"]) for k in range(len(manifest["columns"]))]
+                    groups = shard["group"] if manifest.get("grouped") else None
+                rows = len(columns[0][1]) - 1
+                pairs = [tuple(ids[ptr[j]:ptr[j + 1]] for ids, ptr in columns) for j in range(rows)]
+                yield pairs if groups is None else [pair + (int(g),) for pair, g in zip(pairs, groups)]
+        else:
+            # Every worker parses the file but only keeps its own chunks; pre-tokenize to avoid this
+            for i, frame in enumerate(iter_qa_frames(self.data_file, self.chunk_rows)):
+                if i % num_workers == worker_id:
+                    yield list(zip(*clean_qa_frame(frame, self.holdout)))
+
+    def _shuffled(self, worker_id, num_workers):
+        rng = random.Random(self.seed + 1000 * self.epoch + worker_id)
+        buffer = []
+        for pairs in self._chunks(worker_id, num_workers, random.Random(self.seed + self.epoch)):
+            for pair in pairs:
+                if len(buffer) < self.shuffle_buffer:
+                    buffer.append(pair)
+                    continue
+                j = rng.randrange(len(buffer))
+                yield buffer[j]
+                buffer[j] = pair
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def _no_duplicate_batches(self, items, grouped, n_texts):
+        """Fill batches in arrival order; an item whose answer is already in the batch waits for a later one.
+
+        At most WAIT_BATCHES batches' worth of items wait; a clashing item that finds the queue full is
+        skipped and counted in `skipped_pairs`, as is a last batch of one pair (no negatives to learn from).
+        """
+        def key(item):
+            if grouped:
+                return item[-1]
+            answer = item[1]
+            return answer if isinstance(answer, str) else answer.tobytes()
+
+        waiting = deque()
+        batch, keys = [], set()
+        self.skipped_pairs = 0
+
+        def offer(item):
+            k = key(item)
+            if k in keys:
+                return False
+            keys.add(k)
+            batch.append(item[:n_texts])
+            return True
+
+        def refill():
+            for _ in range(len(waiting)):
+                candidate = waiting.popleft()
+                if len(batch) == self.batch_size or not offer(candidate):
+                    waiting.append(candidate)
+
+        for item in items:
+            if not offer(item):
+                if len(waiting) < WAIT_BATCHES * self.batch_size:
+                    waiting.append(item)
+                else:
+                    self.skipped_pairs += 1
+            while len(batch) == self.batch_size:
+                yield batch
+                batch, keys = [], set()
+                refill()
+        # Leftovers: keep splitting so the last batches stay duplicate-free too
+        while waiting or batch:
+            refill()
+            if len(batch) > 1:
+                yield batch
+            else:
+                self.skipped_pairs += len(batch)
+            batch, keys = [], set()
+
+    def _stream(self, worker_id, num_workers):
+        if self.manifest_path is not None:
+            manifest = read_manifest(self.manifest_path)
+            n_texts, grouped = len(manifest["columns"]), manifest.get("grouped", False)
+        else:
+            n_texts, grouped = len(dataset_columns(self.data_file)), has_groups(self.data_file)
+
+        items = self._shuffled(worker_id, num_workers)
+        if self.batch_size:
+            yield from self._no_duplicate_batches(items, grouped, n_texts)
+        else:
+            for item in items:
+                yield item[:n_texts]
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        yield from self._stream(worker_id, num_workers)
+
+    def count_batches(self, epoch, num_workers=0):
+        """(batches, skipped pairs) of one epoch read by `num_workers` DataLoader workers, in one pass over the data.
+
+        Skipped answers make the batch count differ from ceil(pairs / batch_size), so size a schedule with this.
+        """
+        current, self.epoch = self.epoch, epoch
+        num_workers = max(1, num_workers)
+        batches = skipped = 0
+        try:
+            for worker_id in range(num_workers):
+                batches += sum(1 for _ in self._stream(worker_id, num_workers))
+                skipped += self.skipped_pairs
+        finally:
+            self.epoch = current
+        return batches, skipped
+
+
+class QACollator:
+    """Turns a list of pairs (or triplets) into one padded feature dict per column, as the loss expects."""
+
+    def __init__(self, tokenizer, max_len):
+        self.tokenizer = tokenizer
+        self.max_len = max_len
+        self.pad_id = tokenizer.pad_token_id or 0
+        self.token_types = "token_type_ids" in tokenizer.model_input_names
+
+    def _pad(self, sequences):
+        width = max(len(s) for s in sequences)
+        input_ids = torch.full((len(sequences), width), self.pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, seq in enumerate(sequences):
+            input_ids[row, :len(seq)] = torch.from_numpy(seq.astype(np.int64))
+            attention_mask[row, :len(seq)] = 1
+        features = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if self.token_types:
+            features["token_type_ids"] = torch.zeros_like(input_ids)
+        return features
+
+    def __call__(self, batch):
+        columns = list(zip(*batch))
+        if isinstance(columns[0][0], str):
+            return [dict(self.tokenizer(list(texts), padding=True, truncation=True, max_length=self.max_len,
+                                        return_tensors="pt")) for texts in columns]
+        return [self._pad(sequences) for sequences in columns]
@@ -0,0 +1,170 @@
+# ============================================================================
+# TYPEAHEAD SUGGESTIONS - T.I.P. Student Manual
+# Prefix trie whose nodes keep their own top-k suggestions, so a lookup is one
+# walk down the typed prefix. A second trie over word suffixes ("n-gram"
+# index) also matches text typed from the middle of a question.
+# ============================================================================
+
+import csv
+import io
+import os
+import threading
+
+
+def _key(text):
+    return ' '.join(text.lower().split())
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []       # [(score, suggestion)], best first, at most k entries
+
+
+class _TopKTrie:
+    def __init__(self, k):
+        self.k = k
+        self.root = _Node()
+
+    def insert(self, key, suggestion, score):
+        """Insert or re-score `suggestion` on every node along `key`."""
+        node = self.root
+        self._offer(node, suggestion, score)
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            self._offer(node, suggestion, score)
+
+    def _offer(self, node, suggestion, score):
+        top = [entry for entry in node.top if entry[1] != suggestion]
+        if len(top) < self.k or score > top[-1][0]:
+            top.append((score, suggestion))
+            top.sort(key=lambda entry: (-entry[0], entry[1]))
+            del top[self.k:]
+        node.top = top
+
+    def lookup(self, key):
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.top
+
+
+def _complete_records(data):
+    """Bytes of `data` that hold whole CSV records: up to the last newline outside a quoted field."""
+    end = start = quotes = 0
+    newline = data.find(b"\n")
+    while newline != -1:
+        quotes += data.count(b'"', start, newline)   # escaped quotes come in pairs, so parity tells inside/outside
+        if quotes % 2 == 0:
+            end = newline + 1
+        start = newline + 1
+        newline = data.find(b"\n", start)
+    return end
+
+
+class TypeaheadIndex:
+    """Ranked question suggestions for a typed prefix; updated incrementally as questions come in."""
+
+    def __init__(self, k=8, ngram=True, min_word_chars=3):
+        self.k = k
+        self.ngram = ngram
+        self.min_word_chars = min_word_chars
+        self._prefix = _TopKTrie(k)
+        self._words = _TopKTrie(k)
+        self._scores = {}          # normalized key -> (score, display text)
+        self._lock = threading.Lock()
+        self._feedback_lock = threading.Lock()
+        self._feedback_inode = None
+        self._feedback_offset = 0  # bytes of the feedback log already ingested
+        self._feedback_header = None
+
+    def __len__(self):
+        return len(self._scores)
+
+    def add(self, question, weight=1.0):
+        """Add a question or raise its popularity; only the nodes on its own paths are touched."""
+        question = question.strip()
+        key = _key(question)
+        if not key:
+            return
+        with self._lock:
+            score, display = self._scores.get(key, (0.0, question))
+            score += weight
+            self._scores[key] = (score, display)
+            self._prefix.insert(key, display, score)
+            if self.ngram:
+                words = key.split(' ')
+                for i in range(1, len(words)):
+                    if len(words[i]) >= self.min_word_chars:
+                        self._words.insert(' '.join(words[i:]), display, score)
+
+    def suggest(self, prefix, limit=5):
+        """Best suggestions starting with `prefix`, then ones containing it at a word boundary."""
+        key = _key(prefix)
+        if not key:
+            return []
+        with self._lock:
+            results = [s for _, s in self._prefix.lookup(key)]
+            if self.ngram and len(results) < limit:
+                ranked = sorted(self._words.lookup(key), key=lambda entry: (-entry[0], entry[1]))
+                results += [s for _, s in ranked if s not in results]
+        return [s for s in results if _key(s) != key][:limit]
+
+    def add_from_feedback(self, feedback_path, tenant_id=None, default_tenant=None, weight=2.0, helpful_bonus=1.0):
+        """Ingest feedback log rows appended since the last call (reads only the new bytes).
+
+        Only complete rows are consumed; a row still being written is picked up next time. With `tenant_id`,
+        only that tenant's rows count (rows without a tenant belong to `default_tenant`).
+        Safe to call from many sessions at once.
+        """
+        with self._feedback_lock:
+            try:
+                stat = os.stat(feedback_path)
+            except FileNotFoundError:
+                return 0
+            if stat.st_ino != self._feedback_inode or stat.st_size < self._feedback_offset:
+                # New, replaced or truncated file: read it from the start (rows seen before count again)
+                self._feedback_inode, self._feedback_offset, self._feedback_header = stat.st_ino, 0, None
+            if stat.st_size == self._feedback_offset:
+                return 0
+            with open(feedback_path, 'rb') as f:
+                f.seek(self._feedback_offset)
+                data = f.read(stat.st_size - self._feedback_offset)
+            complete = _complete_records(data)
+            self._feedback_offset += complete
+
+            # csv handles answers with embedded newlines; the header is only in the first read
+            reader = csv.reader(io.StringIO(data[:complete].decode('utf-8', errors='replace'), newline=''))
+            if self._feedback_header is None:
+                self._feedback_header = next(reader, [])
+            rows = [dict(zip(self._feedback_header, values)) for values in reader]
+
+        added = 0
+        for row in rows:
+            question = (row.get("question") or "").strip()
+            if not question or (tenant_id and (row.get("tenant") or default_tenant) != tenant_id):
+                continue
+            helpful = str(row.get("helpful")).strip().lower() == "true"
+            self.add(question, weight + (helpful_bonus if helpful else 0.0))
+            added += 1
+        return added
+
+    def questions(self):
+        with self._lock:
+            return [display for _, display in self._scores.values()]
+
+
+def build_typeahead(section_examples, sample_questions, feedback_path, k=8, tenant_id=None, default_tenant=None):
+    """Typeahead over the section examples, the sample questions and the tenant's popular feedback questions."""
+    index = TypeaheadIndex(k=k)
+    for examples in section_examples.values():
+        for question in examples:
+            index.add(question)
+    for question in sample_questions:
+        index.add(question, 1.5)
+    index.add_from_feedback(feedback_path, tenant_id, default_tenant)
+    return index